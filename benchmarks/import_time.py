@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# benchmarks/import_time.py
+"""
+Startup cost of each CLI mode. A fresh interpreter imports mau.cli plus the runner
+module the mode loads, and reports how long that took and which heavy third-party
+packages came with it:
+
+    python -m benchmarks.import_time --repeat 5 --output imports.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Optional
+
+# The modules mau.cli imports once a mode is chosen.
+MODE_MODULES: Dict[str, List[str]] = {
+    "conversation": ["mau.conversation.conversation_runner"],
+    "conversation-batch": ["mau.conversation.batch_runner"],
+    "data-generation": ["mau.data_pipeline.data_pipeline"],
+    "data-generation-layer1": ["mau.data_pipeline.layer_1"],
+    "data-generation-layer1-sweep": ["mau.data_pipeline.layer_1_sweep"],
+    "data-generation-fused": ["mau.data_pipeline.fused_pipeline"],
+    "queue-coordinator": ["mau.data_pipeline.distributed"],
+    "queue-worker": ["mau.data_pipeline.distributed"],
+    "export-results": ["mau.data_pipeline.layer_1", "mau.data_pipeline.data_pipeline"],
+    "export-md": ["mau.data_pipeline.layer_1", "mau.data_pipeline.data_pipeline"],
+}
+
+HEAVY_PACKAGES = ("pandas", "openpyxl", "pyarrow", "openai", "ollama", "httpx", "prompt_toolkit", "rich")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import mau.cli
+for name in sys.argv[2:]:
+    __import__(name)
+seconds = time.perf_counter() - started
+heavy = [name for name in json.loads(sys.argv[1]) if name in sys.modules]
+print(json.dumps({"seconds": seconds, "heavy": heavy}))
+"""
+
+
+def probe(modules: List[str]) -> dict:
+    """Import mau.cli and modules in a fresh interpreter; returns its timing and heavy imports."""
+    result = subprocess.run([sys.executable, "-c", _PROBE, json.dumps(HEAVY_PACKAGES), *modules],
+                            cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def measure_mode(mode: str, repeat: int = 3) -> dict:
+    runs = [probe(MODE_MODULES[mode]) for _ in range(max(1, repeat))]
+    seconds = [run["seconds"] for run in runs]
+    return {
+        "mode": mode,
+        "repeat": len(runs),
+        "median_s": statistics.median(seconds),
+        "min_s": min(seconds),
+        "heavy_imports": runs[-1]["heavy"],
+    }
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Measure the import time of each MAU CLI mode")
+    parser.add_argument("--output", "-o", help="Write JSON results here (default: print to stdout)")
+    parser.add_argument("--repeat", type=int, default=3, help="Fresh interpreters per mode")
+    parser.add_argument("--modes", default=",".join(MODE_MODULES), help="Comma-separated modes to measure")
+    args = parser.parse_args(argv)
+
+    report = {
+        "python": sys.version.split()[0],
+        "results": [measure_mode(mode, args.repeat) for mode in args.modes.split(",") if mode],
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return report
+
+
+if __name__ == "__main__":
+    main()
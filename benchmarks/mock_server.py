@@ -0,0 +1,198 @@
+# benchmarks/mock_server.py
+
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+
+
+@dataclass
+class MockSettings:
+    """Behaviour of the mock LLM server."""
+    latency: float = 0.05  # seconds before the first token
+    tokens_per_second: float = 200.0
+    reply_tokens: int = 32
+    failure_rate: float = 0.0  # share of requests answered with HTTP 500
+    seed: Optional[int] = None
+
+
+@dataclass
+class ServerStats:
+    requests: int = 0
+    failures: int = 0
+    request_durations: List[float] = field(default_factory=list)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like a real inference server
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def mock(self) -> "MockLLMServer":
+        return self.server.mock
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}") if length else {}
+
+    def _send_json(self, status: int, payload: dict):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _start_chunked(self, content_type: str):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _end_chunked(self):
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models") or self.path.rstrip("/") == "/api/tags":
+            self._send_json(200, {"object": "list", "data": [{"id": "mock", "object": "model", "created": 0,
+                                                              "owned_by": "mock"}], "models": []})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        started = time.perf_counter()
+        request = self._read_json()
+        if self.mock.should_fail():
+            self._send_json(500, {"error": {"message": "mock failure", "type": "server_error"}})
+            self.mock.record(started, failed=True)
+            return
+        path = self.path.rstrip("/")
+        if path.endswith("/chat/completions"):
+            self._openai_chat(request)
+        elif path == "/api/chat":
+            self._ollama_chat(request)
+        elif path == "/api/generate":
+            self._send_json(200, {"model": request.get("model", "mock"), "created_at": _now(),
+                                  "response": "", "done": True})
+        else:
+            self._send_json(404, {"error": "not found"})
+        self.mock.record(started)
+
+    def _openai_chat(self, request: dict):
+        model = request.get("model", "mock")
+        max_tokens = request.get("max_tokens")
+        if not request.get("stream"):
+            text = "".join(self.mock.tokens(max_tokens))
+            self._send_json(200, {
+                "id": "chatcmpl-mock", "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": len(text.split()), "total_tokens": len(text.split())},
+            })
+            return
+
+        def event(delta: dict, finish_reason=None) -> bytes:
+            chunk = {"id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": int(time.time()),
+                     "model": model, "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+            return f"data: {json.dumps(chunk)}\n\n".encode("utf-8")
+
+        self._start_chunked("text/event-stream")
+        self._write_chunk(event({"role": "assistant", "content": ""}))
+        for token in self.mock.tokens(max_tokens):
+            self._write_chunk(event({"content": token}))
+        self._write_chunk(event({}, "stop"))
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._end_chunked()
+
+    def _ollama_chat(self, request: dict):
+        model = request.get("model", "mock")
+        self._start_chunked("application/x-ndjson")
+        for token in self.mock.tokens():
+            line = {"model": model, "created_at": _now(), "message": {"role": "assistant", "content": token},
+                    "done": False}
+            self._write_chunk((json.dumps(line) + "\n").encode("utf-8"))
+        final = {"model": model, "created_at": _now(), "message": {"role": "assistant", "content": ""},
+                 "done": True, "done_reason": "stop"}
+        self._write_chunk((json.dumps(final) + "\n").encode("utf-8"))
+        self._end_chunked()
+
+
+def _now() -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+
+
+class MockLLMServer:
+    """
+    Local stub of the OpenAI chat completions API (/v1/chat/completions, /v1/models)
+    and the Ollama chat API (/api/chat, /api/generate), with configurable latency,
+    token rate and failure rate. Use as a context manager; base_url and ollama_url
+    point providers at it.
+    """
+
+    def __init__(self, settings: Optional[MockSettings] = None, host: str = "127.0.0.1", port: int = 0):
+        self.settings = settings or MockSettings()
+        self.stats = ServerStats()
+        self._lock = threading.Lock()
+        self._random = random.Random(self.settings.seed)
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.mock = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def ollama_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def base_url(self) -> str:
+        return f"{self.ollama_url}/v1"
+
+    def should_fail(self) -> bool:
+        with self._lock:
+            return self._random.random() < self.settings.failure_rate
+
+    def tokens(self, max_tokens: Optional[int] = None):
+        """Yield the reply one token at a time, paced by latency and tokens_per_second."""
+        count = min(self.settings.reply_tokens, max_tokens or self.settings.reply_tokens)
+        time.sleep(self.settings.latency)
+        interval = 1.0 / self.settings.tokens_per_second if self.settings.tokens_per_second > 0 else 0.0
+        for i in range(count):
+            if i and interval:
+                time.sleep(interval)
+            yield f"tok{i} "
+
+    def record(self, started: float, failed: bool = False):
+        with self._lock:
+            self.stats.requests += 1
+            self.stats.failures += int(failed)
+            if not failed:
+                self.stats.request_durations.append(time.perf_counter() - started)
+
+    def reset_stats(self):
+        with self._lock:
+            self.stats = ServerStats()
+
+    def start(self) -> "MockLLMServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True, name="mock-llm-server")
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
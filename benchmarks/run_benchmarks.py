@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+# benchmarks/run_benchmarks.py
+"""
+End-to-end throughput and latency benchmarks for MAU's pipelines against a local
+mock LLM server. Results are written as JSON, one record per scenario and setting:
+
+    python -m benchmarks.run_benchmarks --output bench.json
+    python -m benchmarks.run_benchmarks --quick
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from benchmarks.mock_server import MockLLMServer, MockSettings
+from mau.conversation.conversation_manager import ConversationManager
+from mau.data_pipeline.data_pipeline import run_data_generation_mode
+from mau.data_pipeline.layer_1 import run_layer1
+from mau.llm.ai_being import AIBeing
+from mau.llm.provider_factory import choose_provider
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def latency_summary(values: List[float]) -> Dict[str, Optional[float]]:
+    return {
+        "mean_s": statistics.fmean(values) if values else None,
+        "p50_s": percentile(values, 50),
+        "p95_s": percentile(values, 95),
+        "max_s": max(values) if values else None,
+    }
+
+
+def timed(server: MockLLMServer, func: Callable[[], int]) -> dict:
+    """
+    Run func (which returns the number of items it produced) and collect timings.
+    An exception is recorded in the result instead of aborting the whole run.
+    """
+    server.reset_stats()
+    error = None
+    started = time.perf_counter()
+    # The pipelines report progress with print; keep that out of the benchmark output.
+    with contextlib.redirect_stdout(io.StringIO()):
+        try:
+            items = func()
+        except Exception as e:
+            items, error = 0, f"{type(e).__name__}: {e}"
+    wall_time = time.perf_counter() - started
+    stats = server.stats
+    return {
+        "error": error,
+        "items": items,
+        "wall_time_s": wall_time,
+        "items_per_s": items / wall_time if wall_time > 0 else None,
+        "server_requests": stats.requests,
+        "server_failures": stats.failures,
+        "server_request_latency": latency_summary(stats.request_durations),
+    }
+
+
+def bench_layer1(server: MockLLMServer, workdir: str, cycles: int, concurrency: int) -> dict:
+    run_dir = os.path.join(workdir, f"layer1_{cycles}_{concurrency}")
+    config = {
+        "identity_dir": os.path.join(run_dir, "identity"),
+        "task_dir": os.path.join(run_dir, "task"),
+        "output_dir_md": os.path.join(run_dir, "md"),
+        "output_dir_excel": os.path.join(run_dir, "excel"),
+        "identity_prompt_file": "Identity_L001.md",
+        "task_prompt_file": "task_001.md",
+        "model": "mock",
+        "provider": "lmstudio",
+        "provider_config": {"base_url": server.base_url, "api_key": "mock"},
+        "concurrency": concurrency,
+        "max_retries": 3,
+        "retry_backoff": 0.01,
+        "session_id": "bench",
+        "cycle_count": cycles,
+    }
+    return timed(server, lambda: (run_layer1(config), cycles)[1])
+
+
+def bench_layer2(server: MockLLMServer, workdir: str, rows: int, max_in_flight: int) -> dict:
+    run_dir = os.path.join(workdir, f"layer2_{rows}_{max_in_flight}")
+    os.makedirs(run_dir, exist_ok=True)
+    input_path = os.path.join(run_dir, "layer_001.jsonl")
+    with open(input_path, "w", encoding="utf-8") as f:
+        for cycle in range(1, rows + 1):
+            f.write(json.dumps({"Cycle Number": cycle, "Generated Response": f"Layer 1 response {cycle}"}) + "\n")
+    config = {
+        "layer_001_input_path": input_path,
+        "output_dir_md": os.path.join(run_dir, "md"),
+        "output_dir_excel": os.path.join(run_dir, "excel"),
+        "identity_prompt_path": os.path.join(run_dir, "Identity_L002.md"),
+        "task_prompt_path": os.path.join(run_dir, "task_002.md"),
+        "provider": "lmstudio",
+        "provider_config": {"base_url": server.base_url, "api_key": "mock"},
+        "model": "mock",
+        "session_id": "bench",
+        "max_in_flight": max_in_flight,
+        "chunk_size": 64,
+        "retry_backoff": 0.01,
+    }
+    return timed(server, lambda: (run_data_generation_mode(config, ["excel"]), rows)[1])
+
+
+def bench_conversation(server: MockLLMServer, turns: int, prefetch: bool) -> dict:
+    def agent(name: str, provider_name: str) -> AIBeing:
+        base_url = server.ollama_url if provider_name == "ollama" else server.base_url
+        provider = choose_provider(provider_name, {"base_url": base_url, "api_key": "mock"}, stream=True)
+        return AIBeing(name=name, model="mock", temperature=0.8, ctx_size=2048,
+                       system_prompt=f"You are {name}.", provider=provider)
+
+    # One agent per backend, as in a mixed Ollama / LM Studio setup.
+    agent1, agent2 = agent("agent1", "lmstudio"), agent("agent2", "ollama")
+
+    def run() -> int:
+        manager = ConversationManager(agent1, agent2, initial_message="Hello!", max_turns=turns, prefetch=prefetch)
+        for _, stream in manager.run_conversation():
+            for _ in stream:
+                pass
+        return turns
+
+    result = timed(server, run)
+    ttfts = [s.time_to_first_token for s in agent1.turn_stats + agent2.turn_stats if s.time_to_first_token is not None]
+    result["time_to_first_token"] = latency_summary(ttfts)
+    return result
+
+
+def run_benchmarks(settings: MockSettings, cycles: List[int], concurrency: List[int], turns: List[int],
+                   workdir: str) -> dict:
+    results = []
+    with MockLLMServer(settings) as server:
+        for count in cycles:
+            for workers in concurrency:
+                results.append({"benchmark": "layer1", "cycles": count, "concurrency": workers,
+                                **bench_layer1(server, workdir, count, workers)})
+                results.append({"benchmark": "layer2", "rows": count, "max_in_flight": workers,
+                                **bench_layer2(server, workdir, count, workers)})
+        for count in turns:
+            for prefetch in (False, True):
+                results.append({"benchmark": "conversation", "turns": count, "prefetch": prefetch,
+                                **bench_conversation(server, count, prefetch)})
+    return {
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "mock_server": vars(settings),
+        "results": results,
+    }
+
+
+def parse_counts(text: str) -> List[int]:
+    return [int(part) for part in text.split(",") if part.strip()]
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Benchmark MAU pipelines against a local mock LLM server")
+    parser.add_argument("--output", "-o", help="Write JSON results here (default: print to stdout)")
+    parser.add_argument("--quick", action="store_true", help="Small counts, for smoke runs")
+    parser.add_argument("--cycles", default="20,100", help="Comma-separated cycle/row counts")
+    parser.add_argument("--concurrency", default="1,4,8", help="Comma-separated concurrency levels")
+    parser.add_argument("--turns", default="10", help="Comma-separated conversation lengths")
+    parser.add_argument("--latency", type=float, default=0.05, help="Mock latency before the first token (s)")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0, help="Mock generation rate")
+    parser.add_argument("--reply-tokens", type=int, default=32, help="Tokens per mock reply")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Share of mock requests that fail")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the mock failure pattern")
+    args = parser.parse_args(argv)
+
+    if args.quick:
+        args.cycles, args.concurrency, args.turns = "5", "1,4", "4"
+    settings = MockSettings(latency=args.latency, tokens_per_second=args.tokens_per_second,
+                            reply_tokens=args.reply_tokens, failure_rate=args.failure_rate, seed=args.seed)
+
+    with tempfile.TemporaryDirectory(prefix="mau_bench_") as workdir:
+        # Some exports (Layer 002 CSV) write to the working directory.
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            report = run_benchmarks(settings, parse_counts(args.cycles), parse_counts(args.concurrency),
+                                    parse_counts(args.turns), workdir)
+        finally:
+            os.chdir(cwd)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return report
+
+
+if __name__ == "__main__":
+    main()
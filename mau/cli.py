@@ -3,28 +3,84 @@ import argparse
 import sys
 from mau.utils.logger import setup_logging
 from mau.utils.config_utils import load_config
-from mau.conversation.conversation_runner import run_conversation_mode
-from mau.data_pipeline.data_pipeline import run_data_generation_mode
-from mau.data_pipeline.layer_1 import run_layer1  # Import the new module
+from mau.llm.response_cache import set_cache_bypass
+from mau.utils.metrics import configure_metrics
 
 def main():
     setup_logging()
     parser = argparse.ArgumentParser(description="MAU - Multifunctional AI Utility")
-    parser.add_argument("--mode", choices=["conversation", "data-generation", "data-generation-layer1"],
+    parser.add_argument("--mode", choices=["conversation", "conversation-batch", "data-generation", "data-generation-layer1",
+                                           "data-generation-layer1-sweep", "data-generation-fused",
+                                           "queue-coordinator", "queue-worker",
+                                           "export-results", "export-md"],
                         default="conversation",
                         help="Choose the pipeline mode to run")
     parser.add_argument("-c", "--config", type=str, required=True,
                         help="Path to JSON configuration file")
+    parser.add_argument("--session", type=str,
+                        help="Session ID to export (used by --mode export-results and export-md)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Do not read cached responses (fresh replies still refresh the cache)")
     args = parser.parse_args()
 
     config = load_config(args.config)
-    
+    if args.no_cache:
+        set_cache_bypass(True)
+    metrics_config = config.get("metrics") or {}
+    if metrics_config.get("enabled"):
+        configure_metrics(metrics_config.get("dir"), metrics_config.get("prometheus_port"))
+
+    # Each mode imports its runner only once chosen, so a scheduled data generation job does
+    # not pay for the interactive console (prompt_toolkit, rich) or for unused provider SDKs.
     if args.mode == "conversation":
+        from mau.conversation.conversation_runner import run_conversation_mode
+
         run_conversation_mode(config.get("conversation"))
+    elif args.mode == "conversation-batch":
+        from mau.conversation.batch_runner import run_conversation_batch
+
+        run_conversation_batch(config.get("conversation"), config.get("conversation_batch"))
     elif args.mode == "data-generation":
+        from mau.data_pipeline.data_pipeline import run_data_generation_mode
+
         run_data_generation_mode(config.get("data_pipeline"), config.get("output_formats"))
     elif args.mode == "data-generation-layer1":
+        from mau.data_pipeline.layer_1 import run_layer1
+
         run_layer1(config.get("data_pipeline_layer1"))
+    elif args.mode == "data-generation-layer1-sweep":
+        from mau.data_pipeline.layer_1_sweep import run_layer1_sweep
+
+        run_layer1_sweep(config.get("data_pipeline_layer1"))
+    elif args.mode == "data-generation-fused":
+        from mau.data_pipeline.fused_pipeline import run_fused_mode
+
+        run_fused_mode(config.get("data_pipeline_layer1"), config.get("data_pipeline"),
+                       config.get("fused_pipeline"), config.get("output_formats"))
+    elif args.mode == "queue-coordinator":
+        from mau.data_pipeline.distributed import run_coordinator
+
+        run_coordinator(config)
+    elif args.mode == "queue-worker":
+        from mau.data_pipeline.distributed import run_worker
+
+        run_worker(config)
+    elif args.mode == "export-results":
+        if not args.session:
+            sys.exit("--session is required for export-results.")
+        from mau.data_pipeline.data_pipeline import export_results_layer002
+        from mau.data_pipeline.layer_1 import export_results
+
+        export_results(config.get("data_pipeline_layer1"), args.session)
+        export_results_layer002(config.get("data_pipeline"), config.get("output_formats"), args.session)
+    elif args.mode == "export-md":
+        if not args.session:
+            sys.exit("--session is required for export-md.")
+        from mau.data_pipeline.data_pipeline import export_md_layer002
+        from mau.data_pipeline.layer_1 import export_md
+
+        export_md(config.get("data_pipeline_layer1"), args.session)
+        export_md_layer002(config.get("data_pipeline"), args.session)
     else:
         sys.exit("Unknown mode specified.")
 
@@ -1,9 +1,44 @@
 from pydantic import BaseModel, Field
-from typing import Optional, Dict, List, Any
+from typing import Optional, Dict, List, Any, Literal
+
+class CacheConfig(BaseModel):
+    enabled: bool = False
+    path: str = ".mau_cache/responses.sqlite"
+    max_entries: int = Field(default=10000, ge=1)
+    ttl_seconds: Optional[float] = Field(default=None, gt=0.0)
+    bypass: bool = False
+
+class RateLimitConfig(BaseModel):
+    requests_per_second: Optional[float] = Field(default=None, gt=0.0)
+    tokens_per_minute: Optional[float] = Field(default=None, gt=0.0)
+    adaptive: bool = False
+    initial_concurrency: int = Field(default=4, ge=1)
+    min_concurrency: int = Field(default=1, ge=1)
+    max_concurrency: int = Field(default=32, ge=1)
+    target_latency: Optional[float] = Field(default=None, gt=0.0)
+    latency_tolerance: float = Field(default=2.0, gt=1.0)
+    decrease_factor: float = Field(default=0.7, gt=0.0, lt=1.0)
+
+class EndpointConfig(BaseModel):
+    base_url: str
+    api_key: Optional[str] = None
+    provider: Optional[str] = None
+    weight: float = Field(default=1.0, gt=0.0)
 
 class ProviderConfig(BaseModel):
     base_url: Optional[str] = None
     api_key: Optional[str] = None
+    timeout: float = Field(default=60.0, gt=0.0)
+    max_connections: int = Field(default=100, ge=1)
+    max_keepalive_connections: int = Field(default=20, ge=0)
+    http2: bool = False
+    seed: Optional[int] = None
+    cache: Optional[CacheConfig] = None
+    rate_limit: Optional[RateLimitConfig] = None
+    endpoints: Optional[List[EndpointConfig]] = None
+    load_balancing: Literal["least_outstanding", "weighted_round_robin"] = "least_outstanding"
+    failure_cooldown: float = Field(default=30.0, ge=0.0)
+    health_check_interval: Optional[float] = Field(default=None, gt=0.0)
 
 class AgentConfig(BaseModel):
     name: str
@@ -13,11 +48,18 @@ class AgentConfig(BaseModel):
     temperature: float = Field(default=0.8, ge=0.0, le=1.0)
     ctx_size: int = Field(default=2048, ge=0)
     provider_config: Optional[ProviderConfig] = None
+    history_strategy: Literal["sliding_window", "summarize_oldest", "none"] = "sliding_window"
+    response_reserve_tokens: Optional[int] = Field(default=None, ge=0)
 
 class ConversationSettings(BaseModel):
     use_markdown: bool = False
     allow_termination: bool = False
     initial_message: Optional[str] = None
+    transcript_dir: str = "outputs/transcripts"
+    transcript_fsync_every: int = Field(default=16, ge=1)
+    prefetch: bool = False
+    prefetch_queue_size: int = Field(default=1024, ge=1)
+    warmup: bool = False
 
 class ConversationConfig(BaseModel):
     agent1: AgentConfig
@@ -25,6 +67,20 @@ class ConversationConfig(BaseModel):
     settings: ConversationSettings
     pass
 
+class PromptPair(BaseModel):
+    agent1_system_prompt_path: str
+    agent2_system_prompt_path: str
+
+class ConversationBatchConfig(BaseModel):
+    output_dir: str = "outputs/conversations"
+    prompt_pairs: List[PromptPair] = Field(default_factory=list)
+    initial_message_paths: List[str] = Field(default_factory=list)
+    seeds: List[Optional[int]] = Field(default_factory=list)
+    repeats: int = Field(default=1, ge=1)
+    max_turns: int = Field(default=10, ge=1)
+    concurrency: int = Field(default=4, ge=1)
+    fsync_every: int = Field(default=16, ge=1)
+
 class DataPipelineConfig(BaseModel):
     layer_001_input_path: str
     output_dir_md: str
@@ -35,9 +91,31 @@ class DataPipelineConfig(BaseModel):
     provider_config: Optional[ProviderConfig] = None
     model: str
     temperature: float = Field(default=0.7, ge=0.0, le=1.0)
+    ctx_size: int = Field(default=2048, ge=0)
+    session_id: Optional[str] = None
+    max_in_flight: int = Field(default=4, ge=1)
+    chunk_size: int = Field(default=64, ge=1)
+    max_retries: int = Field(default=3, ge=0)
+    retry_backoff: float = Field(default=1.0, ge=0.0)
+    result_format: Literal["jsonl", "parquet"] = "jsonl"
+    fsync_every: int = Field(default=16, ge=1)
+    md_format: Literal["files", "archive"] = "files"
+    postprocess: List[Dict[str, Any]] = Field(default_factory=list)
+    postprocess_workers: int = Field(default=2, ge=0)
+    postprocess_batch_size: int = Field(default=8, ge=1)
     pass
 
 
+class DedupConfig(BaseModel):
+    """Per-session MinHash-LSH near-duplicate index for Layer 1."""
+    enabled: bool = True
+    action: Literal["tag", "drop", "resample"] = "tag"
+    threshold: float = Field(default=0.8, gt=0.0, le=1.0)
+    num_perm: int = Field(default=128, ge=8)
+    shingle_size: int = Field(default=3, ge=1)
+    max_resamples: int = Field(default=2, ge=0)
+
+
 class DataPipelineLayer1Config(BaseModel):
     identity_dir: str
     task_dir: str
@@ -46,11 +124,78 @@ class DataPipelineLayer1Config(BaseModel):
     identity_prompt_file: str
     task_prompt_file: str
     model: str
-    provider_config: Dict[str, str]
+    provider: str = "lmstudio"
+    provider_config: ProviderConfig = Field(default_factory=ProviderConfig)
+    temperature: float = Field(default=0.8, ge=0.0, le=1.0)
+    ctx_size: int = Field(default=2048, ge=0)
+    concurrency: int = Field(default=1, ge=1)
+    max_retries: int = Field(default=3, ge=0)
+    retry_backoff: float = Field(default=1.0, ge=0.0)
+    result_format: Literal["jsonl", "parquet"] = "jsonl"
+    fsync_every: int = Field(default=16, ge=1)
+    md_format: Literal["files", "archive"] = "files"
+    session_id: Optional[str] = None
+    cycle_count: Optional[int] = Field(default=None, ge=0)
+    postprocess: List[Dict[str, Any]] = Field(default_factory=list)
+    postprocess_workers: int = Field(default=2, ge=0)
+    postprocess_batch_size: int = Field(default=8, ge=1)
+    dedup: Optional[DedupConfig] = None
+    sweep_id: Optional[str] = None
+    identity_glob: str = "*.md"
+    task_glob: str = "*.md"
+    sweep_manifest: Optional[str] = None
+
+
+class FusedLayerConfig(BaseModel):
+    """One more refinement layer after Layer 002; unset fields fall back to the data_pipeline section."""
+    layer: str
+    identity_prompt_path: str
+    task_prompt_path: str
+    output_dir_md: str
+    output_dir_excel: str
+    provider: Optional[str] = None
+    provider_config: Optional[ProviderConfig] = None
+    model: Optional[str] = None
+    temperature: Optional[float] = Field(default=None, ge=0.0, le=1.0)
+    ctx_size: Optional[int] = Field(default=None, ge=0)
+    max_in_flight: Optional[int] = Field(default=None, ge=1)
+
+
+class FusedPipelineConfig(BaseModel):
+    session_id: Optional[str] = None
+    cycle_count: Optional[int] = Field(default=None, ge=0)
+    queue_size: int = Field(default=64, ge=1)
+    extra_layers: List[FusedLayerConfig] = Field(default_factory=list)
+
+
+class WorkQueueConfig(BaseModel):
+    """Shared job queue for the queue-coordinator and queue-worker modes."""
+    path: str = "outputs/work_queue.sqlite"
+    pipeline: Literal["layer1", "layer2"] = "layer1"
+    lease_seconds: float = Field(default=300.0, gt=0)
+    max_attempts: int = Field(default=3, ge=1)
+    retry_backoff: float = Field(default=1.0, ge=0.0)
+    poll_interval: float = Field(default=2.0, gt=0)
+    idle_timeout: float = Field(default=30.0, ge=0)
+    batch_size: int = Field(default=64, ge=1)
+    concurrency: int = Field(default=4, ge=1)
+    worker_id: Optional[str] = None
+    provider: Optional[str] = None
+    provider_config: Optional[ProviderConfig] = None
+
+
+class MetricsConfig(BaseModel):
+    enabled: bool = False
+    dir: str = "outputs/metrics"
+    prometheus_port: Optional[int] = Field(default=None, ge=0, le=65535)
 
 
 class MAUConfig(BaseModel):
     conversation: ConversationConfig
+    conversation_batch: ConversationBatchConfig = Field(default_factory=ConversationBatchConfig)
     data_pipeline: DataPipelineConfig
     data_pipeline_layer1: DataPipelineLayer1Config
+    fused_pipeline: FusedPipelineConfig = Field(default_factory=FusedPipelineConfig)
+    work_queue: WorkQueueConfig = Field(default_factory=WorkQueueConfig)
     output_formats: List[str]
+    metrics: MetricsConfig = Field(default_factory=MetricsConfig)
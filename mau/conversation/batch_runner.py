@@ -0,0 +1,166 @@
+# mau/conversation/batch_runner.py
+
+import logging
+import os
+from dataclasses import dataclass
+from datetime import datetime
+from itertools import product
+from typing import Iterator, List, Optional
+
+from mau.conversation.conversation_manager import ConversationManager
+from mau.conversation.transcript import TranscriptWriter, compact_transcript
+from mau.llm.ai_being import AIBeing
+from mau.llm.provider_factory import choose_provider
+from mau.utils.concurrency import ordered_map
+from mau.utils.file_helpers import ensure_file_exists, load_prompt
+from mau.utils.metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_AGENT1_PROMPT_PATH = "config/agent1_system_prompt.md"
+DEFAULT_AGENT2_PROMPT_PATH = "config/agent2_system_prompt.md"
+DEFAULT_INITIAL_MESSAGE_PATH = "config/initial_message.md"
+
+
+@dataclass(frozen=True)
+class ConversationJob:
+    """One conversation of a batch: a prompt pair, an initial message and a seed."""
+    job_id: str
+    agent1_system_prompt: str
+    agent2_system_prompt: str
+    initial_message: Optional[str]
+    seed: Optional[int]
+
+
+def build_jobs(batch_config: dict) -> Iterator[ConversationJob]:
+    """
+    Yield the product of prompt pairs x initial messages x seeds (x repeats) as jobs.
+
+    Prompt and message files are read once up front. Job ids encode the position in each
+    list, so they stay stable across runs of the same config and double as file names.
+    """
+    pairs = batch_config.get("prompt_pairs")
+    if not pairs:
+        ensure_file_exists(DEFAULT_AGENT1_PROMPT_PATH, default_content="You are the default system prompt for Agent 1.")
+        ensure_file_exists(DEFAULT_AGENT2_PROMPT_PATH, default_content="You are the default system prompt for Agent 2.")
+        pairs = [{"agent1_system_prompt_path": DEFAULT_AGENT1_PROMPT_PATH,
+                  "agent2_system_prompt_path": DEFAULT_AGENT2_PROMPT_PATH}]
+    prompts = [(load_prompt(pair["agent1_system_prompt_path"]), load_prompt(pair["agent2_system_prompt_path"]))
+               for pair in pairs]
+    message_paths = batch_config.get("initial_message_paths")
+    if not message_paths:
+        ensure_file_exists(DEFAULT_INITIAL_MESSAGE_PATH, default_content="Hello! This is the default initial message.")
+        message_paths = [DEFAULT_INITIAL_MESSAGE_PATH]
+    messages = [load_prompt(path).strip() or None for path in message_paths]
+    seeds = batch_config.get("seeds") or [None]
+    repeats = batch_config.get("repeats") or 1
+
+    for (p, (prompt1, prompt2)), (m, message), seed, r in product(
+            enumerate(prompts), enumerate(messages), seeds, range(repeats)):
+        seed_label = "none" if seed is None else seed
+        yield ConversationJob(
+            job_id=f"pair{p:03d}_msg{m:03d}_seed{seed_label}_rep{r:03d}",
+            agent1_system_prompt=prompt1,
+            agent2_system_prompt=prompt2,
+            initial_message=message,
+            seed=seed,
+        )
+
+
+def _build_agent(agent_conf: dict, system_prompt: str, seed: Optional[int]) -> AIBeing:
+    provider_config = dict(agent_conf.get("provider_config") or {})
+    if seed is not None:
+        provider_config["seed"] = seed
+    return AIBeing(
+        name=agent_conf["name"],
+        model=agent_conf["model"],
+        temperature=agent_conf.get("temperature", 0.8),
+        ctx_size=agent_conf.get("ctx_size", 2048),
+        system_prompt=system_prompt,
+        provider=choose_provider(agent_conf["provider"], provider_config),
+        history_strategy=agent_conf.get("history_strategy") or "sliding_window",
+        response_reserve=agent_conf.get("response_reserve_tokens"),
+    )
+
+
+def transcript_path(output_dir: str, job: ConversationJob) -> str:
+    return os.path.join(output_dir, f"{job.job_id}.json")
+
+
+def run_job(job: ConversationJob, conversation_config: dict, output_dir: str, max_turns: int,
+            fsync_every: int = 16) -> Optional[int]:
+    """
+    Run one conversation to max_turns replies, streaming it to a JSONL transcript.
+
+    Once the conversation ends the transcript is compacted into the conversation JSON
+    format, which is renamed into place, so a .json file under output_dir is always
+    complete. A failed conversation keeps its partial .jsonl transcript until the batch
+    is re-run. Returns the number of messages (the initial message included), or None
+    if the conversation failed.
+    """
+    settings = conversation_config["settings"]
+    path = transcript_path(output_dir, job)
+    jsonl_path = os.path.splitext(path)[0] + ".jsonl"
+    if os.path.exists(jsonl_path):
+        os.remove(jsonl_path)  # partial transcript of an earlier, interrupted attempt
+    try:
+        with TranscriptWriter(jsonl_path, fsync_every=fsync_every) as transcript:
+            manager = ConversationManager(
+                agent1=_build_agent(conversation_config["agent1"], job.agent1_system_prompt, job.seed),
+                agent2=_build_agent(conversation_config["agent2"], job.agent2_system_prompt, job.seed),
+                initial_message=job.initial_message,
+                use_markdown=settings.get("use_markdown", False),
+                allow_termination=settings.get("allow_termination", False),
+                prefetch=settings.get("prefetch", False),
+                prefetch_queue_size=settings.get("prefetch_queue_size") or 1024,
+                warmup=settings.get("warmup", False),
+                max_turns=max_turns,
+                transcript=transcript,
+            )
+            turns = 0
+            for _, message_stream in manager.run_conversation():
+                for _ in message_stream:
+                    pass
+                turns += 1
+    except Exception as e:
+        logger.error(f"Conversation {job.job_id} failed: {e}")
+        return None
+
+    compact_transcript(jsonl_path, path, remove_jsonl=True)
+    return turns
+
+
+def run_conversation_batch(conversation_config: dict, batch_config: Optional[dict] = None):
+    """
+    Headless batch mode: run many independent conversations between the configured agents.
+
+    Up to `concurrency` conversations run at once, each stopping after `max_turns` replies.
+    Each conversation streams to its own transcript under `output_dir`, compacted to JSON
+    when it finishes; conversations whose JSON transcript already exists are skipped, so
+    re-running a batch resumes it.
+    """
+    batch_config = batch_config or {}
+    output_dir = batch_config.get("output_dir") or "outputs/conversations"
+    max_turns = batch_config.get("max_turns") or 10
+    concurrency = batch_config.get("concurrency") or 4
+    fsync_every = batch_config.get("fsync_every") or 16
+    os.makedirs(output_dir, exist_ok=True)
+    get_metrics().start_session(f"conversation_batch_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+
+    jobs = [job for job in build_jobs(batch_config) if not os.path.exists(transcript_path(output_dir, job))]
+    logger.info(f"Running {len(jobs)} conversations ({concurrency} at a time, {max_turns} turns each) into {output_dir}")
+
+    failed: List[str] = []
+    finished = 0
+    for job, turns in ordered_map(lambda job: run_job(job, conversation_config, output_dir, max_turns, fsync_every),
+                                  jobs, max_workers=concurrency):
+        if turns is None:
+            failed.append(job.job_id)
+        else:
+            finished += 1
+            logger.debug(f"Conversation {job.job_id} finished after {turns} messages")
+
+    logger.info(f"Batch finished: {finished} conversations written, {len(failed)} failed")
+    if failed:
+        logger.warning(f"Failed conversations (re-run the batch to retry): {', '.join(failed)}")
+    return finished, failed
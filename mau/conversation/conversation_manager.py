@@ -1,8 +1,15 @@
 import json
+import queue
+import threading
 from dataclasses import dataclass, field
-from typing import Iterator, List, Dict, TypedDict
+from typing import Iterator, List, Dict, Optional, TypedDict
 
+from mau.conversation.transcript import TranscriptWriter, agent_info, compact_transcript, iter_transcript_messages
 from mau.llm.ai_being import AIBeing
+from mau.llm.stream_metrics import StreamStats
+
+# Events passed from the prefetch producer thread to the consumer.
+_TURN, _CHUNK, _END, _DONE, _ERROR = range(5)
 
 class ConversationLogItem(TypedDict):
     agent: str
@@ -15,7 +22,17 @@ class ConversationManager:
     initial_message: str | None
     use_markdown: bool = False
     allow_termination: bool = False
+    max_turns: Optional[int] = None  # agent replies after the initial message; None runs until terminated
+    # When set, each turn is appended to this JSONL transcript instead of being kept in memory.
+    transcript: Optional[TranscriptWriter] = None
+    # Generate turns on a background thread, ahead of the consumer, through a bounded chunk queue.
+    prefetch: bool = False
+    prefetch_queue_size: int = 1024
+    # Load both agents' models concurrently when the conversation starts.
+    warmup: bool = False
     _conversation_log: List[ConversationLogItem] = field(default_factory=list, init=False)
+    _turn_agent: Optional[AIBeing] = field(default=None, init=False)
+    _consumed_stats: Optional[StreamStats] = field(default=None, init=False)
 
     def __post_init__(self):
         # Append extra instructions based on settings to the system prompts.
@@ -26,19 +43,116 @@ class ConversationManager:
             instruction += "\n\nYou may end the conversation by outputting `<TERMINATE>`."
         self.agent1.system_prompt += instruction
         self.agent2.system_prompt += instruction
+        if self.transcript is not None:
+            self.transcript.write_header(self.agent1, self.agent2)
+
+    def _log_message(self, agent: str, content: str):
+        if self.transcript is not None:
+            self.transcript.write_message(agent, content)
+        else:
+            self._conversation_log.append({"agent": agent, "content": content})
+
+    def conversation_log(self) -> Iterator[ConversationLogItem]:
+        """Yield the messages so far, read back from the transcript when one is attached."""
+        if self.transcript is not None:
+            self.transcript.flush()
+            return iter_transcript_messages(self.transcript.path)
+        return iter(self._conversation_log)
+
+    def start_warmup(self) -> List[threading.Thread]:
+        """
+        Warm up both agents on background threads without waiting, so loading one
+        backend's model overlaps the other agent's first turn.
+        """
+        threads = [threading.Thread(target=agent.warmup, daemon=True, name=f"warmup-{agent.name}")
+                   for agent in (self.agent1, self.agent2)]
+        for thread in threads:
+            thread.start()
+        return threads
 
     def run_conversation(self) -> Iterator[tuple[str, Iterator[str]]]:
+        if self.warmup:
+            self.start_warmup()
+        if self.prefetch:
+            return self._run_prefetched()
+        return self._run_turns()
+
+    def _run_prefetched(self) -> Iterator[tuple[str, Iterator[str]]]:
+        """
+        Run _run_turns on a producer thread that consumes every reply as it streams in,
+        so the next agent's request goes out as soon as the previous reply ends rather
+        than when the consumer has finished displaying it. The consumer reads turns from
+        a queue of at most prefetch_queue_size events.
+        """
+        events: queue.Queue = queue.Queue(maxsize=max(1, self.prefetch_queue_size))
+        stop = threading.Event()
+
+        def put(event) -> bool:
+            while not stop.is_set():
+                try:
+                    events.put(event, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def produce():
+            try:
+                for agent_name, stream in self._run_turns():
+                    if not put((_TURN, agent_name)):
+                        return
+                    for chunk in stream:
+                        if not put((_CHUNK, chunk)):
+                            return
+                    stats = self._turn_agent.last_turn_stats if self._turn_agent else None
+                    if not put((_END, stats)):
+                        return
+            except BaseException as e:
+                put((_ERROR, e))
+                return
+            put((_DONE, None))
+
+        def turn_chunks() -> Iterator[str]:
+            while True:
+                kind, value = events.get()
+                if kind == _CHUNK:
+                    yield value
+                elif kind == _END:
+                    self._consumed_stats = value
+                    return
+                elif kind == _ERROR:
+                    raise value
+
+        producer = threading.Thread(target=produce, daemon=True, name="conversation-prefetch")
+        producer.start()
+        try:
+            while True:
+                kind, value = events.get()
+                if kind == _DONE:
+                    return
+                if kind == _ERROR:
+                    raise value
+                stream = turn_chunks()
+                yield (value, stream)
+                for _ in stream:  # drain whatever the consumer did not read
+                    pass
+        finally:
+            stop.set()
+
+    def _run_turns(self) -> Iterator[tuple[str, Iterator[str]]]:
         last_message = self.initial_message
         is_agent1_turn = True
+        replies = 0
 
         # If an initial message is provided, let agent1 start.
         if self.initial_message is not None:
             self.agent1.add_message("assistant", self.initial_message)
-            self._conversation_log.append({"agent": self.agent1.name, "content": self.initial_message})
+            self._log_message(self.agent1.name, self.initial_message)
+            self._turn_agent = None
             yield (self.agent1.name, iter([self.initial_message]))
             is_agent1_turn = False
 
-        while True:
+        while self.max_turns is None or replies < self.max_turns:
             current_agent = self.agent1 if is_agent1_turn else self.agent2
             response_stream = current_agent.chat(last_message)
             last_message_chunks = []
@@ -48,13 +162,21 @@ class ConversationManager:
                     last_message_chunks.append(chunk)
                     yield chunk
 
+            self._turn_agent = current_agent
             yield (current_agent.name, stream_chunks())
             last_message = "".join(last_message_chunks).strip()
-            self._conversation_log.append({"agent": current_agent.name, "content": last_message})
+            self._log_message(current_agent.name, last_message)
+            replies += 1
             if self.allow_termination and "<TERMINATE>" in last_message:
                 break
             is_agent1_turn = not is_agent1_turn
 
+    def last_turn_stats(self) -> Optional[StreamStats]:
+        """Latency figures of the turn whose stream was consumed last (None for the initial message)."""
+        if self.prefetch:
+            return self._consumed_stats
+        return self._turn_agent.last_turn_stats if self._turn_agent else None
+
     def save_conversation(self, filename: str):
         # Existing text file saving method.
         with open(filename, "w", encoding="utf-8") as f:
@@ -65,22 +187,18 @@ class ConversationManager:
             f.write(f"Model: {self.agent2.model}\n")
             f.write(f"System Prompt: {self.agent2.system_prompt}\n\n")
             f.write("=== Conversation Log ===\n")
-            for msg in self._conversation_log:
+            for msg in self.conversation_log():
                 f.write(f"{msg['agent']}: {msg['content']}\n")
 
     def save_conversation_json(self, filename: str):
         # New method to save the conversation in JSON format.
+        if self.transcript is not None:
+            self.transcript.flush()
+            compact_transcript(self.transcript.path, filename)
+            return
         data = {
-            "agent1": {
-                "name": self.agent1.name,
-                "model": self.agent1.model,
-                "system_prompt": self.agent1.system_prompt,
-            },
-            "agent2": {
-                "name": self.agent2.name,
-                "model": self.agent2.model,
-                "system_prompt": self.agent2.system_prompt,
-            },
+            "agent1": agent_info(self.agent1),
+            "agent2": agent_info(self.agent2),
             "conversation": self._conversation_log
         }
         with open(filename, "w", encoding="utf-8") as f:
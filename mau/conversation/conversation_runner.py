@@ -1,33 +1,19 @@
 import logging
+import os
+import shutil
+from datetime import datetime
 from prompt_toolkit import prompt
-from prompt_toolkit.completion import WordCompleter
 from rich.console import Console
-from rich.markdown import Markdown
 from mau.conversation.conversation_manager import ConversationManager
+from mau.conversation.transcript import TranscriptWriter, compact_transcript
 from mau.llm.ai_being import AIBeing
-from mau.llm import provider_ollama, provider_openai, provider_lmstudio
+from mau.llm.provider_factory import choose_provider
 from mau.utils.file_helpers import ensure_file_exists, load_prompt
+from mau.utils.metrics import get_metrics
 
 logger = logging.getLogger(__name__)
 console = Console()
 
-def choose_provider(provider_name: str, provider_config: dict = None):
-    provider_config = provider_config or {}
-    if provider_name.lower() == "ollama":
-        return provider_ollama.OllamaProvider()
-    elif provider_name.lower() == "openai":
-        base_url = provider_config.get("base_url", "https://api.openai.com/v1")
-        api_key = provider_config.get("api_key", "")
-        return provider_openai.OpenAIProvider(base_url, api_key)
-    elif provider_name.lower() == "lmstudio":
-        base_url = provider_config.get("base_url", "http://localhost:1234/v1")
-        api_key = provider_config.get("api_key", "")
-        # For conversation mode, we disable streaming.
-        return provider_lmstudio.LMStudioProvider(base_url, api_key, stream=False)
-    else:
-        raise ValueError(f"Unknown provider: {provider_name}")
-
-
 def run_conversation_mode(config: dict):
     # Create agents from config
     agent1_conf = config["agent1"]
@@ -49,8 +35,9 @@ def run_conversation_mode(config: dict):
     ensure_file_exists(init_message_path, default_content="Hello! This is the default initial message.")
     initial_message = load_prompt(init_message_path).strip()
 
-    provider1 = choose_provider(agent1_conf["provider"], agent1_conf.get("provider_config"))
-    provider2 = choose_provider(agent2_conf["provider"], agent2_conf.get("provider_config"))
+    # Stream tokens so replies show up as they are generated.
+    provider1 = choose_provider(agent1_conf["provider"], agent1_conf.get("provider_config"), stream=True)
+    provider2 = choose_provider(agent2_conf["provider"], agent2_conf.get("provider_config"), stream=True)
 
     # 3) Build AIBeing objects using the newly loaded prompt
     agent1 = AIBeing(
@@ -60,6 +47,8 @@ def run_conversation_mode(config: dict):
         ctx_size=agent1_conf.get("ctx_size", 2048),
         system_prompt=agent1_system_prompt,  # <--- FROM FILE!
         provider=provider1,
+        history_strategy=agent1_conf.get("history_strategy") or "sliding_window",
+        response_reserve=agent1_conf.get("response_reserve_tokens"),
     )
 
     agent2 = AIBeing(
@@ -69,15 +58,27 @@ def run_conversation_mode(config: dict):
         ctx_size=agent2_conf.get("ctx_size", 2048),
         system_prompt=agent2_system_prompt,  # <--- FROM FILE!
         provider=provider2,
+        history_strategy=agent2_conf.get("history_strategy") or "sliding_window",
+        response_reserve=agent2_conf.get("response_reserve_tokens"),
     )
 
+    # Every turn is appended to a JSONL transcript as it finishes, so an interrupted run keeps it.
+    transcript_dir = settings.get("transcript_dir") or "outputs/transcripts"
+    transcript_path = os.path.join(transcript_dir, f"conversation_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl")
+    get_metrics().start_session(os.path.splitext(os.path.basename(transcript_path))[0])
+    transcript = TranscriptWriter(transcript_path, fsync_every=settings.get("transcript_fsync_every") or 16)
+
     # Then everything else is the same
     manager = ConversationManager(
         agent1=agent1,
         agent2=agent2,
         initial_message=initial_message,
         use_markdown=settings.get("use_markdown", False),
-        allow_termination=settings.get("allow_termination", False)
+        allow_termination=settings.get("allow_termination", False),
+        prefetch=settings.get("prefetch", False),
+        prefetch_queue_size=settings.get("prefetch_queue_size") or 1024,
+        warmup=settings.get("warmup", False),
+        transcript=transcript,
     )
 
     console.print("[bold cyan]=== Conversation Started ===\n[/bold cyan]")
@@ -86,14 +87,28 @@ def run_conversation_mode(config: dict):
             console.print(f"[bold magenta]{agent_name}:[/bold magenta]", end=" ")
             for chunk in message_stream:
                 console.print(chunk, end="")
+            stats = manager.last_turn_stats()
+            if stats is not None and stats.time_to_first_token is not None:
+                tokens_per_s = f"{stats.tokens_per_second:.1f} tok/s" if stats.tokens_per_second else "n/a tok/s"
+                console.print(f"\n[dim]TTFT {stats.time_to_first_token:.2f}s · {tokens_per_s} · {stats.completion_tokens} tokens[/dim]", end="")
+                logger.debug(f"{agent_name} turn: {stats.as_dict()}")
             console.print("\n" + "-" * 80)
     except KeyboardInterrupt:
         console.print("\n[bold red]Conversation interrupted by user.[/bold red]")
+    finally:
+        transcript.flush()
 
     console.print("\n[bold cyan]=== Conversation Ended ===[/bold cyan]")
 
-    save = prompt("Save conversation as JSON? (y/N): ").strip().lower()
-    if save in ("y", "yes"):
-        filename = prompt("Enter JSON filename (e.g., conversation.json): ").strip()
-        manager.save_conversation_json(filename)
-        console.print(f"Conversation saved to {filename} in JSON format.")
\ No newline at end of file
+    # The finished transcript is always compacted to the JSON format next to the JSONL file;
+    # the prompt only chooses where the JSON file ends up.
+    transcript.close()
+    json_path = compact_transcript(transcript_path, os.path.splitext(transcript_path)[0] + ".json",
+                                   remove_jsonl=True)
+    try:
+        filename = prompt(f"Save conversation JSON to (Enter keeps {json_path}): ").strip()
+    except (EOFError, KeyboardInterrupt):
+        filename = ""
+    if filename and os.path.abspath(filename) != os.path.abspath(json_path):
+        json_path = shutil.move(json_path, filename)
+    console.print(f"Conversation saved to {json_path} in JSON format.")
\ No newline at end of file
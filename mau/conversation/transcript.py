@@ -0,0 +1,79 @@
+# mau/conversation/transcript.py
+
+import json
+import os
+from typing import Any, Dict, Iterator, Optional
+
+from mau.data_pipeline.result_sink import JSONLResultSink
+
+
+def agent_info(agent) -> Dict[str, str]:
+    return {"name": agent.name, "model": agent.model, "system_prompt": agent.system_prompt}
+
+
+class TranscriptWriter:
+    """
+    Write-as-you-go JSONL transcript of one conversation.
+
+    The first line describes the two agents and every following line is one message.
+    Lines reach the OS as they are written and are fsynced every fsync_every lines, so
+    a crash or Ctrl-C keeps every finished turn.
+    """
+
+    def __init__(self, path: str, fsync_every: int = 16):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._sink = JSONLResultSink(path, fsync_every=fsync_every)
+
+    def write_header(self, agent1, agent2):
+        self._sink.append({"type": "header", "agent1": agent_info(agent1), "agent2": agent_info(agent2)})
+
+    def write_message(self, agent: str, content: str):
+        self._sink.append({"type": "message", "agent": agent, "content": content})
+
+    def flush(self):
+        self._sink.flush()
+
+    def close(self):
+        self._sink.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def iter_transcript_messages(path: str) -> Iterator[Dict[str, Any]]:
+    """Yield the {"agent", "content"} messages of a JSONL transcript without loading it whole."""
+    for row in JSONLResultSink.read_rows_from(path):
+        if row.get("type") == "message":
+            yield {"agent": row["agent"], "content": row["content"]}
+
+
+def read_transcript_header(path: str) -> Optional[Dict[str, Any]]:
+    for row in JSONLResultSink.read_rows_from(path):
+        return row if row.get("type") == "header" else None
+    return None
+
+
+def compact_transcript(jsonl_path: str, json_path: str, remove_jsonl: bool = False) -> str:
+    """
+    Rewrite a JSONL transcript in the conversation JSON format (agent1, agent2, conversation).
+
+    The JSON file is written to a temporary path and renamed into place, so it is
+    never left half-written.
+    """
+    header = read_transcript_header(jsonl_path) or {}
+    data = {
+        "agent1": header.get("agent1", {}),
+        "agent2": header.get("agent2", {}),
+        "conversation": list(iter_transcript_messages(jsonl_path)),
+    }
+    tmp_path = json_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, json_path)
+    if remove_jsonl:
+        os.remove(jsonl_path)
+    return json_path
@@ -0,0 +1,153 @@
+# mau/data_pipeline/checkpoint.py
+
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional
+
+IN_FLIGHT = "in_flight"
+COMPLETED = "completed"
+FAILED = "failed"
+
+
+class CheckpointIndex:
+    """
+    Per-session SQLite index of cycle states (in flight, completed, failed).
+
+    Resume reads the highest recorded cycle and the few cycles that are not
+    completed instead of rescanning the output files. Marks are not committed
+    one by one; callers commit once the matching result rows are durable (see
+    sync_with), so the index never claims a cycle whose row could still be lost.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cycles ("
+            " cycle INTEGER PRIMARY KEY,"
+            " status TEXT NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " error TEXT,"
+            " updated_at TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cycles_status ON cycles(status)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._conn.commit()
+
+    def _set_status(self, cycle: int, status: str, error: Optional[str] = None, attempt: int = 0):
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO cycles (cycle, status, attempts, error, updated_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(cycle) DO UPDATE SET status = excluded.status,"
+                " attempts = cycles.attempts + excluded.attempts,"
+                " error = excluded.error, updated_at = excluded.updated_at",
+                (int(cycle), status, attempt, error, now),
+            )
+
+    def mark_in_flight(self, cycle: int):
+        self._set_status(cycle, IN_FLIGHT, attempt=1)
+
+    def mark_completed(self, cycle: int):
+        self._set_status(cycle, COMPLETED)
+
+    def mark_failed(self, cycle: int, error: Optional[str] = None):
+        self._set_status(cycle, FAILED, error=error)
+
+    def mark_many(self, cycles: Iterable[int], status: str):
+        """Record the same status for many cycles at once (used when importing legacy sessions)."""
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO cycles (cycle, status, attempts, error, updated_at) VALUES (?, ?, 0, NULL, ?)",
+                ((int(cycle), status, now) for cycle in cycles),
+            )
+
+    def commit(self):
+        with self._lock:
+            self._conn.commit()
+
+    def sync_with(self, sink):
+        """Commit pending marks if the result sink has no rows waiting to be made durable."""
+        if sink.pending_rows == 0:
+            self.commit()
+
+    def status(self, cycle: int) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT status FROM cycles WHERE cycle = ?", (int(cycle),)).fetchone()
+        return row[0] if row else None
+
+    def statuses(self, cycles: Iterable[int]) -> Dict[int, str]:
+        """Look up the recorded status of a batch of cycles with one query."""
+        cycles = [int(cycle) for cycle in cycles]
+        if not cycles:
+            return {}
+        placeholders = ", ".join("?" for _ in cycles)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT cycle, status FROM cycles WHERE cycle IN ({placeholders})", cycles
+            ).fetchall()
+        return dict(rows)
+
+    def attempts(self, cycle: int) -> int:
+        """How many times the cycle has been started (marked in flight)."""
+        with self._lock:
+            row = self._conn.execute("SELECT attempts FROM cycles WHERE cycle = ?", (int(cycle),)).fetchone()
+        return row[0] if row else 0
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM cycles LIMIT 1").fetchone() is None
+
+    def last_cycle(self) -> int:
+        """Highest cycle recorded in any state."""
+        with self._lock:
+            row = self._conn.execute("SELECT MAX(cycle) FROM cycles").fetchone()
+        return row[0] or 0
+
+    def last_completed_cycle(self) -> int:
+        with self._lock:
+            row = self._conn.execute("SELECT MAX(cycle) FROM cycles WHERE status = ?", (COMPLETED,)).fetchone()
+        return row[0] or 0
+
+    def pending_cycles(self, up_to: Optional[int] = None) -> List[int]:
+        """Cycles that were started or failed but never completed (e.g. failures or a crash mid-flight)."""
+        query = "SELECT cycle FROM cycles WHERE status != ?"
+        params = [COMPLETED]
+        if up_to is not None:
+            query += " AND cycle <= ?"
+            params.append(int(up_to))
+        with self._lock:
+            rows = self._conn.execute(query + " ORDER BY cycle", params).fetchall()
+        return [row[0] for row in rows]
+
+    def cycles_to_run(self, cycle_count: int) -> Iterator[int]:
+        """Yield unfinished cycles first, then every cycle after the highest recorded one."""
+        pending = self.pending_cycles(cycle_count)
+        last_cycle = self.last_cycle()
+        yield from pending
+        yield from range(last_cycle + 1, cycle_count + 1)
+
+    def get_meta(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key: str, value):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def close(self):
+        self.commit()
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -1,11 +1,24 @@
 import os
-import pandas as pd
 from datetime import datetime
 import logging
-from mau.llm import provider_lmstudio, provider_openai, provider_ollama
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from mau.llm.llm_provider import LLMProvider
+from mau.llm.provider_factory import choose_provider
+from mau.utils.concurrency import ordered_map
 from mau.utils.logger import setup_logging
-from mau.plugins.output_format_plugin import output_as_csv
-import openai
+from mau.utils.metrics import get_metrics
+from mau.utils.retry import call_with_retry
+from mau.data_pipeline.checkpoint import COMPLETED, CheckpointIndex
+from mau.data_pipeline.input_reader import iter_input_rows
+from mau.data_pipeline.md_archive import (
+    MarkdownArchive, export_markdown, md_archive_base, md_archive_exists, open_md_archive,
+)
+from mau.data_pipeline.postprocess import PostProcessor, Rejected
+from mau.data_pipeline.result_sink import (
+    RESULT_COLUMNS, ResultSink, open_result_sink, result_sink_exists, seed_from_excel,
+)
+from mau.plugins.output_format_plugin import output_as_csv, output_as_excel, rows_to_frame
 
 logger = logging.getLogger(__name__)
 
@@ -31,83 +44,222 @@ def load_prompt(file_path: str, default_content: str = "Default prompt content")
         return file.read()
 
 
-def get_last_completed_cycle(session_id: str, excel_output_path: str) -> int:
-    if not os.path.exists(excel_output_path):
-        return 0
-    df = pd.read_excel(excel_output_path)
-    if df.empty:
-        return 0
-    return int(df["Cycle Number"].max())
+def get_last_completed_cycle(checkpoint: CheckpointIndex) -> int:
+    # The checkpoint index is opened per session, so it needs no session filter.
+    return checkpoint.last_completed_cycle()
+
+def open_checkpoint_layer002(output_dir_excel: str, session_id: str, sink: ResultSink,
+                             layer: str = "L002") -> CheckpointIndex:
+    """Open the Layer 002 checkpoint index, importing the cycles of an existing result store once."""
+    checkpoint_path = os.path.join(output_dir_excel, f"response_{layer}_session_{session_id}.checkpoint.sqlite")
+    checkpoint = CheckpointIndex(checkpoint_path)
+    if checkpoint.is_empty():
+        saved = [int(row["Cycle Number"]) for row in sink.read_rows() if row.get("Session ID", session_id) == session_id]
+        if saved:
+            checkpoint.mark_many(saved, COMPLETED)
+            checkpoint.commit()
+            logger.info(f"Imported {len(saved)} completed cycles into {checkpoint_path}")
+    return checkpoint
 
 def generate_layer002_response(identity_prompt: str, task_prompt: str, layer001_response: str,
-                               provider, model: str, temperature: float) -> str:
+                               provider: LLMProvider, model: str, temperature: float,
+                               ctx_size: int = 2048) -> str:
     combined_prompt = f"Layer 1 Response: {layer001_response}\n\n{task_prompt}"
     try:
-        # Using the provider's non-streaming mode for simplicity
         messages = [
             {"role": "system", "content": identity_prompt},
             {"role": "user", "content": combined_prompt}
         ]
-        # For demonstration, we use openai.ChatCompletion.create directly.
-        completion = openai.ChatCompletion.create(
-            model=model,
-            messages=messages,
-            temperature=temperature,
-            stream=False,
-        )
-        return completion.choices[0].message.content
+        return "".join(provider.chat(model, messages, temperature, ctx_size))
     except Exception as e:
         logger.error(f"Error during LLM call: {e}")
         return None
 
 def save_output_layer002(identity_prompt: str, task_prompt: str, response: str, cycle_number: int, session_id: str,
-                         output_dir_md: str, output_dir_excel: str):
-    os.makedirs(output_dir_md, exist_ok=True)
+                         output_dir_md: str, sink: ResultSink, layer: str = "L002",
+                         archive: Optional[MarkdownArchive] = None):
+    with get_metrics().timer("mau_file_write_seconds", stage="layer2" if layer == "L002" else layer):
+        md_filename = f"response_{layer}_session_{session_id}_cycle_{cycle_number}.md"
+        content = f"Input:\n{task_prompt}\n\nOutput:\n{response}"
+        if archive is not None:
+            archive.append(int(cycle_number), md_filename, content)
+        else:
+            os.makedirs(output_dir_md, exist_ok=True)
+            with open(os.path.join(output_dir_md, md_filename), "w", encoding="utf-8") as f:
+                f.write(content)
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        sink.append({
+            "Session ID": session_id,
+            "Cycle Number": int(cycle_number),
+            "Timestamp": timestamp,
+            "Identity Prompt": identity_prompt,
+            "Task Prompt": task_prompt,
+            "Generated Response": response
+        })
+
+def open_session_sink_layer002(output_dir_excel: str, session_id: str,
+                               result_format: str = "jsonl", fsync_every: int = 16,
+                               layer: str = "L002") -> ResultSink:
+    """Open the append-only Layer 002 result store, importing a legacy Excel log if present."""
     os.makedirs(output_dir_excel, exist_ok=True)
-    md_output_path = os.path.join(output_dir_md, f"response_L002_session_{session_id}_cycle_{cycle_number}.md")
-    with open(md_output_path, "w", encoding="utf-8") as f:
-        f.write(f"Input:\n{task_prompt}\n\nOutput:\n{response}")
-    excel_output_path = os.path.join(output_dir_excel, f"response_L002_session_{session_id}.xlsx")
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    df_new = pd.DataFrame({
-        "Session ID": [session_id],
-        "Cycle Number": [cycle_number],
-        "Timestamp": [timestamp],
-        "Identity Prompt": [identity_prompt],
-        "Task Prompt": [task_prompt],
-        "Generated Response": [response]
-    })
-    if os.path.exists(excel_output_path):
-        df_existing = pd.read_excel(excel_output_path)
-        df_combined = pd.concat([df_existing, df_new], ignore_index=True)
-    else:
-        df_combined = df_new
-    df_combined.to_excel(excel_output_path, index=False)
+    base_path = os.path.join(output_dir_excel, f"response_{layer}_session_{session_id}")
+    excel_path = f"{base_path}.xlsx"
+    is_new = not result_sink_exists(base_path, result_format)
+    sink = open_result_sink(base_path, result_format, fsync_every)
+    if is_new and os.path.exists(excel_path):
+        seed_from_excel(sink, excel_path)
+    return sink
+
+def export_outputs_layer002(sink: ResultSink, session_id: str, output_dir_excel: str, output_formats: list,
+                            layer: str = "L002"):
+    """Write the Excel and/or CSV exports of the Layer 002 result store."""
+    output_formats = output_formats or ["excel", "csv"]
+    df = rows_to_frame(sink.read_rows(), RESULT_COLUMNS)
+    if "excel" in output_formats:
+        output_as_excel(df, os.path.join(output_dir_excel, f"response_{layer}_session_{session_id}.xlsx"))
     # Call CSV output plugin if enabled
-    output_as_csv(df_combined, session_id)
+    if "csv" in output_formats:
+        output_as_csv(df, session_id, layer)
+
+def export_results_layer002(config: dict, output_formats: list, session_id: str):
+    """Export the Excel/CSV outputs of an existing Layer 002 session on demand."""
+    result_format = config.get("result_format", "jsonl")
+    base_path = os.path.join(config["output_dir_excel"], f"response_L002_session_{session_id}")
+    if not result_sink_exists(base_path, result_format):
+        logger.info(f"No Layer 002 results found for session {session_id} in {config['output_dir_excel']}")
+        return
+    with open_result_sink(base_path, result_format) as sink:
+        export_outputs_layer002(sink, session_id, config["output_dir_excel"], output_formats)
+
+def export_md_layer002(config: dict, session_id: str, layer: str = "L002"):
+    """Expand the Markdown archive of a Layer 002 session into one .md file per cycle."""
+    output_dir_md = config["output_dir_md"]
+    base_path = md_archive_base(output_dir_md, f"response_{layer}", session_id)
+    if not md_archive_exists(base_path):
+        logger.info(f"No Layer 002 Markdown archive found for session {session_id} in {output_dir_md}")
+        return
+    count = export_markdown(base_path, output_dir_md)
+    logger.info(f"Exported {count} Layer 002 Markdown files to {output_dir_md}")
+
+def iter_chunks(rows: Iterable, chunk_size: int) -> Iterator[List]:
+    """Group an iterable into lists of at most chunk_size items."""
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+def iter_pending_rows(rows: Iterable[Tuple[int, Dict]], checkpoint: CheckpointIndex,
+                      chunk_size: int) -> Iterator[Tuple[int, Dict]]:
+    """
+    Yield the (row index, row) pairs whose cycle is not completed yet, looking
+    statuses up one chunk at a time. Each yielded row is marked in flight.
+    """
+    for chunk in iter_chunks(rows, chunk_size):
+        statuses = checkpoint.statuses(int(row["Cycle Number"]) for _, row in chunk)
+        for row_index, row in chunk:
+            cycle_number = int(row["Cycle Number"])
+            if statuses.get(cycle_number) == COMPLETED:
+                continue
+            checkpoint.mark_in_flight(cycle_number)
+            yield row_index, row
+
+def get_input_offset(checkpoint: CheckpointIndex, input_path: str) -> int:
+    """Number of leading input rows already resolved for this input file (0 if the input changed)."""
+    if checkpoint.get_meta("input_path") != os.path.abspath(input_path):
+        checkpoint.set_meta("input_path", os.path.abspath(input_path))
+        checkpoint.set_meta("input_offset", 0)
+        return 0
+    return int(checkpoint.get_meta("input_offset", 0))
 
 def run_data_generation_mode(config: dict, output_formats: list):
+    """
+    Run the Layer 002 refinement engine over the Layer 001 dataset.
+
+    Input rows are streamed in chunks of `chunk_size`; up to `max_in_flight` requests are
+    dispatched concurrently through the configured provider, and results are written
+    back in input order. Completed cycles are skipped on resume, failed ones are retried.
+    The checkpoint remembers how many leading input rows are fully resolved, so a
+    resumed run seeks straight past them instead of re-reading the whole input.
+    Configured `postprocess` steps run on a process pool before results are saved;
+    a rejected response leaves its cycle failed, so it is regenerated on resume.
+    With md_format "archive", Markdown outputs go to one append-only archive per session
+    instead of one file per cycle; the export-md mode expands it on demand.
+    """
     # Load the identity and task prompts with default content in case they are missing.
     identity_prompt = load_prompt(config["identity_prompt_path"], "You are a helpful AI tasked with improving responses.")
     task_prompt = load_prompt(config["task_prompt_path"], "Please improve the following response.")
     
-    session_id = "1000_methods_biofabrication_L002"  # Or derive this from config/input if desired
-
-    # Get the last completed cycle from the Excel output to resume from there
-    last_completed_cycle = get_last_completed_cycle(session_id)
-
-    # Loop through the data from Layer 001 and process it in Layer 002, resuming from the last completed cycle
-    for index, row in pd.read_excel(config["layer_001_input_path"]).iterrows():
-        cycle_number = row['Cycle Number']
-        if cycle_number <= last_completed_cycle:
-            continue
-        layer001_response = row['Generated Response']
-        response = generate_layer002_response(identity_prompt, task_prompt, layer001_response, model=config["model"], temperature=config.get("temperature", 0.7))
-        if response:
-            save_output_layer002(identity_prompt, task_prompt, response, cycle_number, session_id)
-            print(f"Cycle {cycle_number} completed for Layer 002.")
-        else:
-            print(f"Cycle {cycle_number} failed for Layer 002.")
+    session_id = config.get("session_id") or "1000_methods_biofabrication_L002"
+    model = config["model"]
+    temperature = config.get("temperature", 0.7)
+    ctx_size = config.get("ctx_size", 2048)
+    max_in_flight = config.get("max_in_flight", 4)
+    chunk_size = config.get("chunk_size", 64)
+    max_retries = config.get("max_retries", 3)
+    retry_backoff = config.get("retry_backoff", 1.0)
+
+    provider = choose_provider(config["provider"], config.get("provider_config"))
+    get_metrics().start_session(f"layer2_{session_id}")
+
+    sink = open_session_sink_layer002(config["output_dir_excel"], session_id,
+                                      config.get("result_format", "jsonl"), config.get("fsync_every", 16))
+
+    checkpoint = open_checkpoint_layer002(config["output_dir_excel"], session_id, sink)
+    archive = open_md_archive(config["output_dir_md"], "response_L002", session_id,
+                              config.get("md_format", "files"), config.get("fsync_every", 16))
+    last_completed_cycle = get_last_completed_cycle(checkpoint)
+    if last_completed_cycle:
+        logger.info(f"Resuming Layer 002 session {session_id}; last completed cycle is {last_completed_cycle}")
+
+    input_path = config["layer_001_input_path"]
+    input_offset = get_input_offset(checkpoint, input_path)
+    if input_offset:
+        logger.info(f"Skipping the first {input_offset} resolved rows of {input_path}")
+
+    def process_row(job: Tuple[int, Dict]) -> str:
+        _, row = job
+        return call_with_retry(generate_layer002_response, identity_prompt, task_prompt, row["Generated Response"],
+                               provider, model, temperature, ctx_size,
+                               max_retries=max_retries, backoff=retry_backoff,
+                               description=f"Layer 002 cycle {row['Cycle Number']}")
+
+    # Completed cycles are skipped; cycles that failed or were in flight during a crash are processed again.
+    rows = enumerate(iter_input_rows(input_path, start_row=input_offset), start=input_offset)
+    jobs = iter_pending_rows(rows, checkpoint, chunk_size)
+    prefix_resolved = True
+    results = ordered_map(process_row, jobs, max_workers=max_in_flight)
+    postprocessor = PostProcessor.from_config(config)
+    if postprocessor is not None:
+        results = postprocessor.process(results)
+    try:
+        for (row_index, row), response in results:
+            cycle_number = int(row["Cycle Number"])
+            if isinstance(response, Rejected):
+                prefix_resolved = False
+                checkpoint.mark_failed(cycle_number, f"rejected by {response.step}: {response.reason}")
+                print(f"Cycle {cycle_number} rejected by {response.step} for Layer 002: {response.reason}")
+            elif response:
+                save_output_layer002(identity_prompt, task_prompt, response, cycle_number, session_id,
+                                     config["output_dir_md"], sink, archive=archive)
+                checkpoint.mark_completed(cycle_number)
+                print(f"Cycle {cycle_number} completed for Layer 002.")
+            else:
+                # A failed row pins the resume offset so it is read and retried next time.
+                prefix_resolved = False
+                checkpoint.mark_failed(cycle_number, f"no response after {max_retries} retries")
+                print(f"Cycle {cycle_number} failed for Layer 002.")
+            if prefix_resolved:
+                checkpoint.set_meta("input_offset", row_index + 1)
+            checkpoint.sync_with(sink)
+    finally:
+        if archive is not None:
+            archive.close()
+        sink.flush()
+        checkpoint.close()
+        export_outputs_layer002(sink, session_id, config["output_dir_excel"], output_formats)
+        sink.close()
 
 if __name__ == "__main__":
     # For standalone testing
@@ -121,5 +273,7 @@ if __name__ == "__main__":
         "provider": "lmstudio",
         "provider_config": {"base_url": "http://localhost:1234/v1", "api_key": "lm-studio"},
         "model": "model-identifier",
-        "temperature": 0.7
+        "temperature": 0.7,
+        "max_in_flight": 4,
+        "chunk_size": 64
     }, ["markdown", "excel", "csv"])
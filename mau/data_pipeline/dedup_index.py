@@ -0,0 +1,246 @@
+# mau/data_pipeline/dedup_index.py
+
+import functools
+import hashlib
+import logging
+import os
+import random
+import re
+import sqlite3
+import struct
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from mau.data_pipeline.result_sink import ResultSink
+
+logger = logging.getLogger(__name__)
+
+TAG = "tag"
+DROP = "drop"
+RESAMPLE = "resample"
+DEDUP_ACTIONS = (TAG, DROP, RESAMPLE)
+
+_PRIME = (1 << 31) - 1  # hash values are 32-bit, so a * h + b stays within 64 bits
+
+
+@functools.lru_cache(maxsize=8)
+def _permutations(num_perm: int, seed: int) -> Tuple[Tuple[int, int], ...]:
+    rng = random.Random(seed)
+    return tuple((rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(num_perm))
+
+
+def minhash_signature(text: str, num_perm: int = 128, shingle_size: int = 3, seed: int = 1) -> Tuple[int, ...]:
+    """
+    MinHash signature of text over word shingles. A plain function of its arguments, so
+    post-processing worker processes can compute it off the generation loop.
+    """
+    words = re.findall(r"\w+", text.lower())
+    shingles = {" ".join(words[i:i + shingle_size]) for i in range(max(1, len(words) - shingle_size + 1))}
+    hashes = [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "big") for s in shingles]
+    return tuple(min((a * h + b) % _PRIME for h in hashes) for a, b in _permutations(num_perm, seed))
+
+
+def choose_bands(num_perm: int, threshold: float) -> int:
+    """Number of LSH bands whose detection threshold (1/b)^(1/r) is closest to threshold."""
+    options = [bands for bands in range(1, num_perm + 1) if num_perm % bands == 0]
+    return min(options, key=lambda bands: abs((1.0 / bands) ** (bands / num_perm) - threshold))
+
+
+class MinHashLSHIndex:
+    """
+    Persistent MinHash-LSH index of a session's responses, for near-duplicate lookups.
+
+    Each response is reduced to num_perm MinHash values over word shingles; their
+    agreement estimates the Jaccard similarity of two responses. Signatures are split
+    into bands, and only responses sharing a whole band with the new one are compared,
+    so a lookup costs a few index probes however large the session grows. Parameters
+    are stored in the file on creation, so a reopened index keeps hashing the same way.
+    Like the checkpoint, changes are committed once the matching result rows are durable.
+    action and max_resamples say what screen() does with a near-duplicate.
+    """
+
+    def __init__(self, path: str, threshold: float = 0.8, num_perm: int = 128, shingle_size: int = 3,
+                 seed: int = 1, action: str = TAG, max_resamples: int = 2):
+        if action not in DEDUP_ACTIONS:
+            raise ValueError(f"Unknown dedup action: {action}")
+        self.action = action
+        self.max_resamples = max_resamples if action == RESAMPLE else 0
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS signatures (cycle INTEGER PRIMARY KEY, signature BLOB NOT NULL)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS buckets (band INTEGER, key INTEGER, cycle INTEGER)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS buckets_key ON buckets(band, key)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS buckets_cycle ON buckets(cycle)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS duplicates ("
+            " cycle INTEGER PRIMARY KEY,"
+            " duplicate_of INTEGER NOT NULL,"
+            " similarity REAL NOT NULL,"
+            " action TEXT NOT NULL,"
+            " updated_at TEXT NOT NULL)"
+        )
+        stored = dict(self._conn.execute("SELECT key, value FROM meta").fetchall())
+        if stored:
+            if (float(stored["threshold"]), int(stored["num_perm"])) != (threshold, num_perm):
+                logger.info(f"{path} keeps its original settings (threshold {stored['threshold']}, "
+                            f"num_perm {stored['num_perm']})")
+            threshold, num_perm = float(stored["threshold"]), int(stored["num_perm"])
+            shingle_size, seed = int(stored["shingle_size"]), int(stored["seed"])
+        else:
+            self._conn.executemany("INSERT INTO meta (key, value) VALUES (?, ?)", [
+                ("threshold", str(threshold)), ("num_perm", str(num_perm)),
+                ("shingle_size", str(shingle_size)), ("seed", str(seed)),
+            ])
+        self._conn.commit()
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.seed = seed
+        self.bands = choose_bands(num_perm, threshold)
+        self.rows = num_perm // self.bands
+
+    def signature_options(self) -> Dict[str, int]:
+        """Arguments of minhash_signature that produce signatures comparable with this index."""
+        return {"num_perm": self.num_perm, "shingle_size": self.shingle_size, "seed": self.seed}
+
+    def signature(self, text: str) -> Tuple[int, ...]:
+        return minhash_signature(text, **self.signature_options())
+
+    def _band_keys(self, signature: Tuple[int, ...]) -> List[Tuple[int, int]]:
+        keys = []
+        for band in range(self.bands):
+            values = signature[band * self.rows:(band + 1) * self.rows]
+            digest = hashlib.blake2b(struct.pack(f"<{self.rows}I", *values), digest_size=8).digest()
+            keys.append((band, int.from_bytes(digest, "big", signed=True)))
+        return keys
+
+    def _pack(self, signature: Tuple[int, ...]) -> bytes:
+        return struct.pack(f"<{self.num_perm}I", *signature)
+
+    def _unpack(self, blob: bytes) -> Tuple[int, ...]:
+        return struct.unpack(f"<{self.num_perm}I", blob)
+
+    def query(self, signature: Tuple[int, ...], exclude: Optional[int] = None) -> Optional[Tuple[int, float]]:
+        """The most similar indexed cycle at or above the threshold, as (cycle, estimated Jaccard)."""
+        with self._lock:
+            candidates = set()
+            for band, key in self._band_keys(signature):
+                candidates.update(row[0] for row in self._conn.execute(
+                    "SELECT cycle FROM buckets WHERE band = ? AND key = ?", (band, key)))
+            candidates.discard(exclude)
+            best = None
+            for cycle in sorted(candidates):
+                row = self._conn.execute("SELECT signature FROM signatures WHERE cycle = ?", (cycle,)).fetchone()
+                if row is None:
+                    continue
+                other = self._unpack(row[0])
+                similarity = sum(x == y for x, y in zip(signature, other)) / self.num_perm
+                if similarity >= self.threshold and (best is None or similarity > best[1]):
+                    best = (cycle, similarity)
+        return best
+
+    def add(self, cycle: int, signature: Tuple[int, ...]):
+        with self._lock:
+            self._conn.execute("DELETE FROM buckets WHERE cycle = ?", (int(cycle),))
+            self._conn.execute("INSERT OR REPLACE INTO signatures (cycle, signature) VALUES (?, ?)",
+                               (int(cycle), self._pack(signature)))
+            self._conn.executemany("INSERT INTO buckets (band, key, cycle) VALUES (?, ?, ?)",
+                                   [(band, key, int(cycle)) for band, key in self._band_keys(signature)])
+
+    def screen(self, cycle: int, text: str, signature: Optional[Sequence[int]] = None, attempt: int = 1,
+               signed_with: Optional[Dict[str, int]] = None) -> Optional[Tuple[str, int, float]]:
+        """
+        Check a response about to be saved against the session; every mode calls this
+        before saving. Returns None for a new response, which is indexed, or (action,
+        duplicate_of, similarity) for a near-duplicate. A tagged response is still saved
+        and a dropped one is not; both are recorded in the duplicates table. "resample" is
+        only returned while attempt (the cycle's generation count, 1 for the first) is at
+        most max_resamples; after that the response is tagged. signature is recomputed
+        when missing or when signed_with differs from signature_options().
+        """
+        if signature is None or (signed_with is not None and signed_with != self.signature_options()):
+            signature = self.signature(text)
+        signature = tuple(signature)
+        match = self.query(signature, exclude=cycle)
+        if match is None:
+            self.add(cycle, signature)
+            return None
+        if self.action == RESAMPLE and attempt <= self.max_resamples:
+            return RESAMPLE, match[0], match[1]
+        action = DROP if self.action == DROP else TAG
+        self.record_duplicate(cycle, match[0], match[1], action)
+        return action, match[0], match[1]
+
+    def record_duplicate(self, cycle: int, duplicate_of: int, similarity: float, action: str):
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO duplicates (cycle, duplicate_of, similarity, action, updated_at)"
+                " VALUES (?, ?, ?, ?, ?)", (int(cycle), int(duplicate_of), similarity, action, now))
+
+    def duplicates(self) -> Dict[int, Tuple[int, float, str]]:
+        """Every recorded duplicate: cycle -> (duplicate_of, similarity, action)."""
+        with self._lock:
+            rows = self._conn.execute("SELECT cycle, duplicate_of, similarity, action FROM duplicates").fetchall()
+        return {cycle: (duplicate_of, similarity, action) for cycle, duplicate_of, similarity, action in rows}
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM signatures LIMIT 1").fetchone() is None
+
+    def add_many(self, responses: Iterable[Tuple[int, str]]) -> int:
+        count = 0
+        for cycle, text in responses:
+            self.add(cycle, self.signature(text))
+            count += 1
+        return count
+
+    def commit(self):
+        with self._lock:
+            self._conn.commit()
+
+    def sync_with(self, sink: ResultSink):
+        """Commit pending changes if the result sink has no rows waiting to be made durable."""
+        if sink.pending_rows == 0:
+            self.commit()
+
+    def close(self):
+        self.commit()
+        with self._lock:
+            self._conn.close()
+
+
+def dedup_signature_options(dedup_config: Optional[dict]) -> Optional[Dict[str, int]]:
+    """Signature options of a new index for dedup_config (None when dedup is off), for computing signatures ahead."""
+    if not dedup_config or not dedup_config.get("enabled", True):
+        return None
+    return {"num_perm": dedup_config.get("num_perm", 128), "shingle_size": dedup_config.get("shingle_size", 3),
+            "seed": 1}
+
+
+def open_dedup_index(output_dir_excel: str, session_id: str, dedup_config: Optional[dict],
+                     sink: ResultSink) -> Optional[MinHashLSHIndex]:
+    """
+    Open the session's near-duplicate index (None when dedup is not configured). The
+    first time, the responses already in the result store are indexed, so sessions
+    started before dedup was enabled are covered too.
+    """
+    if not dedup_config or not dedup_config.get("enabled", True):
+        return None
+    index = MinHashLSHIndex(
+        os.path.join(output_dir_excel, f"response_session_{session_id}.dedup.sqlite"),
+        dedup_config.get("threshold", 0.8), dedup_config.get("num_perm", 128), dedup_config.get("shingle_size", 3),
+        action=dedup_config.get("action", TAG), max_resamples=dedup_config.get("max_resamples", 2),
+    )
+    if index.is_empty():
+        imported = index.add_many((int(row["Cycle Number"]), row["Generated Response"])
+                                  for row in sink.read_rows() if row.get("Generated Response"))
+        if imported:
+            index.commit()
+            logger.info(f"Indexed {imported} saved responses into {index.path}")
+    return index
@@ -0,0 +1,346 @@
+# mau/data_pipeline/distributed.py
+
+import logging
+import os
+import socket
+import threading
+import time
+from typing import Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+from mau.data_pipeline.checkpoint import CheckpointIndex
+from mau.data_pipeline.data_pipeline import (
+    export_outputs_layer002, generate_layer002_response, iter_chunks, iter_pending_rows, load_prompt,
+    open_checkpoint_layer002, open_session_sink_layer002, save_output_layer002,
+)
+from mau.data_pipeline.dedup_index import DROP, RESAMPLE, MinHashLSHIndex, minhash_signature, open_dedup_index
+from mau.data_pipeline.input_reader import iter_input_rows
+from mau.data_pipeline.layer_1 import (
+    ensure_dir, ensure_file, export_excel, generate_response, load_file, open_checkpoint, open_session_sink,
+    save_response,
+)
+from mau.data_pipeline.md_archive import open_md_archive
+from mau.data_pipeline.postprocess import PostProcessor, Rejected
+from mau.data_pipeline.result_sink import ResultSink
+from mau.data_pipeline.work_queue import DONE, LEASED, PENDING, Job, WorkQueue
+from mau.llm.llm_provider import LLMProvider
+from mau.llm.provider_factory import choose_provider
+from mau.utils.metrics import get_metrics
+from mau.utils.retry import is_no_result
+
+logger = logging.getLogger(__name__)
+
+
+def queue_name(pipeline: str, session_id: str) -> str:
+    return f"{pipeline}:{session_id}"
+
+
+def publish_jobs(queue: WorkQueue, name: str, jobs: Iterable[Tuple[str, dict]], batch_size: int = 64) -> int:
+    published = 0
+    for batch in iter_chunks(jobs, batch_size):
+        published += queue.publish(name, batch)
+    return published
+
+
+def collect_results(queue: WorkQueue, name: str, save: Callable[[Job], None], checkpoint: CheckpointIndex,
+                    sink: ResultSink, poll_interval: float = 2.0, batch_size: int = 64,
+                    dedup: Optional[MinHashLSHIndex] = None) -> Tuple[int, int]:
+    """
+    Write finished jobs into the session until the queue has nothing pending or leased.
+
+    A batch is saved, made durable and checkpointed before its jobs are marked
+    collected, so a coordinator restart re-collects rather than loses results. With a
+    dedup index, each response is screened before it is saved; a job to resample is
+    published again once its batch is collected.
+    """
+    completed = failed = 0
+    while True:
+        jobs = queue.finished(name, batch_size)
+        resample = []
+        for job in jobs:
+            cycle = int(job.payload["cycle"])
+            duplicate = None
+            if job.status == DONE and dedup is not None:
+                duplicate = dedup.screen(cycle, job.result["response"], job.result.get("signature"),
+                                         job.payload.get("resample", 0) + 1, job.payload.get("signature"))
+            if duplicate and duplicate[0] == RESAMPLE:
+                checkpoint.mark_failed(cycle, f"near-duplicate of cycle {duplicate[1]}")
+                resample.append((job.key, dict(job.payload, resample=job.payload.get("resample", 0) + 1)))
+                print(f"Cycle {cycle} is a near-duplicate of cycle {duplicate[1]} ({name}); resampling.")
+            elif duplicate and duplicate[0] == DROP:
+                checkpoint.mark_completed(cycle)
+                completed += 1
+                print(f"Cycle {cycle} dropped as a near-duplicate of cycle {duplicate[1]} ({name}).")
+            elif job.status == DONE:
+                save(job)
+                checkpoint.mark_completed(cycle)
+                completed += 1
+                print(f"Cycle {cycle} completed ({name}).")
+            else:
+                checkpoint.mark_failed(cycle, job.error)
+                failed += 1
+                print(f"Cycle {cycle} failed ({name}): {job.error}")
+        if jobs:
+            sink.flush()
+            checkpoint.commit()
+            if dedup is not None:
+                dedup.commit()
+            queue.mark_collected(job.id for job in jobs)
+            if resample:
+                for _, payload in resample:
+                    checkpoint.mark_in_flight(int(payload["cycle"]))
+                queue.publish(name, resample)
+                checkpoint.commit()
+            continue
+        counts = queue.counts(name)
+        if not counts.get(PENDING) and not counts.get(LEASED):
+            return completed, failed
+        time.sleep(poll_interval)
+
+
+def _layer1_jobs(checkpoint: CheckpointIndex, session_id: str, cycle_count: int, payload: dict) -> Iterator[Tuple[str, dict]]:
+    for cycle in checkpoint.cycles_to_run(cycle_count):
+        checkpoint.mark_in_flight(cycle)
+        yield f"{session_id}:{cycle}", dict(payload, cycle=cycle)
+
+
+def run_layer1_coordinator(config: dict, queue_config: dict):
+    """
+    Publish the session's unfinished Layer 1 cycles, then collect what the workers produce.
+    With dedup, workers also sign their responses for the session's near-duplicate index.
+    """
+    output_dir_md = config["output_dir_md"]
+    output_dir_excel = config["output_dir_excel"]
+    ensure_dir(output_dir_md)
+    ensure_dir(output_dir_excel)
+    identity_path = os.path.join(config["identity_dir"], config.get("identity_prompt_file", "Identity_L001.md"))
+    task_path = os.path.join(config["task_dir"], config.get("task_prompt_file", "task_001.md"))
+    ensure_file(identity_path, "Default identity prompt: You are a helpful AI.")
+    ensure_file(task_path, "Default task prompt: Please improve the following response.")
+    identity_prompt = load_file(identity_path)
+    task_prompt = load_file(task_path)
+
+    session_id = config.get("session_id") or input("Enter session ID (unique name for this run): ")
+    cycle_count = config.get("cycle_count")
+    if cycle_count is None:
+        cycle_count = int(input("Enter the total number of cycles you want to run: "))
+    get_metrics().start_session(f"layer1_coordinator_{session_id}")
+    checkpoint = open_checkpoint(output_dir_excel, output_dir_md, session_id)
+    sink = open_session_sink(output_dir_excel, session_id, config.get("result_format", "jsonl"),
+                             config.get("fsync_every", 16))
+    archive = open_md_archive(output_dir_md, "response", session_id, config.get("md_format", "files"),
+                              config.get("fsync_every", 16))
+    dedup = open_dedup_index(output_dir_excel, session_id, config.get("dedup"), sink)
+    queue = WorkQueue(queue_config["path"], queue_config.get("max_attempts", 3))
+    name = queue_name("layer1", session_id)
+    payload = {"kind": "layer1", "identity_prompt": identity_prompt, "task_prompt": task_prompt,
+               "model": config["model"], "temperature": config.get("temperature", 0.8),
+               "ctx_size": config.get("ctx_size", 2048)}
+    if dedup is not None:
+        payload["signature"] = dedup.signature_options()
+
+    def save(job: Job):
+        save_response(identity_prompt, task_prompt, job.result["response"], int(job.payload["cycle"]),
+                      session_id, output_dir_md, sink, archive)
+
+    try:
+        batch_size = queue_config.get("batch_size", 64)
+        published = publish_jobs(queue, name, _layer1_jobs(checkpoint, session_id, cycle_count, payload), batch_size)
+        checkpoint.commit()
+        print(f"Published {published} Layer 1 jobs to {queue_config['path']} as {name}")
+        completed, failed = collect_results(queue, name, save, checkpoint, sink,
+                                            queue_config.get("poll_interval", 2.0), batch_size, dedup)
+        print(f"Layer 1 session {session_id}: {completed} completed, {failed} failed")
+    finally:
+        if archive is not None:
+            archive.close()
+        sink.flush()
+        checkpoint.close()
+        if dedup is not None:
+            dedup.close()
+        export_excel(sink, output_dir_excel, session_id)
+        sink.close()
+        queue.close()
+
+
+def run_layer2_coordinator(config: dict, queue_config: dict, output_formats: list):
+    """Publish the unfinished Layer 002 rows of layer_001_input_path, then collect the refinements."""
+    identity_prompt = load_prompt(config["identity_prompt_path"], "You are a helpful AI tasked with improving responses.")
+    task_prompt = load_prompt(config["task_prompt_path"], "Please improve the following response.")
+    session_id = config.get("session_id") or "1000_methods_biofabrication_L002"
+    get_metrics().start_session(f"layer2_coordinator_{session_id}")
+    sink = open_session_sink_layer002(config["output_dir_excel"], session_id, config.get("result_format", "jsonl"),
+                                      config.get("fsync_every", 16))
+    checkpoint = open_checkpoint_layer002(config["output_dir_excel"], session_id, sink)
+    archive = open_md_archive(config["output_dir_md"], "response_L002", session_id, config.get("md_format", "files"),
+                              config.get("fsync_every", 16))
+    queue = WorkQueue(queue_config["path"], queue_config.get("max_attempts", 3))
+    name = queue_name("layer2", session_id)
+    payload = {"kind": "layer2", "identity_prompt": identity_prompt, "task_prompt": task_prompt,
+               "model": config["model"], "temperature": config.get("temperature", 0.7),
+               "ctx_size": config.get("ctx_size", 2048)}
+    batch_size = queue_config.get("batch_size", 64)
+
+    def jobs() -> Iterator[Tuple[str, dict]]:
+        rows = enumerate(iter_input_rows(config["layer_001_input_path"]))
+        for _, row in iter_pending_rows(rows, checkpoint, batch_size):
+            cycle = int(row["Cycle Number"])
+            yield f"{session_id}:{cycle}", dict(payload, cycle=cycle, layer001_response=row["Generated Response"])
+
+    def save(job: Job):
+        save_output_layer002(identity_prompt, task_prompt, job.result["response"], int(job.payload["cycle"]),
+                             session_id, config["output_dir_md"], sink, archive=archive)
+
+    try:
+        published = publish_jobs(queue, name, jobs(), batch_size)
+        checkpoint.commit()
+        print(f"Published {published} Layer 002 jobs to {queue_config['path']} as {name}")
+        completed, failed = collect_results(queue, name, save, checkpoint, sink,
+                                            queue_config.get("poll_interval", 2.0), batch_size)
+        print(f"Layer 002 session {session_id}: {completed} completed, {failed} failed")
+    finally:
+        if archive is not None:
+            archive.close()
+        sink.flush()
+        checkpoint.close()
+        export_outputs_layer002(sink, session_id, config["output_dir_excel"], output_formats)
+        sink.close()
+        queue.close()
+
+
+def run_coordinator(config: dict):
+    """Coordinator for the pipeline named by work_queue.pipeline ("layer1" or "layer2")."""
+    queue_config = config.get("work_queue") or {}
+    if queue_config.get("pipeline", "layer1") == "layer2":
+        run_layer2_coordinator(config["data_pipeline"], queue_config, config.get("output_formats"))
+    else:
+        run_layer1_coordinator(config["data_pipeline_layer1"], queue_config)
+
+
+def run_job(payload: dict, provider: LLMProvider) -> Optional[str]:
+    if payload["kind"] == "layer1":
+        return generate_response(provider, payload["identity_prompt"], payload["task_prompt"], payload["model"],
+                                 payload["temperature"], payload["ctx_size"])
+    return generate_layer002_response(payload["identity_prompt"], payload["task_prompt"],
+                                      payload["layer001_response"], provider, payload["model"],
+                                      payload["temperature"], payload["ctx_size"])
+
+
+def run_worker(config: dict) -> Dict[str, int]:
+    """
+    Claim jobs from the work queue and run them until it stays empty for idle_timeout seconds.
+
+    Jobs carry their prompts and model settings. The worker reaches its backend through
+    work_queue.provider / provider_config when set, else through the provider of the
+    job's pipeline section, so each host can point at its own local server. Up to
+    `concurrency` jobs run at once; a background thread renews their leases. A failed
+    job is handed back with exponential backoff (retry_backoff) until max_attempts.
+    The postprocess steps of the job's pipeline section run on the worker, inline; a
+    rejected response is handed back like a failure, so the job is generated again. Jobs
+    of a session with dedup also get the response's MinHash signature.
+    """
+    queue_config = config.get("work_queue") or {}
+    worker_id = queue_config.get("worker_id") or f"{socket.gethostname()}-{os.getpid()}"
+    lease_seconds = queue_config.get("lease_seconds", 300.0)
+    poll_interval = queue_config.get("poll_interval", 2.0)
+    idle_timeout = queue_config.get("idle_timeout", 30.0)
+    retry_backoff = queue_config.get("retry_backoff", 1.0)
+    concurrency = queue_config.get("concurrency", 4)
+    queue = WorkQueue(queue_config["path"], queue_config.get("max_attempts", 3))
+    get_metrics().start_session(f"worker_{worker_id}")
+
+    sections = {"layer1": config.get("data_pipeline_layer1") or {}, "layer2": config.get("data_pipeline") or {}}
+    postprocessors = {kind: PostProcessor.from_config(section) for kind, section in sections.items()}
+    providers: Dict[str, LLMProvider] = {}
+    providers_lock = threading.Lock()
+
+    def provider_for(kind: str) -> LLMProvider:
+        with providers_lock:
+            if kind not in providers:
+                section = sections[kind]
+                providers[kind] = choose_provider(queue_config.get("provider") or section.get("provider", "lmstudio"),
+                                                  queue_config.get("provider_config") or section.get("provider_config") or {})
+            return providers[kind]
+
+    # Job id -> the slot holding it. Each slot claims under its own id, so a slot whose
+    # lease expired cannot complete a job that a sibling slot has since re-claimed.
+    held: Dict[int, str] = {}
+    held_lock = threading.Lock()
+    stop = threading.Event()
+    stats = {"completed": 0, "failed": 0, "lost": 0}
+
+    def renew_leases():
+        while not stop.wait(lease_seconds / 3):
+            with held_lock:
+                by_slot: Dict[str, list] = {}
+                for job_id, slot_id in held.items():
+                    by_slot.setdefault(slot_id, []).append(job_id)
+            for slot_id, job_ids in by_slot.items():
+                queue.renew(job_ids, slot_id, lease_seconds)
+
+    def work(slot: int):
+        slot_id = f"{worker_id}/{slot}"
+        idle_since = None
+        while not stop.is_set():
+            jobs = queue.claim(slot_id, lease_seconds)
+            if not jobs:
+                counts = queue.counts()
+                if counts.get(PENDING) or counts.get(LEASED):
+                    idle_since = None
+                else:
+                    idle_since = idle_since or time.monotonic()
+                    if time.monotonic() - idle_since >= idle_timeout:
+                        return
+                time.sleep(poll_interval)
+                continue
+            idle_since = None
+            job = jobs[0]
+            with held_lock:
+                held[job.id] = slot_id
+            try:
+                response = run_job(job.payload, provider_for(job.payload["kind"]))
+                if is_no_result(response):
+                    response = None
+                error = None if response else "no response"
+                postprocessor = postprocessors[job.payload["kind"]]
+                if response and postprocessor is not None:
+                    response = postprocessor.apply(response)
+                    if isinstance(response, Rejected):
+                        response, error = None, f"rejected by {response.step}: {response.reason}"
+            except Exception as e:
+                response, error = None, str(e)
+            finally:
+                with held_lock:
+                    held.pop(job.id, None)
+            if response:
+                result = {"response": response, "worker": slot_id}
+                if job.payload.get("signature"):
+                    # Signed here rather than by the coordinator, which screens every response.
+                    result["signature"] = minhash_signature(response, **job.payload["signature"])
+                stored = queue.complete(job.id, slot_id, result)
+            else:
+                stored = queue.fail(job.id, slot_id, error, retry_backoff * (2 ** (job.attempts - 1)))
+            with held_lock:
+                if not stored:
+                    stats["lost"] += 1  # the lease ran out; another worker has the job now
+                elif response:
+                    stats["completed"] += 1
+                else:
+                    stats["failed"] += 1
+
+    print(f"Worker {worker_id} serving {queue_config['path']} with {concurrency} slots")
+    threading.Thread(target=renew_leases, daemon=True, name=f"lease-renewal-{worker_id}").start()
+    threads = [threading.Thread(target=work, args=(slot,), name=f"worker-{worker_id}-{slot}")
+               for slot in range(max(1, concurrency))]
+    for thread in threads:
+        thread.start()
+    try:
+        for thread in threads:
+            thread.join()
+    finally:
+        # On an interrupt, slots finish their current job; leases of anything left expire.
+        stop.set()
+        for thread in threads:
+            thread.join()
+        queue.close()
+    print(f"Worker {worker_id}: {stats['completed']} completed, {stats['failed']} failed, {stats['lost']} leases lost")
+    return stats
@@ -0,0 +1,426 @@
+# mau/data_pipeline/fused_pipeline.py
+
+import logging
+import os
+import queue
+import threading
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional
+
+from mau.data_pipeline.checkpoint import COMPLETED, CheckpointIndex
+from mau.data_pipeline.data_pipeline import (
+    export_outputs_layer002, generate_layer002_response, iter_chunks, load_prompt, open_checkpoint_layer002,
+    open_session_sink_layer002, save_output_layer002,
+)
+from mau.data_pipeline.dedup_index import DROP, RESAMPLE, MinHashLSHIndex, dedup_signature_options, open_dedup_index
+from mau.data_pipeline.layer_1 import (
+    ensure_dir, ensure_file, export_excel, generate_response, load_file, open_checkpoint, open_session_sink,
+    save_response,
+)
+from mau.data_pipeline.md_archive import MarkdownArchive, open_md_archive
+from mau.data_pipeline.postprocess import PostProcessor, Rejected
+from mau.data_pipeline.result_sink import ResultSink
+from mau.llm.llm_provider import LLMProvider
+from mau.llm.provider_factory import choose_provider
+from mau.utils.concurrency import ordered_map
+from mau.utils.metrics import get_metrics
+from mau.utils.retry import call_with_retry
+
+logger = logging.getLogger(__name__)
+
+# Marks the end of a stage's output queue.
+_DONE = object()
+
+
+@dataclass
+class StageItem:
+    """One cycle moving down the pipeline; text is the input of stage `start` (None for the first stage)."""
+    cycle: int
+    text: Optional[str]
+    start: int = 0
+
+
+class Stage(ABC):
+    """
+    One layer of a fused pipeline: its prompts, model settings and its per-session
+    result store and checkpoint. The first stage answers its task prompt; every later
+    stage refines the previous stage's response. Subclasses decide where results go.
+    """
+
+    def __init__(self, name: str, identity_prompt: str, task_prompt: str, provider: LLMProvider, model: str,
+                 temperature: float = 0.7, ctx_size: int = 2048, concurrency: int = 1,
+                 max_retries: int = 3, retry_backoff: float = 1.0, postprocessor: Optional[PostProcessor] = None):
+        self.name = name
+        self.identity_prompt = identity_prompt
+        self.task_prompt = task_prompt
+        self.provider = provider
+        self.model = model
+        self.temperature = temperature
+        self.ctx_size = ctx_size
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.postprocessor = postprocessor
+        self.session_id: Optional[str] = None
+        self.sink: Optional[ResultSink] = None
+        self.checkpoint: Optional[CheckpointIndex] = None
+        self.archive: Optional[MarkdownArchive] = None
+        self.dedup: Optional[MinHashLSHIndex] = None
+        self.signing: Optional[Dict[str, int]] = None
+        self.completed = 0
+        self.failed = 0
+
+    @abstractmethod
+    def open(self, session_id: str):
+        """Open the stage's result store, checkpoint and Markdown output for a session."""
+        pass
+
+    @abstractmethod
+    def save(self, cycle: int, response: str):
+        """Save one response of the open session."""
+        pass
+
+    @abstractmethod
+    def export(self):
+        """Write the stage's Excel/CSV exports from its result store."""
+        pass
+
+    def generate(self, text: Optional[str]) -> Optional[str]:
+        if text is None:
+            return generate_response(self.provider, self.identity_prompt, self.task_prompt, self.model,
+                                     self.temperature, self.ctx_size)
+        return generate_layer002_response(self.identity_prompt, self.task_prompt, text, self.provider,
+                                          self.model, self.temperature, self.ctx_size)
+
+    def saved_responses(self, cycles: set) -> Dict[int, str]:
+        """Read the stored responses of the given cycles back from the result store."""
+        responses = {}
+        for row in self.sink.read_rows():
+            cycle = int(row["Cycle Number"])
+            if cycle in cycles:
+                responses[cycle] = row["Generated Response"]
+        return responses
+
+    def close(self):
+        if self.sink is None:
+            return
+        if self.archive is not None:
+            self.archive.close()
+        self.sink.flush()
+        self.checkpoint.close()
+        if self.dedup is not None:
+            self.dedup.close()
+        self.export()
+        self.sink.close()
+        self.sink = None
+
+
+class Layer1Stage(Stage):
+    """
+    A Layer 001 stage; files are the same as a data-generation-layer1 run of the session,
+    including the near-duplicate index when dedup_config is set. A cycle to resample is
+    not handed on; it is marked failed and generated again when the session resumes.
+    """
+
+    def __init__(self, output_dir_md: str, output_dir_excel: str, result_format: str = "jsonl",
+                 fsync_every: int = 16, md_format: str = "files", dedup_config: Optional[dict] = None, **kwargs):
+        super().__init__("L001", **kwargs)
+        self.output_dir_md = output_dir_md
+        self.output_dir_excel = output_dir_excel
+        self.result_format = result_format
+        self.fsync_every = fsync_every
+        self.md_format = md_format
+        self.dedup_config = dedup_config
+        self.signing = dedup_signature_options(dedup_config)
+
+    def open(self, session_id: str):
+        ensure_dir(self.output_dir_md)
+        ensure_dir(self.output_dir_excel)
+        self.session_id = session_id
+        self.checkpoint = open_checkpoint(self.output_dir_excel, self.output_dir_md, session_id)
+        self.sink = open_session_sink(self.output_dir_excel, session_id, self.result_format, self.fsync_every)
+        self.archive = open_md_archive(self.output_dir_md, "response", session_id, self.md_format, self.fsync_every)
+        self.dedup = open_dedup_index(self.output_dir_excel, session_id, self.dedup_config, self.sink)
+
+    def save(self, cycle: int, response: str):
+        save_response(self.identity_prompt, self.task_prompt, response, cycle, self.session_id,
+                      self.output_dir_md, self.sink, self.archive)
+
+    def export(self):
+        export_excel(self.sink, self.output_dir_excel, self.session_id)
+
+
+class RefinementStage(Stage):
+    """A refinement stage (Layer 002 and beyond); files are named after its layer, e.g. response_L003_session_<id>."""
+
+    def __init__(self, layer: str, output_dir_md: str, output_dir_excel: str, output_formats: Optional[list] = None,
+                 result_format: str = "jsonl", fsync_every: int = 16, md_format: str = "files", **kwargs):
+        super().__init__(layer, **kwargs)
+        self.output_dir_md = output_dir_md
+        self.output_dir_excel = output_dir_excel
+        self.output_formats = output_formats
+        self.result_format = result_format
+        self.fsync_every = fsync_every
+        self.md_format = md_format
+
+    def open(self, session_id: str):
+        self.session_id = session_id
+        self.sink = open_session_sink_layer002(self.output_dir_excel, session_id, self.result_format,
+                                               self.fsync_every, layer=self.name)
+        self.checkpoint = open_checkpoint_layer002(self.output_dir_excel, session_id, self.sink, layer=self.name)
+        self.archive = open_md_archive(self.output_dir_md, f"response_{self.name}", session_id, self.md_format,
+                                       self.fsync_every)
+
+    def save(self, cycle: int, response: str):
+        save_output_layer002(self.identity_prompt, self.task_prompt, response, cycle, self.session_id,
+                             self.output_dir_md, self.sink, layer=self.name, archive=self.archive)
+
+    def export(self):
+        export_outputs_layer002(self.sink, self.session_id, self.output_dir_excel, self.output_formats,
+                                layer=self.name)
+
+
+def plan_cycles(stages: List[Stage], cycle_count: int, chunk_size: int = 256) -> List[StageItem]:
+    """
+    Work out where each unfinished cycle re-enters the pipeline: at the first stage that
+    has not completed it, with the previous stage's stored response as its input.
+    Cycles completed by every stage are left out.
+    """
+    items = []
+    for chunk in iter_chunks(range(1, cycle_count + 1), chunk_size):
+        statuses = [stage.checkpoint.statuses(chunk) for stage in stages]
+        for cycle in chunk:
+            for index, stage_statuses in enumerate(statuses):
+                if stage_statuses.get(cycle) != COMPLETED:
+                    items.append(StageItem(cycle, None, index))
+                    break
+    for index in range(1, len(stages)):
+        resumed = {item.cycle for item in items if item.start == index}
+        if not resumed:
+            continue
+        responses = stages[index - 1].saved_responses(resumed)
+        logger.info(f"Resuming {len(resumed)} cycles at {stages[index].name} from stored {stages[index - 1].name} responses")
+        for item in items:
+            if item.start == index:
+                item.text = responses.get(item.cycle)
+    # A completed cycle whose stored row is missing is produced again from the first stage.
+    for item in items:
+        if item.start > 0 and item.text is None:
+            item.start = 0
+    return items
+
+
+def _put(q: queue.Queue, item, stop: threading.Event) -> bool:
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _drain(q: queue.Queue, stop: threading.Event) -> Iterator[StageItem]:
+    while True:
+        try:
+            item = q.get(timeout=0.1)
+        except queue.Empty:
+            if stop.is_set():
+                return
+            continue
+        if item is _DONE:
+            return
+        yield item
+
+
+def _postprocess(postprocessor: PostProcessor, results, index: int):
+    """Post-process the stage's own responses; inputs passed through to a later stage go by unchanged."""
+    processed = postprocessor.process_signed((item, None if item.start > index else response)
+                                             for item, response in results)
+    for item, response, signature in processed:
+        yield item, item.text if item.start > index else response, signature
+
+
+def _run_stage(stages: List[Stage], index: int, items, out_queue: Optional[queue.Queue], stop: threading.Event):
+    stage = stages[index]
+
+    def scheduled() -> Iterator[StageItem]:
+        # Runs on the thread that drives ordered_map (the stage thread, or the post-processor's
+        # feed thread); the checkpoint index is safe to share between threads.
+        for item in items:
+            if item.start <= index:
+                stage.checkpoint.mark_in_flight(item.cycle)
+            yield item
+
+    def work(item: StageItem) -> Optional[str]:
+        if item.start > index:
+            return item.text  # re-entering further down; pass the stored input through
+        return call_with_retry(stage.generate, item.text, max_retries=stage.max_retries,
+                               backoff=stage.retry_backoff, description=f"{stage.name} cycle {item.cycle}")
+
+    results = ordered_map(work, scheduled(), max_workers=stage.concurrency)
+    if stage.postprocessor is not None:
+        results = _postprocess(stage.postprocessor, results, index)
+    else:
+        results = ((item, response, None) for item, response in results)
+    for item, response, signature in results:
+        if stop.is_set():
+            break
+        if isinstance(response, Rejected):
+            # Not handed on: the cycle is generated again when the session resumes.
+            stage.checkpoint.mark_failed(item.cycle, f"rejected by {response.step}: {response.reason}")
+            stage.checkpoint.sync_with(stage.sink)
+            stage.failed += 1
+            print(f"Cycle {item.cycle} rejected by {response.step} for {stage.name}: {response.reason}")
+            continue
+        if item.start <= index:
+            duplicate = None
+            if response and stage.dedup is not None:
+                duplicate = stage.dedup.screen(item.cycle, response, signature,
+                                               stage.checkpoint.attempts(item.cycle), stage.signing)
+            if duplicate and duplicate[0] == RESAMPLE:
+                # Not handed on, like a rejected response: generated again when the session resumes.
+                stage.checkpoint.mark_failed(item.cycle, f"near-duplicate of cycle {duplicate[1]}")
+                stage.failed += 1
+                response = None
+                print(f"Cycle {item.cycle} is a near-duplicate of cycle {duplicate[1]} for {stage.name}; "
+                      f"it will be resampled on resume.")
+            elif duplicate and duplicate[0] == DROP:
+                # Completed in every later stage too, so a resume does not bring the cycle back.
+                for later in stages[index:]:
+                    later.checkpoint.mark_completed(item.cycle)
+                stage.completed += 1
+                response = None
+                print(f"Cycle {item.cycle} dropped as a near-duplicate of cycle {duplicate[1]} for {stage.name}.")
+            elif response:
+                stage.save(item.cycle, response)
+                stage.checkpoint.mark_completed(item.cycle)
+                stage.completed += 1
+                print(f"Cycle {item.cycle} completed for {stage.name}.")
+            else:
+                stage.checkpoint.mark_failed(item.cycle, f"no response after {stage.max_retries} retries")
+                stage.failed += 1
+                print(f"Cycle {item.cycle} failed for {stage.name}.")
+            stage.checkpoint.sync_with(stage.sink)
+            if stage.dedup is not None:
+                stage.dedup.sync_with(stage.sink)
+        if response and out_queue is not None:
+            if not _put(out_queue, StageItem(item.cycle, response, item.start), stop):
+                break
+
+
+def run_fused_pipeline(stages: List[Stage], session_id: str, cycle_count: int, queue_size: int = 64) -> List[Stage]:
+    """
+    Run a chain of layers with every layer working at the same time.
+
+    Each stage runs on its own thread with up to `concurrency` calls in flight and writes
+    its results in cycle order. A response is handed to the next stage through an
+    in-memory queue of at most queue_size items as soon as it is saved, so later layers
+    start on cycle 1 while earlier ones are still generating and nothing is re-read
+    from an Excel export in between. A full queue holds the stage before it back.
+
+    Every stage keeps the result store and checkpoint of its standalone mode, so
+    resume works per stage: a cycle re-enters at the first stage that has not
+    completed it, fed from the previous stage's stored response.
+    """
+    threads: List[threading.Thread] = []
+    errors: List[BaseException] = []
+    stop = threading.Event()
+    try:
+        for stage in stages:
+            stage.open(session_id)
+        items = plan_cycles(stages, cycle_count)
+        print(f"Fused pipeline {' -> '.join(stage.name for stage in stages)}: {len(items)} cycles to run")
+        queues = [queue.Queue(maxsize=queue_size) for _ in stages[1:]]
+
+        def target(index: int):
+            out_queue = queues[index] if index < len(queues) else None
+            try:
+                _run_stage(stages, index, items if index == 0 else _drain(queues[index - 1], stop), out_queue, stop)
+            except BaseException as e:
+                logger.error(f"Stage {stages[index].name} stopped: {e}")
+                errors.append(e)
+                stop.set()
+            finally:
+                if out_queue is not None:
+                    _put(out_queue, _DONE, stop)
+
+        for index, stage in enumerate(stages):
+            thread = threading.Thread(target=target, args=(index,), name=f"stage-{stage.name}")
+            thread.start()
+            threads.append(thread)
+        try:
+            for thread in threads:
+                thread.join()
+        except BaseException:
+            stop.set()
+            for thread in threads:
+                thread.join()
+            raise
+    finally:
+        for stage in stages:
+            stage.close()
+    for stage in stages:
+        print(f"{stage.name}: {stage.completed} completed, {stage.failed} failed")
+    if errors:
+        raise errors[0]
+    return stages
+
+
+def build_stages(layer1_config: dict, layer2_config: dict, fused_config: dict, output_formats: list) -> List[Stage]:
+    """Layer 001 from data_pipeline_layer1, Layer 002 from data_pipeline, then any extra_layers."""
+    identity_path = os.path.join(layer1_config["identity_dir"], layer1_config.get("identity_prompt_file", "Identity_L001.md"))
+    task_path = os.path.join(layer1_config["task_dir"], layer1_config.get("task_prompt_file", "task_001.md"))
+    ensure_file(identity_path, "Default identity prompt: You are a helpful AI.")
+    ensure_file(task_path, "Default task prompt: Please improve the following response.")
+    stages: List[Stage] = [Layer1Stage(
+        layer1_config["output_dir_md"], layer1_config["output_dir_excel"],
+        layer1_config.get("result_format", "jsonl"), layer1_config.get("fsync_every", 16),
+        layer1_config.get("md_format", "files"), layer1_config.get("dedup"),
+        identity_prompt=load_file(identity_path), task_prompt=load_file(task_path),
+        provider=choose_provider(layer1_config.get("provider", "lmstudio"), layer1_config.get("provider_config") or {}),
+        model=layer1_config["model"], temperature=layer1_config.get("temperature", 0.8),
+        ctx_size=layer1_config.get("ctx_size", 2048), concurrency=layer1_config.get("concurrency", 1),
+        max_retries=layer1_config.get("max_retries", 3), retry_backoff=layer1_config.get("retry_backoff", 1.0),
+        postprocessor=PostProcessor.from_config(layer1_config, dedup_signature_options(layer1_config.get("dedup"))),
+    )]
+    layers = [dict(layer2_config, layer="L002")] + [dict(layer2_config, **{k: v for k, v in extra.items() if v is not None})
+                                                    for extra in fused_config.get("extra_layers") or []]
+    for layer_config in layers:
+        stages.append(RefinementStage(
+            layer_config["layer"], layer_config["output_dir_md"], layer_config["output_dir_excel"], output_formats,
+            layer_config.get("result_format", "jsonl"), layer_config.get("fsync_every", 16),
+            layer_config.get("md_format", "files"),
+            identity_prompt=load_prompt(layer_config["identity_prompt_path"],
+                                        "You are a helpful AI tasked with improving responses."),
+            task_prompt=load_prompt(layer_config["task_prompt_path"], "Please improve the following response."),
+            provider=choose_provider(layer_config["provider"], layer_config.get("provider_config")),
+            model=layer_config["model"], temperature=layer_config.get("temperature", 0.7),
+            ctx_size=layer_config.get("ctx_size", 2048), concurrency=layer_config.get("max_in_flight", 4),
+            max_retries=layer_config.get("max_retries", 3), retry_backoff=layer_config.get("retry_backoff", 1.0),
+            postprocessor=PostProcessor.from_config(layer_config),
+        ))
+    return stages
+
+
+def run_fused_mode(layer1_config: dict, layer2_config: dict, fused_config: Optional[dict], output_formats: list):
+    """
+    Run Layer 001 and Layer 002 (plus any extra layers) as one streaming pipeline.
+
+    The session id and cycle count come from the fused_pipeline section, falling back to
+    data_pipeline_layer1 and then to stdin. Layer 002 settings come from data_pipeline
+    (its layer_001_input_path is not used); each of fused_pipeline.extra_layers
+    overrides data_pipeline settings for one more layer fed by the layer before it.
+    """
+    fused_config = fused_config or {}
+    session_id = (fused_config.get("session_id") or layer1_config.get("session_id")
+                  or input("Enter session ID (unique name for this run): "))
+    cycle_count = fused_config.get("cycle_count")
+    if cycle_count is None:
+        cycle_count = layer1_config.get("cycle_count")
+    if cycle_count is None:
+        cycle_count = int(input("Enter the total number of cycles you want to run: "))
+    stages = build_stages(layer1_config, layer2_config, fused_config, output_formats)
+    get_metrics().start_session(f"fused_{session_id}")
+    return run_fused_pipeline(stages, session_id, cycle_count, fused_config.get("queue_size", 64))
@@ -0,0 +1,84 @@
+# mau/data_pipeline/input_reader.py
+
+import csv
+import json
+import os
+from itertools import islice
+from typing import Any, Dict, Iterator
+
+SUPPORTED_INPUT_FORMATS = (".xlsx", ".xlsm", ".csv", ".jsonl", ".parquet")
+
+
+def iter_input_rows(path: str, start_row: int = 0) -> Iterator[Dict[str, Any]]:
+    """
+    Lazily yield the data rows of a pipeline input file as dicts keyed by column name.
+
+    Rows are streamed rather than loaded up front, so the first row is available
+    right away regardless of file size. start_row skips that many data rows (the
+    header does not count), which lets a resumed run seek straight to where it
+    stopped. Supports .xlsx/.xlsm, .csv, .jsonl and .parquet (requires pyarrow).
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".xlsx", ".xlsm"):
+        return _iter_excel_rows(path, start_row)
+    if ext == ".csv":
+        return _iter_csv_rows(path, start_row)
+    if ext == ".jsonl":
+        return _iter_jsonl_rows(path, start_row)
+    if ext == ".parquet":
+        return _iter_parquet_rows(path, start_row)
+    raise ValueError(f"Unsupported input format '{ext}' for {path}; expected one of {', '.join(SUPPORTED_INPUT_FORMATS)}")
+
+
+def _iter_excel_rows(path: str, start_row: int) -> Iterator[Dict[str, Any]]:
+    from openpyxl import load_workbook
+
+    # read_only streams the sheet XML instead of building the whole workbook in memory.
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        sheet = workbook.active
+        header_row = next(sheet.iter_rows(min_row=1, max_row=1, values_only=True), None)
+        if header_row is None:
+            return
+        header = [str(name) if name is not None else f"column_{i}" for i, name in enumerate(header_row)]
+        rows = (values for values in sheet.iter_rows(min_row=2, values_only=True)
+                if not all(value is None for value in values))
+        for values in islice(rows, start_row, None):
+            yield dict(zip(header, values))
+    finally:
+        workbook.close()
+
+
+def _iter_csv_rows(path: str, start_row: int) -> Iterator[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        yield from islice(csv.DictReader(f), start_row, None)
+
+
+def _iter_jsonl_rows(path: str, start_row: int) -> Iterator[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        lines = (line for line in f if line.strip())
+        for line in islice(lines, start_row, None):
+            yield json.loads(line)
+
+
+def _iter_parquet_rows(path: str, start_row: int) -> Iterator[Dict[str, Any]]:
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("Reading parquet inputs requires pyarrow (pip install pyarrow).") from e
+
+    parquet_file = pq.ParquetFile(path)
+    # Skip whole row groups using the footer metadata, then the remainder row by row.
+    to_skip = start_row
+    first_group = 0
+    while first_group < parquet_file.num_row_groups:
+        num_rows = parquet_file.metadata.row_group(first_group).num_rows
+        if to_skip < num_rows:
+            break
+        to_skip -= num_rows
+        first_group += 1
+    row_groups = list(range(first_group, parquet_file.num_row_groups))
+    if not row_groups:
+        return
+    rows = (row for batch in parquet_file.iter_batches(row_groups=row_groups) for row in batch.to_pylist())
+    yield from islice(rows, to_skip, None)
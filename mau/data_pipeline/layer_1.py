@@ -1,8 +1,22 @@
 # mau/data_pipeline/layer_1.py
 import os
-import openai
-import pandas as pd
 from datetime import datetime
+from typing import Optional
+from mau.data_pipeline.checkpoint import COMPLETED, FAILED, CheckpointIndex
+from mau.data_pipeline.dedup_index import DROP, RESAMPLE, open_dedup_index
+from mau.data_pipeline.md_archive import (
+    MarkdownArchive, export_markdown, md_archive_base, md_archive_exists, open_md_archive, read_archive_index,
+)
+from mau.data_pipeline.postprocess import PostProcessor, Rejected
+from mau.data_pipeline.result_sink import (
+    RESULT_COLUMNS, ResultSink, open_result_sink, result_sink_exists, seed_from_excel,
+)
+from mau.llm.llm_provider import LLMProvider
+from mau.llm.provider_factory import choose_provider
+from mau.plugins.output_format_plugin import output_as_excel, rows_to_frame
+from mau.utils.concurrency import ordered_map
+from mau.utils.metrics import get_metrics
+from mau.utils.retry import call_with_retry
 
 def ensure_dir(directory: str):
     """Ensure that the directory exists; if not, create it."""
@@ -28,69 +42,122 @@ def load_file(file_path: str) -> str:
     print(f"Loaded file: {file_path} (content length: {len(content)})")
     return content
 
-def generate_response(client, identity_prompt: str, task_prompt: str, model: str) -> str:
-    """Call the LM Studio API to generate a response using the given prompts."""
+def generate_response(provider: LLMProvider, identity_prompt: str, task_prompt: str, model: str,
+                      temperature: float = 0.8, ctx_size: int = 2048) -> str:
+    """Call the configured provider (LM Studio by default) to generate a response using the given prompts."""
     try:
-        completion = client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": identity_prompt},
-                {"role": "user", "content": task_prompt}
-            ],
-            temperature=0.8
-        )
-        return completion.choices[0].message.content
+        messages = [
+            {"role": "system", "content": identity_prompt},
+            {"role": "user", "content": task_prompt}
+        ]
+        return "".join(provider.chat(model, messages, temperature, ctx_size))
     except Exception as e:
         print(f"Error in API call: {e}")
         return None
 
 def save_response(identity_prompt: str, task_prompt: str, response: str,
                   cycle_number: int, session_id: str,
-                  output_dir_md: str, output_dir_excel: str):
-    """Save the generated response to a Markdown file and update an Excel log."""
-    # Save to Markdown file
-    md_filename = f"response_session_{session_id}_cycle_{cycle_number}.md"
-    md_path = os.path.join(output_dir_md, md_filename)
-    with open(md_path, 'w', encoding='utf-8') as f:
-        f.write(response)
-    print(f"Saved Markdown: {md_path}")
-
-    # Prepare data for Excel file
-    excel_filename = f"response_session_{session_id}.xlsx"
-    excel_path = os.path.join(output_dir_excel, excel_filename)
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    data = {
-        "Session ID": [session_id],
-        "Cycle Number": [cycle_number],
-        "Timestamp": [timestamp],
-        "Identity Prompt": [identity_prompt],
-        "Task Prompt": [task_prompt],
-        "Generated Response": [response]
-    }
-    df_new = pd.DataFrame(data)
-    
-    if os.path.exists(excel_path):
-        df_existing = pd.read_excel(excel_path)
-        df_combined = pd.concat([df_existing, df_new], ignore_index=True)
-    else:
-        df_combined = df_new
-        
-    df_combined.to_excel(excel_path, index=False)
+                  output_dir_md: str, sink: ResultSink, archive: Optional[MarkdownArchive] = None):
+    """
+    Save the generated response to a Markdown file (or the session's Markdown archive,
+    when one is given) and append it to the session result store.
+    """
+    with get_metrics().timer("mau_file_write_seconds", stage="layer1"):
+        # Save to Markdown file
+        md_filename = f"response_session_{session_id}_cycle_{cycle_number}.md"
+        if archive is not None:
+            archive.append(cycle_number, md_filename, response)
+            print(f"Saved Markdown: {md_filename} in {archive.data_path}")
+        else:
+            md_path = os.path.join(output_dir_md, md_filename)
+            with open(md_path, 'w', encoding='utf-8') as f:
+                f.write(response)
+            print(f"Saved Markdown: {md_path}")
+
+        # Append one row; the Excel log is exported from the store at the end of the run.
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        sink.append({
+            "Session ID": session_id,
+            "Cycle Number": cycle_number,
+            "Timestamp": timestamp,
+            "Identity Prompt": identity_prompt,
+            "Task Prompt": task_prompt,
+            "Generated Response": response
+        })
+
+def open_session_sink(output_dir_excel: str, session_id: str,
+                      result_format: str = "jsonl", fsync_every: int = 16) -> ResultSink:
+    """Open the append-only result store for a session, importing a legacy Excel log if present."""
+    base_path = os.path.join(output_dir_excel, f"response_session_{session_id}")
+    excel_path = f"{base_path}.xlsx"
+    is_new = not result_sink_exists(base_path, result_format)
+    sink = open_result_sink(base_path, result_format, fsync_every)
+    if is_new and os.path.exists(excel_path):
+        seed_from_excel(sink, excel_path)
+    return sink
+
+def export_excel(sink: ResultSink, output_dir_excel: str, session_id: str):
+    """Write the session Excel log from the result store (same columns as before)."""
+    excel_path = os.path.join(output_dir_excel, f"response_session_{session_id}.xlsx")
+    output_as_excel(rows_to_frame(sink.read_rows(), RESULT_COLUMNS), excel_path)
     print(f"Saved Excel: {excel_path}")
 
-def get_last_cycle(output_dir_md: str, session_id: str) -> int:
-    """Return the highest cycle number already saved in the Markdown output directory."""
-    cycles = []
+def export_results(config: dict, session_id: str):
+    """Export the Excel log of an existing Layer 1 session on demand."""
+    output_dir_excel = config.get("output_dir_excel")
+    result_format = config.get("result_format", "jsonl")
+    base_path = os.path.join(output_dir_excel, f"response_session_{session_id}")
+    if not result_sink_exists(base_path, result_format):
+        print(f"No Layer 1 results found for session {session_id} in {output_dir_excel}")
+        return
+    with open_result_sink(base_path, result_format) as sink:
+        export_excel(sink, output_dir_excel, session_id)
+
+def export_md(config: dict, session_id: str):
+    """Expand the Markdown archive of a Layer 1 session into one .md file per cycle."""
+    output_dir_md = config.get("output_dir_md")
+    base_path = md_archive_base(output_dir_md, "response", session_id)
+    if not md_archive_exists(base_path):
+        print(f"No Layer 1 Markdown archive found for session {session_id} in {output_dir_md}")
+        return
+    count = export_markdown(base_path, output_dir_md)
+    print(f"Exported {count} Markdown files to {output_dir_md}")
+
+def list_saved_cycles(output_dir_md: str, session_id: str) -> set:
+    """Return the cycle numbers already saved in the Markdown output directory or its archive."""
+    cycles = {cycle for cycle, _ in read_archive_index(md_archive_base(output_dir_md, "response", session_id))}
     for filename in os.listdir(output_dir_md):
         if filename.startswith(f"response_session_{session_id}_cycle") and filename.endswith(".md"):
             try:
                 # Expecting filenames like response_session_<session_id>_cycle_<number>.md
                 cycle_str = filename.split('_')[-1].split('.')[0]
-                cycles.append(int(cycle_str))
+                cycles.add(int(cycle_str))
             except Exception:
                 continue
+    return cycles
+
+def get_last_cycle(output_dir_md: str, session_id: str) -> int:
+    """Return the highest cycle number already saved in the Markdown output directory."""
+    cycles = list_saved_cycles(output_dir_md, session_id)
     return max(cycles) if cycles else 0
 
+def open_checkpoint(output_dir_excel: str, output_dir_md: str, session_id: str) -> CheckpointIndex:
+    """
+    Open the session checkpoint index. The first time a session is opened, the
+    Markdown directory is scanned once to import it; gaps left by failed cycles are
+    recorded as failed so they are re-run.
+    """
+    checkpoint_path = os.path.join(output_dir_excel, f"response_session_{session_id}.checkpoint.sqlite")
+    checkpoint = CheckpointIndex(checkpoint_path)
+    if checkpoint.is_empty():
+        saved = list_saved_cycles(output_dir_md, session_id)
+        if saved:
+            checkpoint.mark_many(sorted(saved), COMPLETED)
+            checkpoint.mark_many(sorted(set(range(1, max(saved))) - saved), FAILED)
+            checkpoint.commit()
+            print(f"Imported {len(saved)} saved cycles into {checkpoint_path}")
+    return checkpoint
+
 def run_layer1(config: dict):
     """
     Run the Layer 1 data generator.
@@ -103,7 +170,22 @@ def run_layer1(config: dict):
       - identity_prompt_file: Filename for the identity prompt (e.g., "Identity_L001.md").
       - task_prompt_file: Filename for the task prompt (e.g., "task_001.md").
       - model: Model identifier (e.g., "llama-3.2-1b-instruct").
-      - provider_config: Dict with keys "base_url" and "api_key" for LM Studio.
+      - provider: Provider name (default "lmstudio").
+      - provider_config: Dict with keys "base_url" and "api_key" (plus optional connection pool settings).
+      - temperature: Sampling temperature (default 0.8).
+      - ctx_size: Context size passed to the provider (default 2048).
+      - concurrency: Number of cycles kept in flight at once (default 1).
+      - max_retries: Retries per cycle before it is reported as failed (default 3).
+      - retry_backoff: Initial backoff in seconds, doubled on each retry (default 1.0).
+      - result_format: Append-only result store, "jsonl" (default) or "parquet".
+      - fsync_every: Rows buffered before the result store is fsynced (default 16).
+      - session_id, cycle_count: Run without prompting for them (default: ask on stdin).
+      - postprocess: Post-processing steps applied before results are saved (default: none);
+        postprocess_workers and postprocess_batch_size size the process pool and its batches.
+      - dedup: Per-session near-duplicate index (default: off), e.g. {"action": "resample",
+        "threshold": 0.8}; action is "tag", "drop" or "resample" (up to max_resamples rounds).
+      - md_format: "files" (default) for one Markdown file per cycle, or "archive" for a single
+        append-only response_session_<id>.mdpack per session (expand it with the export-md mode).
     """
     # Read configuration values
     identity_dir = config.get("identity_dir")
@@ -113,9 +195,16 @@ def run_layer1(config: dict):
     identity_prompt_file = config.get("identity_prompt_file", "Identity_L001.md")
     task_prompt_file = config.get("task_prompt_file", "task_001.md")
     model = config.get("model")
-    provider_conf = config.get("provider_config", {})
-    base_url = provider_conf.get("base_url")
-    api_key = provider_conf.get("api_key")
+    provider_name = config.get("provider", "lmstudio")
+    provider_conf = config.get("provider_config") or {}
+    temperature = config.get("temperature", 0.8)
+    ctx_size = config.get("ctx_size", 2048)
+    concurrency = config.get("concurrency", 1)
+    max_retries = config.get("max_retries", 3)
+    retry_backoff = config.get("retry_backoff", 1.0)
+    result_format = config.get("result_format", "jsonl")
+    fsync_every = config.get("fsync_every", 16)
+    md_format = config.get("md_format", "files")
 
     print("Configuration:")
     print(f"  identity_dir: {identity_dir}")
@@ -124,6 +213,7 @@ def run_layer1(config: dict):
     print(f"  output_dir_excel: {output_dir_excel}")
     print(f"  identity_prompt_file: {identity_prompt_file}")
     print(f"  task_prompt_file: {task_prompt_file}")
+    print(f"  concurrency: {concurrency}")
 
     # Ensure directories exist
     ensure_dir(identity_dir)
@@ -146,33 +236,110 @@ def run_layer1(config: dict):
     identity_prompt = load_file(identity_path)
     task_prompt = load_file(task_path)
 
-    # Set up LM Studio client
-    client = openai.OpenAI(base_url=base_url, api_key=api_key)
+    # Set up the provider; its HTTP client is pooled and shared by all worker threads.
+    provider = choose_provider(provider_name, provider_conf)
 
-    # Prompt user for session ID and cycles
-    session_id = input("Enter session ID (unique name for this run): ")
-    last_cycle = get_last_cycle(output_dir_md, session_id)
+    # Session ID and cycle count come from the config when set (for unattended runs), else from the user.
+    session_id = config.get("session_id") or input("Enter session ID (unique name for this run): ")
+    get_metrics().start_session(f"layer1_{session_id}")
+    checkpoint = open_checkpoint(output_dir_excel, output_dir_md, session_id)
+    last_cycle = checkpoint.last_cycle()
     if last_cycle > 0:
         print(f"Resuming from cycle {last_cycle + 1}")
     else:
         print("Starting from cycle 1")
 
-    while True:
+    cycle_count = config.get("cycle_count")
+    while cycle_count is None:
         try:
             cycle_count = int(input("Enter the total number of cycles you want to run: "))
-            break
         except ValueError:
             print("Invalid input. Please enter an integer.")
 
-    # Run cycles
-    for cycle in range(last_cycle + 1, cycle_count + 1):
+    def run_cycle(cycle: int):
         print(f"\nRunning cycle {cycle}...")
-        response = generate_response(client, identity_prompt, task_prompt, model)
-        if response:
-            save_response(identity_prompt, task_prompt, response, cycle, session_id, output_dir_md, output_dir_excel)
-            print(f"Cycle {cycle} completed.\n")
+        return call_with_retry(generate_response, provider, identity_prompt, task_prompt, model, temperature, ctx_size,
+                               max_retries=max_retries, backoff=retry_backoff,
+                               description=f"Cycle {cycle}")
+
+    retry_cycles = checkpoint.pending_cycles(cycle_count)
+    if retry_cycles:
+        print(f"Re-running {len(retry_cycles)} unfinished cycles: {retry_cycles[:10]}{'...' if len(retry_cycles) > 10 else ''}")
+
+    def scheduled_cycles():
+        for cycle in checkpoint.cycles_to_run(cycle_count):
+            checkpoint.mark_in_flight(cycle)
+            yield cycle
+
+    # Run cycles; up to `concurrency` are in flight, results are saved in submission order.
+    sink = open_session_sink(output_dir_excel, session_id, result_format, fsync_every)
+    dedup = open_dedup_index(output_dir_excel, session_id, config.get("dedup"), sink)
+    # With dedup on, the post-processing workers also compute the MinHash signatures.
+    postprocessor = PostProcessor.from_config(config, dedup.signature_options() if dedup is not None else None)
+    archive = open_md_archive(output_dir_md, "response", session_id, md_format, fsync_every)
+
+    def run_cycles(cycles, attempt: int) -> list:
+        """Generate and save the given cycles; returns the near-duplicates to resample."""
+        resample = []
+        results = ordered_map(run_cycle, cycles, max_workers=concurrency)
+        if postprocessor is not None:
+            results = postprocessor.process_signed(results)
         else:
-            print(f"Cycle {cycle} failed. Skipping.\n")
+            results = ((cycle, response, None) for cycle, response in results)
+        for cycle, response, signature in results:
+            duplicate = None
+            if dedup is not None and response and not isinstance(response, Rejected):
+                duplicate = dedup.screen(cycle, response, signature, attempt)
+            if isinstance(response, Rejected):
+                # Recorded as failed, so a resumed run samples the cycle again.
+                checkpoint.mark_failed(cycle, f"rejected by {response.step}: {response.reason}")
+                print(f"Cycle {cycle} rejected by {response.step}: {response.reason}\n")
+            elif duplicate and duplicate[0] == RESAMPLE:
+                checkpoint.mark_failed(cycle, f"near-duplicate of cycle {duplicate[1]}")
+                resample.append(cycle)
+                print(f"Cycle {cycle} is a near-duplicate of cycle {duplicate[1]} ({duplicate[2]:.0%}); resampling.\n")
+            elif duplicate and duplicate[0] == DROP:
+                checkpoint.mark_completed(cycle)
+                print(f"Cycle {cycle} dropped as a near-duplicate of cycle {duplicate[1]} ({duplicate[2]:.0%}).\n")
+            elif response:
+                save_response(identity_prompt, task_prompt, response, cycle, session_id, output_dir_md, sink,
+                              archive)
+                checkpoint.mark_completed(cycle)
+                if duplicate:
+                    # Tagged (or out of resamples): kept, with the match recorded in the index.
+                    print(f"Cycle {cycle} completed; near-duplicate of cycle {duplicate[1]} ({duplicate[2]:.0%}).\n")
+                else:
+                    print(f"Cycle {cycle} completed.\n")
+            else:
+                checkpoint.mark_failed(cycle, f"no response after {max_retries} retries")
+                print(f"Cycle {cycle} failed after {max_retries} retries. It will be re-run on resume.\n")
+            checkpoint.sync_with(sink)
+            if dedup is not None:
+                dedup.sync_with(sink)
+        return resample
+
+    def marked(cycles):
+        for cycle in cycles:
+            checkpoint.mark_in_flight(cycle)
+            yield cycle
+
+    max_resamples = dedup.max_resamples if dedup is not None else 0
+    try:
+        resample = run_cycles(scheduled_cycles(), attempt=1)
+        for round_number in range(1, max_resamples + 1):
+            if not resample:
+                break
+            print(f"Resampling {len(resample)} near-duplicate cycles (round {round_number} of {max_resamples})")
+            resample = run_cycles(marked(resample), attempt=round_number + 1)
+    finally:
+        if archive is not None:
+            archive.close()
+        sink.flush()
+        checkpoint.close()
+        if dedup is not None:
+            dedup.close()
+        export_excel(sink, output_dir_excel, session_id)
+        sink.close()
 
 if __name__ == "__main__":
     # Example configuration for Layer 1
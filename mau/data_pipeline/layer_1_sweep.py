@@ -0,0 +1,217 @@
+# mau/data_pipeline/layer_1_sweep.py
+
+import glob
+import json
+import os
+import threading
+from dataclasses import dataclass
+from itertools import product
+from typing import Iterator, List, Optional, Tuple
+
+from mau.data_pipeline.checkpoint import CheckpointIndex
+from mau.data_pipeline.dedup_index import DROP, RESAMPLE, MinHashLSHIndex, dedup_signature_options, open_dedup_index
+from mau.data_pipeline.layer_1 import (
+    ensure_dir, export_excel, generate_response, load_file, open_checkpoint, open_session_sink, save_response,
+)
+from mau.data_pipeline.md_archive import MarkdownArchive, open_md_archive
+from mau.data_pipeline.postprocess import PostProcessor, Rejected
+from mau.data_pipeline.result_sink import ResultSink
+from mau.llm.provider_factory import choose_provider
+from mau.utils.concurrency import ordered_map
+from mau.utils.metrics import get_metrics
+from mau.utils.retry import call_with_retry
+
+
+@dataclass
+class SweepPair:
+    """One identity x task prompt pair of a sweep; each pair is its own Layer 1 session."""
+    identity_path: str
+    task_path: str
+    session_id: str
+    cycle_count: int
+    identity_prompt: str = ""
+    task_prompt: str = ""
+    checkpoint: Optional[CheckpointIndex] = None
+    sink: Optional[ResultSink] = None
+    archive: Optional[MarkdownArchive] = None
+    dedup: Optional[MinHashLSHIndex] = None
+    pending: int = 0
+    scheduled_all: bool = False
+    completed: int = 0
+    failed: int = 0
+
+
+def _stem(path: str) -> str:
+    return os.path.splitext(os.path.basename(path))[0].replace(" ", "_")
+
+
+def pair_session_id(sweep_id: str, identity_path: str, task_path: str) -> str:
+    return f"{sweep_id}__{_stem(identity_path)}__{_stem(task_path)}"
+
+
+def discover_pairs(config: dict) -> List[SweepPair]:
+    """Every identity file in identity_dir x every task file in task_dir (matched by the sweep globs)."""
+    sweep_id = config.get("sweep_id") or config.get("session_id") or "sweep"
+    identities = sorted(glob.glob(os.path.join(config["identity_dir"], config.get("identity_glob") or "*.md")))
+    tasks = sorted(glob.glob(os.path.join(config["task_dir"], config.get("task_glob") or "*.md")))
+    return [SweepPair(identity, task, pair_session_id(sweep_id, identity, task), config["cycle_count"])
+            for identity, task in product(identities, tasks)]
+
+
+def load_manifest(config: dict) -> List[SweepPair]:
+    """
+    Read the pairs listed in sweep_manifest: a JSON list (or JSONL file) of objects with
+    "identity" and "task" file names (relative to identity_dir / task_dir unless absolute)
+    and optional "cycles" and "session_id".
+    """
+    sweep_id = config.get("sweep_id") or config.get("session_id") or "sweep"
+    path = config["sweep_manifest"]
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            entries = [json.loads(line) for line in f if line.strip()]
+        else:
+            entries = json.load(f)
+    pairs = []
+    for entry in entries:
+        identity = os.path.join(config["identity_dir"], entry["identity"])
+        task = os.path.join(config["task_dir"], entry["task"])
+        pairs.append(SweepPair(identity, task,
+                               entry.get("session_id") or pair_session_id(sweep_id, identity, task),
+                               entry.get("cycles") or config["cycle_count"]))
+    return pairs
+
+
+def run_layer1_sweep(config: dict) -> List[SweepPair]:
+    """
+    Run Layer 1 over many identity x task prompt pairs in one process, without prompts.
+
+    Pairs come from sweep_manifest when set, else from the product of identity_dir and
+    task_dir. Every (pair, cycle) job goes through one shared work queue with up to
+    `concurrency` calls in flight, so the backend stays busy across pair boundaries.
+    Each pair is its own session (<sweep_id>__<identity>__<task>) with its own result
+    store, checkpoint and Excel export, so re-running the sweep resumes every pair
+    where it stopped. A pair's session is opened when its first job is scheduled and
+    closed once its last result is saved. With dedup, each pair has its own
+    near-duplicate index; a cycle to resample is marked failed and generated again when
+    the sweep is resumed.
+    """
+    if config.get("cycle_count") is None:
+        raise ValueError("A Layer 1 sweep needs cycle_count in the data_pipeline_layer1 config.")
+    output_dir_md = config["output_dir_md"]
+    output_dir_excel = config["output_dir_excel"]
+    model = config["model"]
+    temperature = config.get("temperature", 0.8)
+    ctx_size = config.get("ctx_size", 2048)
+    concurrency = config.get("concurrency", 1)
+    max_retries = config.get("max_retries", 3)
+    retry_backoff = config.get("retry_backoff", 1.0)
+    result_format = config.get("result_format", "jsonl")
+    fsync_every = config.get("fsync_every", 16)
+    md_format = config.get("md_format", "files")
+    ensure_dir(output_dir_md)
+    ensure_dir(output_dir_excel)
+
+    pairs = load_manifest(config) if config.get("sweep_manifest") else discover_pairs(config)
+    print(f"Sweep over {len(pairs)} prompt pairs, {concurrency} calls in flight")
+    provider = choose_provider(config.get("provider", "lmstudio"), config.get("provider_config") or {})
+    get_metrics().start_session(f"layer1_sweep_{config.get('sweep_id') or config.get('session_id') or 'sweep'}")
+
+    open_pairs: List[SweepPair] = []
+    # Jobs are scheduled on whichever thread drives ordered_map (the post-processor's feed
+    # thread when post-processing is on), so the per-pair bookkeeping is shared with the
+    # result loop and guarded by this lock.
+    lock = threading.Lock()
+    finished = threading.Event()
+
+    def open_pair(pair: SweepPair):
+        pair.identity_prompt = load_file(pair.identity_path)
+        pair.task_prompt = load_file(pair.task_path)
+        pair.checkpoint = open_checkpoint(output_dir_excel, output_dir_md, pair.session_id)
+        pair.sink = open_session_sink(output_dir_excel, pair.session_id, result_format, fsync_every)
+        pair.archive = open_md_archive(output_dir_md, "response", pair.session_id, md_format, fsync_every)
+        pair.dedup = open_dedup_index(output_dir_excel, pair.session_id, config.get("dedup"), pair.sink)
+
+    def close_pair(pair: SweepPair):
+        if pair.archive is not None:
+            pair.archive.close()
+        pair.sink.flush()
+        pair.checkpoint.close()
+        if pair.dedup is not None:
+            pair.dedup.close()
+        export_excel(pair.sink, output_dir_excel, pair.session_id)
+        pair.sink.close()
+        print(f"Pair {pair.session_id}: {pair.completed} completed, {pair.failed} failed")
+
+    def release(pair: SweepPair, scheduled_all: bool = False, finished_job: bool = False):
+        """Update a pair's bookkeeping and close it once it is fully scheduled and saved."""
+        with lock:
+            pair.scheduled_all = pair.scheduled_all or scheduled_all
+            if finished_job:
+                pair.pending -= 1
+            done = pair.scheduled_all and pair.pending == 0 and pair in open_pairs
+            if done:
+                open_pairs.remove(pair)
+        if done:
+            close_pair(pair)
+
+    def scheduled_jobs() -> Iterator[Tuple[SweepPair, int]]:
+        for pair in pairs:
+            with lock:
+                if finished.is_set():
+                    return
+                open_pair(pair)
+                open_pairs.append(pair)
+            for cycle in pair.checkpoint.cycles_to_run(pair.cycle_count):
+                pair.checkpoint.mark_in_flight(cycle)
+                with lock:
+                    pair.pending += 1
+                yield pair, cycle
+            release(pair, scheduled_all=True)
+
+    def run_job(job: Tuple[SweepPair, int]) -> Optional[str]:
+        pair, cycle = job
+        return call_with_retry(generate_response, provider, pair.identity_prompt, pair.task_prompt, model,
+                               temperature, ctx_size, max_retries=max_retries, backoff=retry_backoff,
+                               description=f"{pair.session_id} cycle {cycle}")
+
+    results = ordered_map(run_job, scheduled_jobs(), max_workers=concurrency)
+    # With dedup on, the post-processing workers also compute the MinHash signatures.
+    signing = dedup_signature_options(config.get("dedup"))
+    postprocessor = PostProcessor.from_config(config, signing)
+    if postprocessor is not None:
+        results = postprocessor.process_signed(results)
+    else:
+        results = (((pair, cycle), response, None) for (pair, cycle), response in results)
+    try:
+        for (pair, cycle), response, signature in results:
+            duplicate = None
+            if pair.dedup is not None and response and not isinstance(response, Rejected):
+                duplicate = pair.dedup.screen(cycle, response, signature, pair.checkpoint.attempts(cycle), signing)
+            if isinstance(response, Rejected):
+                pair.checkpoint.mark_failed(cycle, f"rejected by {response.step}: {response.reason}")
+                pair.failed += 1
+            elif duplicate and duplicate[0] == RESAMPLE:
+                pair.checkpoint.mark_failed(cycle, f"near-duplicate of cycle {duplicate[1]}")
+                pair.failed += 1
+            elif duplicate and duplicate[0] == DROP:
+                pair.checkpoint.mark_completed(cycle)
+                pair.completed += 1
+            elif response:
+                save_response(pair.identity_prompt, pair.task_prompt, response, cycle, pair.session_id,
+                              output_dir_md, pair.sink, pair.archive)
+                pair.checkpoint.mark_completed(cycle)
+                pair.completed += 1
+            else:
+                pair.checkpoint.mark_failed(cycle, f"no response after {max_retries} retries")
+                pair.failed += 1
+            pair.checkpoint.sync_with(pair.sink)
+            if pair.dedup is not None:
+                pair.dedup.sync_with(pair.sink)
+            release(pair, finished_job=True)
+    finally:
+        with lock:
+            finished.set()
+            left, open_pairs[:] = list(open_pairs), []
+        for pair in left:
+            close_pair(pair)
+    return pairs
@@ -0,0 +1,158 @@
+# mau/data_pipeline/md_archive.py
+
+import logging
+import os
+import threading
+from typing import Dict, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MD_FORMATS = ("files", "archive")
+
+
+class MarkdownArchive:
+    """
+    Append-only archive of a session's Markdown outputs: one data file (<base>.mdpack)
+    with the documents back to back, and an index file (<base>.mdpack.idx) with one
+    "cycle, offset, length, file name" line per document.
+
+    Reading cycle N is one seek. A document is written and flushed before its index
+    line, so an interrupted write leaves at worst an unindexed tail, which is ignored
+    (a partial index line is cut off when the archive is reopened for writing).
+    A cycle saved again supersedes its earlier entry.
+    """
+
+    def __init__(self, base_path: str, fsync_every: int = 16):
+        self.data_path = f"{base_path}.mdpack"
+        self.index_path = f"{base_path}.mdpack.idx"
+        self.fsync_every = max(1, fsync_every)
+        os.makedirs(os.path.dirname(os.path.abspath(self.data_path)), exist_ok=True)
+        self._lock = threading.Lock()
+        _drop_partial_line(self.index_path)
+        self._entries: Dict[int, Tuple[int, int, str]] = dict(read_archive_index(base_path))
+        self._data = open(self.data_path, "ab")
+        self._index = open(self.index_path, "a", encoding="utf-8")
+        self._unsynced = 0
+
+    def append(self, cycle: int, name: str, text: str):
+        data = text.encode("utf-8")
+        with self._lock:
+            offset = self._data.tell()
+            self._data.write(data)
+            self._data.flush()
+            self._index.write(f"{int(cycle)}\t{offset}\t{len(data)}\t{name}\n")
+            self._index.flush()
+            self._entries[int(cycle)] = (offset, len(data), name)
+            self._unsynced += 1
+            if self._unsynced >= self.fsync_every:
+                self._sync()
+
+    def _sync(self):
+        os.fsync(self._data.fileno())
+        os.fsync(self._index.fileno())
+        self._unsynced = 0
+
+    def read(self, cycle: int) -> str:
+        """The document saved for cycle (KeyError if there is none)."""
+        with self._lock:
+            offset, length, _ = self._entries[int(cycle)]
+        return read_document(self.data_path, offset, length)
+
+    def cycles(self):
+        with self._lock:
+            return sorted(self._entries)
+
+    def __contains__(self, cycle: int) -> bool:
+        return int(cycle) in self._entries
+
+    def flush(self):
+        with self._lock:
+            self._data.flush()
+            self._index.flush()
+            self._sync()
+
+    def close(self):
+        with self._lock:
+            if self._data.closed:
+                return
+            self._data.flush()
+            self._index.flush()
+            self._sync()
+            self._data.close()
+            self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def md_archive_base(output_dir_md: str, prefix: str, session_id: str) -> str:
+    """Archive base path for a session, e.g. <output_dir_md>/response_session_<id> for Layer 1."""
+    return os.path.join(output_dir_md, f"{prefix}_session_{session_id}")
+
+
+def md_archive_exists(base_path: str) -> bool:
+    return os.path.exists(f"{base_path}.mdpack.idx")
+
+
+def read_archive_index(base_path: str) -> Iterator[Tuple[int, Tuple[int, int, str]]]:
+    """Yield (cycle, (offset, length, file name)) for every complete index line, oldest first."""
+    index_path = f"{base_path}.mdpack.idx"
+    if not os.path.exists(index_path):
+        return
+    data_size = os.path.getsize(f"{base_path}.mdpack") if os.path.exists(f"{base_path}.mdpack") else 0
+    with open(index_path, "r", encoding="utf-8") as f:
+        for line in f:
+            parts = line.rstrip("\n").split("\t", 3)
+            if not line.endswith("\n") or len(parts) != 4:
+                logger.warning(f"Ignoring an incomplete entry at the end of {index_path}")
+                continue
+            cycle, offset, length, name = int(parts[0]), int(parts[1]), int(parts[2]), parts[3]
+            if offset + length > data_size:
+                logger.warning(f"Ignoring cycle {cycle} in {index_path}: its document was not fully written")
+                continue
+            yield cycle, (offset, length, name)
+
+
+def _drop_partial_line(index_path: str):
+    """Truncate an index file after its last complete line, so new entries start on a line of their own."""
+    if not os.path.exists(index_path) or os.path.getsize(index_path) == 0:
+        return
+    with open(index_path, "rb+") as f:
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) == b"\n":
+            return
+        f.seek(0)
+        f.truncate(f.read().rfind(b"\n") + 1)
+
+
+def read_document(data_path: str, offset: int, length: int) -> str:
+    with open(data_path, "rb") as f:
+        f.seek(offset)
+        return f.read(length).decode("utf-8")
+
+
+def open_md_archive(output_dir_md: str, prefix: str, session_id: str, md_format: str = "files",
+                    fsync_every: int = 16) -> Optional[MarkdownArchive]:
+    """The session's archive when md_format is "archive"; None means one .md file per cycle."""
+    if md_format not in MD_FORMATS:
+        raise ValueError(f"Unknown Markdown output format: {md_format}")
+    if md_format == "files":
+        return None
+    return MarkdownArchive(md_archive_base(output_dir_md, prefix, session_id), fsync_every)
+
+
+def export_markdown(base_path: str, output_dir: str) -> int:
+    """Expand an archive into one .md file per cycle (the "files" layout); returns the number written."""
+    os.makedirs(output_dir, exist_ok=True)
+    entries = dict(read_archive_index(base_path))
+    data_path = f"{base_path}.mdpack"
+    with open(data_path, "rb") as data:
+        for cycle in sorted(entries):
+            offset, length, name = entries[cycle]
+            data.seek(offset)
+            with open(os.path.join(output_dir, name), "wb") as f:
+                f.write(data.read(length))
+    return len(entries)
@@ -0,0 +1,322 @@
+# mau/data_pipeline/postprocess.py
+
+import importlib
+import json
+import logging
+import multiprocessing
+import queue
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from mau.data_pipeline.dedup_index import minhash_signature
+from mau.utils.metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Rejected:
+    """A response dropped by a post-processing step; the cycle is recorded as failed with the reason."""
+    step: str
+    reason: str
+
+
+class Reject(Exception):
+    """Raised by a step to drop the response it was given."""
+
+
+# --- Built-in steps. Each takes the text plus its options and returns the new text or raises Reject.
+
+_THINK_BLOCK = re.compile(r"<think>.*?</think>\s*", re.DOTALL | re.IGNORECASE)
+
+
+def strip_think(text: str) -> str:
+    """Remove <think>...</think> reasoning blocks (deepseek-r1 and similar), including an unopened one."""
+    text = _THINK_BLOCK.sub("", text)
+    # Some templates open the block in the prompt, so only the closing tag shows up.
+    if "</think>" in text.lower():
+        text = re.split(r"</think>", text, flags=re.IGNORECASE)[-1]
+    text = text.strip()
+    if not text:
+        raise Reject("nothing left after removing the reasoning block")
+    return text
+
+
+def length_filter(text: str, min_chars: int = 0, max_chars: Optional[int] = None,
+                  min_words: int = 0, max_words: Optional[int] = None) -> str:
+    words = len(text.split())
+    if len(text) < min_chars:
+        raise Reject(f"{len(text)} characters, below min_chars={min_chars}")
+    if max_chars is not None and len(text) > max_chars:
+        raise Reject(f"{len(text)} characters, above max_chars={max_chars}")
+    if words < min_words:
+        raise Reject(f"{words} words, below min_words={min_words}")
+    if max_words is not None and words > max_words:
+        raise Reject(f"{words} words, above max_words={max_words}")
+    return text
+
+
+def quality_filter(text: str, max_repeated_line_ratio: float = 0.5, min_unique_word_ratio: float = 0.2,
+                   reject_patterns: Iterable[str] = ()) -> str:
+    """Drop degenerate generations: looping lines, a tiny vocabulary, or known refusal/boilerplate patterns."""
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    if len(lines) >= 4:
+        repeated = 1 - len(set(lines)) / len(lines)
+        if repeated > max_repeated_line_ratio:
+            raise Reject(f"{repeated:.0%} of lines are repeats")
+    words = text.lower().split()
+    if len(words) >= 20:
+        unique = len(set(words)) / len(words)
+        if unique < min_unique_word_ratio:
+            raise Reject(f"only {unique:.0%} of words are distinct")
+    for pattern in reject_patterns:
+        if re.search(pattern, text, re.IGNORECASE):
+            raise Reject(f"matches {pattern!r}")
+    return text
+
+
+_JSON_FENCE = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL)
+_JSON_TYPES = {"object": dict, "array": list, "string": str, "integer": int, "number": (int, float),
+               "boolean": bool, "null": type(None)}
+
+
+def _check_schema(value: Any, schema: dict, path: str = "$"):
+    """Subset of JSON Schema (type, enum, required, properties, items), used when jsonschema is not installed."""
+    expected = schema.get("type")
+    if expected is not None:
+        types = expected if isinstance(expected, list) else [expected]
+        if not any(isinstance(value, _JSON_TYPES[t]) and not (t in ("integer", "number") and isinstance(value, bool))
+                   for t in types):
+            raise Reject(f"{path} is not of type {expected}")
+    if "enum" in schema and value not in schema["enum"]:
+        raise Reject(f"{path} is not one of {schema['enum']}")
+    if isinstance(value, dict):
+        for key in schema.get("required", []):
+            if key not in value:
+                raise Reject(f"{path} is missing {key!r}")
+        for key, subschema in schema.get("properties", {}).items():
+            if key in value:
+                _check_schema(value[key], subschema, f"{path}.{key}")
+    if isinstance(value, list) and isinstance(schema.get("items"), dict):
+        for index, item in enumerate(value):
+            _check_schema(item, schema["items"], f"{path}[{index}]")
+
+
+def json_schema(text: str, schema: Optional[dict] = None, extract: bool = True) -> str:
+    """
+    Require the response to be JSON matching schema. With extract, a ```json fenced block
+    is taken out of surrounding prose and the response is replaced by the JSON alone.
+    Validation uses jsonschema when installed and a basic subset of the spec otherwise.
+    """
+    candidate = text
+    if extract:
+        match = _JSON_FENCE.search(text)
+        if match:
+            candidate = match.group(1)
+    try:
+        value = json.loads(candidate)
+    except json.JSONDecodeError as e:
+        raise Reject(f"not valid JSON ({e.msg})")
+    if schema:
+        try:
+            import jsonschema
+        except ImportError:
+            _check_schema(value, schema)
+        else:
+            try:
+                jsonschema.validate(value, schema)
+            except jsonschema.ValidationError as e:
+                raise Reject(f"schema violation: {e.message}")
+    return candidate.strip() if extract else text
+
+
+STEPS: Dict[str, Callable[..., str]] = {
+    "strip_think": strip_think,
+    "length": length_filter,
+    "quality": quality_filter,
+    "json_schema": json_schema,
+}
+
+
+def resolve_step(name: str) -> Callable[..., str]:
+    """A built-in step, or a custom one given as "package.module:function"."""
+    if name in STEPS:
+        return STEPS[name]
+    if ":" in name:
+        module_name, function_name = name.split(":", 1)
+        return getattr(importlib.import_module(module_name), function_name)
+    raise ValueError(f"Unknown post-processing step: {name}")
+
+
+def _process_batch(steps: List[Dict[str, Any]], texts: List[Optional[str]],
+                   signature: Optional[Dict[str, int]] = None) -> List[Tuple[Any, Optional[Tuple[int, ...]]]]:
+    """
+    Run in a worker process: apply the steps to each text. Returns (text or Rejected,
+    MinHash signature or None) per input; the signature is only computed for kept texts
+    when signature options are given. None inputs (failed generations) pass through.
+    """
+    results = []
+    for text in texts:
+        for step in steps:
+            if text is None or isinstance(text, Rejected):
+                break
+            name = step["name"]
+            options = {key: value for key, value in step.items() if key != "name"}
+            try:
+                text = resolve_step(name)(text, **options)
+            except Reject as e:
+                text = Rejected(name, str(e))
+        kept = text is not None and not isinstance(text, Rejected)
+        results.append((text, minhash_signature(text, **signature) if kept and signature else None))
+    return results
+
+
+_END = object()
+
+
+@dataclass
+class _FeedError:
+    error: BaseException
+
+
+def _put(q: queue.Queue, entry, stop: threading.Event) -> bool:
+    while not stop.is_set():
+        try:
+            q.put(entry, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _feed(results: Iterable, inbox: queue.Queue, stop: threading.Event):
+    """Pull the (item, response) pairs on a helper thread, so a stalled generator does not hold back flushes."""
+    try:
+        for pair in results:
+            if not _put(inbox, pair, stop):
+                return
+    except Exception as e:
+        _put(inbox, _FeedError(e), stop)
+        return
+    _put(inbox, _END, stop)
+
+
+class PostProcessor:
+    """
+    Post-processing stage between generation and the result sink.
+
+    Responses are handed to a process pool in batches of batch_size (or sooner once a
+    batch has waited max_batch_delay seconds), so CPU-heavy steps never stall the
+    I/O-bound generation loop. The responses are read on a helper thread, so a partial
+    batch is flushed on time even while generation is stalled. At most two batches per
+    worker are in flight; beyond that the loop waits. Results come back in input order. With workers=0 the steps
+    run inline. Given signature options (see MinHashLSHIndex.signature_options), the
+    workers also compute each kept response's MinHash signature for the dedup index.
+    """
+
+    def __init__(self, steps: List[Dict[str, Any]], workers: int = 2, batch_size: int = 8,
+                 max_batch_delay: float = 5.0, signature: Optional[Dict[str, int]] = None):
+        self.steps = [dict(step) for step in steps]
+        for step in self.steps:
+            if step["name"] == "near_duplicates":
+                raise ValueError("The near_duplicates step was replaced by the persisted near-duplicate index; "
+                                 "set \"dedup\" in data_pipeline_layer1 instead.")
+            resolve_step(step["name"])  # fail on a bad step name before any generation
+        self.signature = signature
+        self.workers = workers
+        self.batch_size = max(1, batch_size)
+        self.max_batch_delay = max_batch_delay
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    @classmethod
+    def from_config(cls, config: dict, signature: Optional[Dict[str, int]] = None) -> Optional["PostProcessor"]:
+        """The post-processor a pipeline section asks for, or None without postprocess steps or signatures."""
+        steps = config.get("postprocess") or []
+        if not steps and not signature:
+            return None
+        return cls(steps, config.get("postprocess_workers", 2), config.get("postprocess_batch_size", 8),
+                   signature=signature)
+
+    def apply(self, text: Optional[str]):
+        """Run the steps on one response inline; returns the processed text, a Rejected, or None."""
+        text = _process_batch(self.steps, [text])[0][0]
+        if isinstance(text, Rejected):
+            get_metrics().increment("mau_postprocess_rejected_total", step=text.step)
+        return text
+
+    def _submit(self, texts: List[Optional[str]]):
+        if self.workers <= 0:
+            return _process_batch(self.steps, texts, self.signature)
+        if self._executor is None:
+            # Spawned rather than forked: the pipeline already runs HTTP and worker threads.
+            self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._executor.submit(_process_batch, self.steps, texts, self.signature)
+
+    def _resolve(self, batch: List[Tuple[Any, Optional[str]]], future) -> Iterator[Tuple[Any, Any, Any]]:
+        metrics = get_metrics()
+        results = future if isinstance(future, list) else future.result()
+        for (item, _), (text, signature) in zip(batch, results):
+            if isinstance(text, Rejected):
+                metrics.increment("mau_postprocess_rejected_total", step=text.step)
+            yield item, text, signature
+
+    def process(self, results: Iterable[Tuple[Any, Optional[str]]]) -> Iterator[Tuple[Any, Any]]:
+        """
+        Wrap a stream of (item, response) pairs; yields (item, processed response) in the
+        same order, where the response is the processed text, a Rejected, or None when
+        generation itself failed.
+        """
+        signed = self.process_signed(results)
+        try:
+            for item, text, _ in signed:
+                yield item, text
+        finally:
+            signed.close()
+
+    def process_signed(self, results: Iterable[Tuple[Any, Optional[str]]]) -> Iterator[Tuple[Any, Any, Any]]:
+        """Like process, but yields (item, processed response, MinHash signature or None)."""
+        inbox: queue.Queue = queue.Queue(maxsize=self.batch_size)
+        stop = threading.Event()
+        threading.Thread(target=_feed, args=(results, inbox, stop), daemon=True, name="postprocess-feed").start()
+        pending = deque()
+        batch: List[Tuple[Any, Optional[str]]] = []
+        deadline = 0.0
+        try:
+            while True:
+                # Hand back finished batches without waiting, and wait only when too many are queued.
+                while pending and (isinstance(pending[0][1], list) or pending[0][1].done()
+                                   or len(pending) > 2 * max(1, self.workers)):
+                    yield from self._resolve(*pending.popleft())
+                # Wait for the next response with a timeout, so a partial batch is flushed on time.
+                try:
+                    entry = inbox.get(timeout=0.1)
+                except queue.Empty:
+                    entry = None
+                if isinstance(entry, _FeedError):
+                    raise entry.error
+                if entry is _END:
+                    break
+                if entry is not None:
+                    if not batch:
+                        deadline = time.monotonic() + self.max_batch_delay
+                    batch.append(entry)
+                if batch and (len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                    pending.append((batch, self._submit([text for _, text in batch])))
+                    batch = []
+            if batch:
+                pending.append((batch, self._submit([text for _, text in batch])))
+            while pending:
+                yield from self._resolve(*pending.popleft())
+        finally:
+            stop.set()
+            self.close()
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
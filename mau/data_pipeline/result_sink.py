@@ -0,0 +1,204 @@
+# mau/data_pipeline/result_sink.py
+
+import json
+import logging
+import os
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterator, List
+
+logger = logging.getLogger(__name__)
+
+# Column order of the Excel/CSV logs written by the data pipelines.
+RESULT_COLUMNS = [
+    "Session ID",
+    "Cycle Number",
+    "Timestamp",
+    "Identity Prompt",
+    "Task Prompt",
+    "Generated Response",
+]
+
+
+class ResultSink(ABC):
+    """Append-only store for pipeline result rows."""
+
+    path: str
+
+    @abstractmethod
+    def append(self, row: Dict[str, Any]):
+        """Append one result row."""
+        pass
+
+    @abstractmethod
+    def read_rows(self) -> Iterator[Dict[str, Any]]:
+        """Yield every stored row in the order it was appended."""
+        pass
+
+    @property
+    def pending_rows(self) -> int:
+        """Number of appended rows that are not durable yet."""
+        return 0
+
+    def flush(self):
+        """Make buffered rows durable."""
+        pass
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class JSONLResultSink(ResultSink):
+    """
+    Writes one JSON object per line. Each row reaches the OS right away (so it
+    survives a process crash); fsync is batched every fsync_every rows.
+    """
+
+    def __init__(self, path: str, fsync_every: int = 16):
+        self.path = path
+        self.fsync_every = max(1, fsync_every)
+        self._unsynced = 0
+        self._file = open(path, "a", encoding="utf-8")
+
+    def append(self, row: Dict[str, Any]):
+        self._file.write(json.dumps(row, ensure_ascii=False, default=str) + "\n")
+        self._file.flush()
+        self._unsynced += 1
+        if self._unsynced >= self.fsync_every:
+            self.flush()
+
+    @property
+    def pending_rows(self) -> int:
+        return self._unsynced
+
+    def read_rows(self) -> Iterator[Dict[str, Any]]:
+        return self.read_rows_from(self.path)
+
+    @staticmethod
+    def read_rows_from(path: str) -> Iterator[Dict[str, Any]]:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn last line from a crash; everything before it is intact.
+                    logger.warning(f"Skipping unreadable row in {path}")
+
+    def flush(self):
+        if self._file.closed:
+            return
+        self._file.flush()
+        if self._unsynced:
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+
+    def close(self):
+        self.flush()
+        self._file.close()
+
+
+class ParquetResultSink(ResultSink):
+    """
+    Buffers rows and writes each batch of row_group_size as its own Parquet part file.
+
+    Parquet files cannot be reopened for appending, and a file is only readable once its
+    footer is written, so path is a directory and every flush writes one complete part
+    (to a temporary name, renamed into place once fsynced). Readers only see finished
+    parts, so rows reported durable survive a crash.
+    """
+
+    def __init__(self, path: str, row_group_size: int = 16):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError("The parquet result format requires pyarrow (pip install pyarrow).") from e
+        self._pa = pa
+        self._pq = pq
+        self.path = path
+        self.row_group_size = max(1, row_group_size)
+        os.makedirs(path, exist_ok=True)
+        for name in os.listdir(path):
+            if name.endswith(".parquet.tmp"):
+                # A part that was being written when a previous run crashed.
+                os.remove(os.path.join(path, name))
+        self._next_part = 1 + max((int(name[len("part-"):-len(".parquet")]) for name in self._part_names()), default=-1)
+        self._buffer: List[Dict[str, Any]] = []
+
+    def _part_names(self) -> List[str]:
+        return sorted(name for name in os.listdir(self.path) if name.startswith("part-") and name.endswith(".parquet"))
+
+    def append(self, row: Dict[str, Any]):
+        self._buffer.append(row)
+        if len(self._buffer) >= self.row_group_size:
+            self.flush()
+
+    @property
+    def pending_rows(self) -> int:
+        return len(self._buffer)
+
+    def read_rows(self) -> Iterator[Dict[str, Any]]:
+        self.flush()
+        for name in self._part_names():
+            part = self._pq.ParquetFile(os.path.join(self.path, name))
+            for batch in part.iter_batches():
+                yield from batch.to_pylist()
+
+    def flush(self):
+        if not self._buffer:
+            return
+        table = self._pa.Table.from_pylist(self._buffer)
+        part_path = os.path.join(self.path, f"part-{self._next_part:05d}.parquet")
+        with open(f"{part_path}.tmp", "wb") as f:
+            self._pq.write_table(table, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(f"{part_path}.tmp", part_path)
+        self._next_part += 1
+        self._buffer = []
+
+
+def result_sink_path(base_path: str, fmt: str = "jsonl") -> str:
+    """Return the on-disk path of a result store for base_path (a path without extension)."""
+    if fmt == "jsonl":
+        return f"{base_path}.jsonl"
+    if fmt == "parquet":
+        return f"{base_path}.parquet"
+    raise ValueError(f"Unknown result format: {fmt}")
+
+
+def open_result_sink(base_path: str, fmt: str = "jsonl", fsync_every: int = 16) -> ResultSink:
+    """Open (or create) the result store for base_path in the given format."""
+    path = result_sink_path(base_path, fmt)
+    if fmt == "jsonl":
+        return JSONLResultSink(path, fsync_every=fsync_every)
+    return ParquetResultSink(path, row_group_size=fsync_every)
+
+
+def result_sink_exists(base_path: str, fmt: str = "jsonl") -> bool:
+    return os.path.exists(result_sink_path(base_path, fmt))
+
+
+def seed_from_excel(sink: ResultSink, excel_path: str) -> int:
+    """
+    Copy the rows of a legacy Excel log into an empty sink, so sessions started
+    before the append-only store keep their history. Returns the number of rows copied.
+    """
+    import pandas as pd
+
+    df = pd.read_excel(excel_path)
+    count = 0
+    for row in df.to_dict(orient="records"):
+        sink.append({column: row.get(column) for column in RESULT_COLUMNS})
+        count += 1
+    sink.flush()
+    logger.info(f"Imported {count} rows from {excel_path} into {sink.path}")
+    return count
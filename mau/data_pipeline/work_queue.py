@@ -0,0 +1,200 @@
+# mau/data_pipeline/work_queue.py
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+
+@dataclass
+class Job:
+    id: int
+    queue: str
+    key: str
+    payload: Dict[str, Any]
+    attempts: int
+    status: str = PENDING
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
+
+class WorkQueue:
+    """
+    Durable job queue in one SQLite file, shared by a coordinator and any number of workers.
+
+    A worker claims a job by leasing it for lease_seconds and must renew the lease
+    while it works. A job whose lease runs out (the worker died or lost its host) goes
+    back to pending on the next claim, and a late result for it is refused. A job that
+    fails or loses its lease max_attempts times is marked failed. Workers on other hosts
+    can share the file over network storage as long as it supports file locks. Leases
+    use wall-clock time, so those hosts' clocks should be roughly in sync.
+    """
+
+    def __init__(self, path: str, max_attempts: int = 3, busy_timeout: float = 30.0):
+        self.path = path
+        self.max_attempts = max_attempts
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        # Autocommit mode; every write below runs in an explicit BEGIN IMMEDIATE transaction.
+        self._conn = sqlite3.connect(path, timeout=busy_timeout, check_same_thread=False, isolation_level=None)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " queue TEXT NOT NULL,"
+            " key TEXT NOT NULL,"
+            " payload TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " owner TEXT,"
+            " lease_expires REAL,"
+            " available_at REAL NOT NULL DEFAULT 0,"
+            " result TEXT,"
+            " error TEXT,"
+            " collected INTEGER NOT NULL DEFAULT 0,"
+            " updated_at TEXT NOT NULL,"
+            " UNIQUE (queue, key))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status, available_at)")
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    @staticmethod
+    def _now() -> str:
+        return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    def publish(self, queue: str, jobs: Iterable[Tuple[str, Dict[str, Any]]]) -> int:
+        """
+        Add (key, payload) jobs. A key already queued is left alone unless it failed or
+        was collected, in which case it is queued again (the coordinator only republishes
+        work its checkpoint does not have). Returns the number of jobs added or re-queued.
+        """
+        now = self._now()
+        rows = [(queue, key, json.dumps(payload, ensure_ascii=False), PENDING, now) for key, payload in jobs]
+        with self._transaction() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT INTO jobs (queue, key, payload, status, updated_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(queue, key) DO UPDATE SET payload = excluded.payload, status = excluded.status,"
+                " attempts = 0, owner = NULL, lease_expires = NULL, available_at = 0, result = NULL,"
+                " error = NULL, collected = 0, updated_at = excluded.updated_at"
+                f" WHERE jobs.status = '{FAILED}' OR jobs.collected = 1",
+                rows,
+            )
+            return conn.total_changes - before
+
+    def _expire_leases(self, conn, now: float):
+        conn.execute(
+            f"UPDATE jobs SET status = CASE WHEN attempts >= ? THEN '{FAILED}' ELSE '{PENDING}' END,"
+            " error = 'lease expired', owner = NULL, lease_expires = NULL, updated_at = ?"
+            " WHERE status = ? AND lease_expires < ?",
+            (self.max_attempts, self._now(), LEASED, now),
+        )
+
+    def claim(self, worker: str, lease_seconds: float, queue: Optional[str] = None, limit: int = 1) -> List[Job]:
+        """Lease up to limit pending jobs (from any queue unless one is given), oldest first."""
+        now = time.time()
+        with self._transaction() as conn:
+            self._expire_leases(conn, now)
+            query = "SELECT id, queue, key, payload, attempts FROM jobs WHERE status = ? AND available_at <= ?"
+            params: List[Any] = [PENDING, now]
+            if queue is not None:
+                query += " AND queue = ?"
+                params.append(queue)
+            rows = conn.execute(query + " ORDER BY id LIMIT ?", params + [limit]).fetchall()
+            conn.executemany(
+                "UPDATE jobs SET status = ?, owner = ?, lease_expires = ?, attempts = attempts + 1, updated_at = ?"
+                " WHERE id = ?",
+                [(LEASED, worker, now + lease_seconds, self._now(), row[0]) for row in rows],
+            )
+        return [Job(id, queue_name, key, json.loads(payload), attempts + 1, LEASED)
+                for id, queue_name, key, payload, attempts in rows]
+
+    def renew(self, job_ids: Iterable[int], worker: str, lease_seconds: float) -> int:
+        """Extend the leases this worker still holds; returns how many were renewed."""
+        job_ids = list(job_ids)
+        if not job_ids:
+            return 0
+        with self._transaction() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                "UPDATE jobs SET lease_expires = ? WHERE id = ? AND owner = ? AND status = ?",
+                [(time.time() + lease_seconds, job_id, worker, LEASED) for job_id in job_ids],
+            )
+            return conn.total_changes - before
+
+    def complete(self, job_id: int, worker: str, result: Dict[str, Any]) -> bool:
+        """Store a job's result; False if the worker no longer holds the lease."""
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = NULL, owner = NULL, lease_expires = NULL,"
+                " updated_at = ? WHERE id = ? AND owner = ? AND status = ?",
+                (DONE, json.dumps(result, ensure_ascii=False), self._now(), job_id, worker, LEASED),
+            )
+            return cursor.rowcount == 1
+
+    def fail(self, job_id: int, worker: str, error: str, retry_delay: float = 0.0) -> bool:
+        """Put a job back after retry_delay seconds, or mark it failed once max_attempts are used."""
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                f"UPDATE jobs SET status = CASE WHEN attempts >= ? THEN '{FAILED}' ELSE '{PENDING}' END,"
+                " error = ?, owner = NULL, lease_expires = NULL, available_at = ?, updated_at = ?"
+                " WHERE id = ? AND owner = ? AND status = ?",
+                (self.max_attempts, error, time.time() + retry_delay, self._now(), job_id, worker, LEASED),
+            )
+            return cursor.rowcount == 1
+
+    def finished(self, queue: str, limit: int = 64) -> List[Job]:
+        """Done or failed jobs of a queue that the coordinator has not collected yet."""
+        with self._transaction() as conn:
+            self._expire_leases(conn, time.time())
+            rows = conn.execute(
+                "SELECT id, key, payload, attempts, status, result, error FROM jobs"
+                " WHERE queue = ? AND status IN (?, ?) AND collected = 0 ORDER BY id LIMIT ?",
+                (queue, DONE, FAILED, limit),
+            ).fetchall()
+        return [Job(id, queue, key, json.loads(payload), attempts, status,
+                    json.loads(result) if result else None, error)
+                for id, key, payload, attempts, status, result, error in rows]
+
+    def mark_collected(self, job_ids: Iterable[int]):
+        with self._transaction() as conn:
+            conn.executemany("UPDATE jobs SET collected = 1 WHERE id = ?", [(job_id,) for job_id in job_ids])
+
+    def counts(self, queue: Optional[str] = None) -> Dict[str, int]:
+        """Number of jobs per status, for one queue or all of them."""
+        query = "SELECT status, COUNT(*) FROM jobs"
+        params: List[Any] = []
+        if queue is not None:
+            query += " WHERE queue = ?"
+            params.append(queue)
+        with self._lock:
+            return dict(self._conn.execute(query + " GROUP BY status", params).fetchall())
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
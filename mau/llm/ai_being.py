@@ -1,6 +1,12 @@
-from copy import deepcopy
-from typing import Iterator, List, Dict, Optional
-from .llm_provider import LLMProvider
+import asyncio
+import logging
+from typing import AsyncIterator, Iterator, List, Dict, Optional, Union
+from .llm_provider import AsyncLLMProvider, LLMProvider
+from .history import MessageHistory, MessagesView, Summarizer, Tokenizer, estimate_tokens, transcript_for_summary
+from .stream_metrics import StreamStats, ameasure_stream, measure_stream
+from .async_adapters import as_async, as_sync
+
+logger = logging.getLogger(__name__)
 
 class AIBeing:
     def __init__(
@@ -10,35 +16,104 @@ class AIBeing:
         temperature: float,
         ctx_size: int,
         system_prompt: str,
-        provider: LLMProvider,
+        provider: Union[LLMProvider, AsyncLLMProvider],
+        history_strategy: str = "sliding_window",
+        tokenizer: Optional[Tokenizer] = None,
+        response_reserve: Optional[int] = None,
+        summarizer: Optional[Summarizer] = None,
     ):
         self.name = name
         self.model = model
         self.temperature = temperature
         self.ctx_size = ctx_size
         self.provider = provider
-        self._messages: List[Dict[str, str]] = [{"role": "system", "content": system_prompt}]
+        # History sent to the provider is kept within ctx_size minus the tokens reserved
+        # for the reply; ctx_size 0 disables trimming.
+        self.history_strategy = history_strategy
+        self.tokenizer = tokenizer or estimate_tokens
+        self.response_reserve = response_reserve if response_reserve is not None else ctx_size // 4
+        self.summarizer = summarizer or self._summarize_with_provider
+        self._history = MessageHistory(system_prompt, self.tokenizer)
+        self.turn_stats: List[StreamStats] = []
+
+    @property
+    def last_turn_stats(self) -> Optional[StreamStats]:
+        return self.turn_stats[-1] if self.turn_stats else None
+
+    @property
+    def messages(self) -> MessagesView:
+        """Read-only view of the history (no copy is made)."""
+        return self._history.view()
 
     @property
-    def messages(self) -> List[Dict[str, str]]:
-        return deepcopy(self._messages)
+    def history_tokens(self) -> int:
+        """Token count of the current history, maintained incrementally."""
+        return self._history.total_tokens
 
     @property
     def system_prompt(self) -> str:
-        return self._messages[0]["content"]
+        return self._history.system_prompt
 
     @system_prompt.setter
     def system_prompt(self, value: str):
-        self._messages[0]["content"] = value
+        self._history.set_system_prompt(value)
+
+    @property
+    def history_budget(self) -> int:
+        """Token budget for the prompt history (0 means unlimited)."""
+        if not self.ctx_size:
+            return 0
+        return max(1, self.ctx_size - self.response_reserve)
 
     def add_message(self, role: str, content: str):
-        self._messages.append({"role": role, "content": content})
+        self._history.append(role, content)
+
+    def fit_history(self):
+        """Trim (or summarize) the oldest messages so the next prompt fits the budget."""
+        self._history.fit(self.history_budget, self.history_strategy, self.summarizer)
+
+    def warmup(self):
+        """Ask the provider to load this agent's model; failures are logged, not raised."""
+        warmup = getattr(self.provider, "warmup", None)
+        if warmup is None:
+            return
+        try:
+            warmup(self.model)
+        except Exception as e:
+            logger.warning(f"Warm-up of {self.model} for {self.name} failed: {e}")
+
+    def _summarize_with_provider(self, messages: List[Dict[str, str]]) -> str:
+        prompt = [
+            {"role": "system", "content": "Summarize the following conversation in a few sentences. "
+                                          "Keep names, facts and open questions."},
+            {"role": "user", "content": transcript_for_summary(messages)},
+        ]
+        return "".join(as_sync(self.provider).chat(self.model, prompt, 0.0, self.ctx_size))
 
     def chat(self, user_input: Optional[str] = None) -> Iterator[str]:
         if user_input is not None:
             self.add_message("user", user_input)
+        self.fit_history()
+        response_chunks = []
+        stats = StreamStats()
+        chunks = as_sync(self.provider).chat(self.model, self._history.messages, self.temperature, self.ctx_size)
+        for chunk in measure_stream(chunks, stats):
+            response_chunks.append(chunk)
+            yield chunk
+        self.turn_stats.append(stats)
+        self.add_message("assistant", "".join(response_chunks).strip())
+
+    async def achat(self, user_input: Optional[str] = None) -> AsyncIterator[str]:
+        """Async variant of chat, so one event loop can drive many agents at once."""
+        if user_input is not None:
+            self.add_message("user", user_input)
+        # A summarizing strategy may call the provider; keep that off the event loop.
+        await asyncio.to_thread(self.fit_history)
         response_chunks = []
-        for chunk in self.provider.chat(self.model, self._messages, self.temperature, self.ctx_size):
+        stats = StreamStats()
+        chunks = as_async(self.provider).achat(self.model, self._history.messages, self.temperature, self.ctx_size)
+        async for chunk in ameasure_stream(chunks, stats):
             response_chunks.append(chunk)
             yield chunk
+        self.turn_stats.append(stats)
         self.add_message("assistant", "".join(response_chunks).strip())
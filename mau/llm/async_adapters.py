@@ -0,0 +1,95 @@
+# mau/llm/async_adapters.py
+
+import asyncio
+import threading
+from typing import AsyncIterator, Iterator, List, Dict, Optional, Union
+
+from .llm_provider import AsyncLLMProvider, LLMProvider
+
+_DONE = object()
+
+
+class AsyncFromSync(AsyncLLMProvider):
+    """
+    Expose a synchronous LLMProvider as an AsyncLLMProvider.
+
+    The blocking generator is advanced on the loop's default executor, so the event
+    loop stays responsive; this still costs a thread while a chunk is awaited.
+    """
+
+    def __init__(self, provider: LLMProvider):
+        self.provider = provider
+
+    async def achat(self, model: str, messages: List[Dict[str, str]], temperature: float, ctx_size: int) -> AsyncIterator[str]:
+        loop = asyncio.get_running_loop()
+        chunks = self.provider.chat(model, messages, temperature, ctx_size)
+        try:
+            while True:
+                chunk = await loop.run_in_executor(None, next, chunks, _DONE)
+                if chunk is _DONE:
+                    break
+                yield chunk
+        finally:
+            try:
+                chunks.close()
+            except ValueError:
+                # Cancelled while a worker thread is still inside next(); it finishes on its own.
+                pass
+
+
+class _BackgroundLoop:
+    """One event loop on a daemon thread, shared by every SyncFromAsync adapter."""
+
+    _lock = threading.Lock()
+    _loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @classmethod
+    def get(cls) -> asyncio.AbstractEventLoop:
+        with cls._lock:
+            if cls._loop is None:
+                cls._loop = asyncio.new_event_loop()
+                threading.Thread(target=cls._loop.run_forever, name="mau-async-loop", daemon=True).start()
+            return cls._loop
+
+
+class SyncFromAsync(LLMProvider):
+    """
+    Expose an AsyncLLMProvider as a synchronous LLMProvider.
+
+    Calls run on a shared background event loop, so many threads can drive async
+    providers while their HTTP connections are pooled on that one loop.
+    """
+
+    def __init__(self, provider: AsyncLLMProvider):
+        self.provider = provider
+
+    def chat(self, model: str, messages: List[Dict[str, str]], temperature: float, ctx_size: int) -> Iterator[str]:
+        loop = _BackgroundLoop.get()
+        chunks = self.provider.achat(model, messages, temperature, ctx_size)
+        try:
+            while True:
+                try:
+                    yield asyncio.run_coroutine_threadsafe(chunks.__anext__(), loop).result()
+                except StopAsyncIteration:
+                    break
+        finally:
+            asyncio.run_coroutine_threadsafe(chunks.aclose(), loop).result()
+
+
+def as_async(provider: Union[LLMProvider, AsyncLLMProvider]) -> AsyncLLMProvider:
+    """Return provider itself if it supports achat, otherwise wrap it."""
+    return provider if isinstance(provider, AsyncLLMProvider) else AsyncFromSync(provider)
+
+
+def as_sync(provider: Union[LLMProvider, AsyncLLMProvider]) -> LLMProvider:
+    """Return provider itself if it supports chat, otherwise wrap it."""
+    return provider if isinstance(provider, LLMProvider) else SyncFromAsync(provider)
+
+
+async def acollect(provider: Union[LLMProvider, AsyncLLMProvider], model: str, messages: List[Dict[str, str]],
+                   temperature: float, ctx_size: int) -> str:
+    """Run one chat call on the event loop and return the joined reply."""
+    chunks = []
+    async for chunk in as_async(provider).achat(model, messages, temperature, ctx_size):
+        chunks.append(chunk)
+    return "".join(chunks)
@@ -0,0 +1,174 @@
+# mau/llm/client_pool.py
+
+import importlib.util
+import logging
+import threading
+import weakref
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class PoolSettings:
+    """HTTP connection pool settings for one endpoint."""
+    timeout: float = 60.0
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    http2: bool = False
+
+    @classmethod
+    def from_config(cls, provider_config: Optional[dict]) -> "PoolSettings":
+        provider_config = provider_config or {}
+        defaults = cls()
+        return cls(
+            timeout=provider_config.get("timeout") or defaults.timeout,
+            max_connections=provider_config.get("max_connections") or defaults.max_connections,
+            max_keepalive_connections=provider_config.get("max_keepalive_connections") or defaults.max_keepalive_connections,
+            http2=bool(provider_config.get("http2", defaults.http2)),
+        )
+
+    def httpx_options(self) -> dict:
+        import httpx
+
+        http2 = self.http2
+        if http2 and importlib.util.find_spec("h2") is None:
+            logger.warning("http2 requested but the 'h2' package is not installed; falling back to HTTP/1.1")
+            http2 = False
+        return {
+            "timeout": self.timeout,
+            "limits": httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive_connections,
+            ),
+            "http2": http2,
+        }
+
+
+# One client (and so one keep-alive connection pool) per endpoint and key, shared by
+# every provider, agent and pipeline worker in the process. The settings of the first
+# caller for an endpoint win.
+_lock = threading.Lock()
+_openai_clients: Dict[Tuple[str, str], object] = {}
+_ollama_clients: Dict[str, object] = {}
+# Async clients are bound to the event loop they were created on, so they are pooled per loop.
+_async_clients: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+def get_openai_client(base_url: str, api_key: Optional[str], settings: Optional[PoolSettings] = None):
+    """Return the shared openai.OpenAI client for (base_url, api_key)."""
+    key = (base_url, api_key or "")
+    with _lock:
+        client = _openai_clients.get(key)
+        if client is None:
+            import openai
+
+            settings = settings or PoolSettings()
+            client = openai.OpenAI(
+                base_url=base_url,
+                # Local servers (LM Studio, vLLM) ignore the key, but the SDK requires one.
+                api_key=api_key or "not-needed",
+                http_client=openai.DefaultHttpxClient(**settings.httpx_options()),
+            )
+            _openai_clients[key] = client
+            logger.debug(f"Created pooled OpenAI-compatible client for {base_url}")
+        return client
+
+
+def get_ollama_client(host: Optional[str] = None, settings: Optional[PoolSettings] = None):
+    """Return the shared ollama.Client for host (None means the ollama default)."""
+    key = host or ""
+    with _lock:
+        client = _ollama_clients.get(key)
+        if client is None:
+            import ollama
+
+            settings = settings or PoolSettings()
+            client = ollama.Client(host=host, **settings.httpx_options())
+            _ollama_clients[key] = client
+            logger.debug(f"Created pooled Ollama client for {host or 'default host'}")
+        return client
+
+
+def _loop_clients() -> dict:
+    import asyncio
+
+    loop = asyncio.get_running_loop()
+    clients = _async_clients.get(loop)
+    if clients is None:
+        clients = {}
+        _async_clients[loop] = clients
+    return clients
+
+
+def get_async_openai_client(base_url: str, api_key: Optional[str], settings: Optional[PoolSettings] = None):
+    """Return the openai.AsyncOpenAI client for (base_url, api_key) shared on the running event loop."""
+    key = ("openai", base_url, api_key or "")
+    with _lock:
+        clients = _loop_clients()
+        client = clients.get(key)
+        if client is None:
+            import openai
+
+            settings = settings or PoolSettings()
+            client = openai.AsyncOpenAI(
+                base_url=base_url,
+                api_key=api_key or "not-needed",
+                http_client=openai.DefaultAsyncHttpxClient(**settings.httpx_options()),
+            )
+            clients[key] = client
+        return client
+
+
+def get_async_ollama_client(host: Optional[str] = None, settings: Optional[PoolSettings] = None):
+    """Return the ollama.AsyncClient for host shared on the running event loop."""
+    key = ("ollama", host or "")
+    with _lock:
+        clients = _loop_clients()
+        client = clients.get(key)
+        if client is None:
+            import ollama
+
+            settings = settings or PoolSettings()
+            client = ollama.AsyncClient(host=host, **settings.httpx_options())
+            clients[key] = client
+        return client
+
+
+async def _aclose(clients: list):
+    for client in clients:
+        await client.close()
+
+
+def close_all():
+    """
+    Close every pooled client, e.g. at the end of a batch run. Async clients are closed
+    on their own event loop: right away on an idle loop or one running on another
+    thread, and as a task when called from inside the loop. A closed loop's clients are
+    dropped.
+    """
+    import asyncio
+
+    with _lock:
+        clients = list(_openai_clients.values()) + list(_ollama_clients.values())
+        loops = [(loop, list(loop_clients.values())) for loop, loop_clients in _async_clients.items()]
+        _openai_clients.clear()
+        _ollama_clients.clear()
+        _async_clients.clear()
+    for client in clients:
+        client.close()
+    try:
+        current = asyncio.get_running_loop()
+    except RuntimeError:
+        current = None
+    for loop, loop_clients in loops:
+        closing = _aclose(loop_clients)
+        if loop.is_closed():
+            closing.close()
+        elif loop is current:
+            loop.create_task(closing)
+        elif loop.is_running():
+            asyncio.run_coroutine_threadsafe(closing, loop).result()
+        else:
+            loop.run_until_complete(closing)
@@ -0,0 +1,147 @@
+# mau/llm/history.py
+
+from collections.abc import Sequence
+from types import MappingProxyType
+from typing import Callable, Dict, List, Mapping, Optional
+
+Tokenizer = Callable[[str], int]
+Summarizer = Callable[[List[Dict[str, str]]], str]
+
+# Chat templates wrap every message in role markers; count a few tokens for that.
+MESSAGE_OVERHEAD_TOKENS = 4
+
+HISTORY_STRATEGIES = ("sliding_window", "summarize_oldest", "none")
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about 4 characters per token), used when no tokenizer is configured."""
+    return (len(text) + 3) // 4 if text else 0
+
+
+def message_tokens(message: Mapping[str, str], tokenizer: Tokenizer = estimate_tokens) -> int:
+    return tokenizer(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+
+
+def history_tokens(messages: Sequence, tokenizer: Tokenizer = estimate_tokens) -> int:
+    return sum(message_tokens(message, tokenizer) for message in messages)
+
+
+class MessagesView(Sequence):
+    """Read-only, copy-free view of a message list; items are read-only mappings."""
+
+    def __init__(self, messages: List[Dict[str, str]]):
+        self._messages = messages
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [MappingProxyType(message) for message in self._messages[index]]
+        return MappingProxyType(self._messages[index])
+
+    def __repr__(self) -> str:
+        return f"MessagesView({self._messages!r})"
+
+
+class MessageHistory:
+    """
+    Chat messages (system prompt first) with each message's token count cached when it
+    is added, plus a running total, so budget checks cost O(1) per turn. A summary of
+    folded turns is kept in the leading system message, since many chat templates
+    reject a system message anywhere else.
+    """
+
+    def __init__(self, system_prompt: str, tokenizer: Tokenizer = estimate_tokens):
+        self.tokenizer = tokenizer
+        self.system_prompt = system_prompt
+        self.summary = ""
+        self.messages: List[Dict[str, str]] = []
+        self.token_counts: List[int] = []
+        self.total_tokens = 0
+        self.append("system", system_prompt)
+
+    def __len__(self) -> int:
+        return len(self.messages)
+
+    def view(self) -> MessagesView:
+        return MessagesView(self.messages)
+
+    def append(self, role: str, content: str):
+        message = {"role": role, "content": content}
+        count = message_tokens(message, self.tokenizer)
+        self.messages.append(message)
+        self.token_counts.append(count)
+        self.total_tokens += count
+
+    def set_content(self, index: int, content: str):
+        self.messages[index]["content"] = content
+        count = message_tokens(self.messages[index], self.tokenizer)
+        self.total_tokens += count - self.token_counts[index]
+        self.token_counts[index] = count
+
+    def set_system_prompt(self, system_prompt: str):
+        """Replace the system prompt, keeping any summary of folded turns after it."""
+        self.system_prompt = system_prompt
+        self.set_content(0, f"{system_prompt}\n\n{SUMMARY_PREFIX}{self.summary}" if self.summary else system_prompt)
+
+    def _oldest_to_drop(self, target: int) -> int:
+        """Index after the oldest messages (past the system prompt) that must go to reach target."""
+        total = self.total_tokens
+        first = 1
+        while total > target and first < len(self.messages) - 1:
+            total -= self.token_counts[first]
+            first += 1
+        return first
+
+    def _replace_oldest(self, first: int, replacement: Optional[Dict[str, str]] = None):
+        new_messages = [replacement] if replacement else []
+        new_counts = [message_tokens(replacement, self.tokenizer)] if replacement else []
+        self.total_tokens += sum(new_counts) - sum(self.token_counts[1:first])
+        self.messages[1:first] = new_messages
+        self.token_counts[1:first] = new_counts
+
+    def sliding_window(self, budget: int):
+        """Drop the oldest messages after the system prompt until the history fits budget."""
+        if self.total_tokens > budget:
+            self._replace_oldest(self._oldest_to_drop(budget))
+
+    def summarize_oldest(self, budget: int, summarize: Summarizer):
+        """
+        Fold the oldest messages after the system prompt into a summary appended to the
+        system prompt; an earlier summary is folded into the new one. Messages are folded
+        until the rest uses at most half of the budget, leaving room for the summary and a
+        few more turns before the next fold. Falls back to sliding_window if the summary
+        itself does not fit.
+        """
+        if self.total_tokens <= budget or len(self.messages) <= 2:
+            return
+        first = self._oldest_to_drop(budget // 2)
+        folded = self.messages[1:first]
+        if self.summary:
+            folded = [{"role": "system", "content": SUMMARY_PREFIX + self.summary}] + folded
+        self.summary = summarize(folded).strip()
+        self._replace_oldest(first)
+        self.set_system_prompt(self.system_prompt)
+        self.sliding_window(budget)
+
+    def fit(self, budget: Optional[int], strategy: str = "sliding_window",
+            summarize: Optional[Summarizer] = None):
+        """Apply the named history strategy; a budget of None or 0 means unlimited."""
+        if not budget or strategy == "none":
+            return
+        if strategy == "sliding_window":
+            self.sliding_window(budget)
+        elif strategy == "summarize_oldest":
+            if summarize is None:
+                raise ValueError("The summarize_oldest strategy needs a summarizer.")
+            self.summarize_oldest(budget, summarize)
+        else:
+            raise ValueError(f"Unknown history strategy: {strategy}")
+
+
+def transcript_for_summary(messages: List[Dict[str, str]]) -> str:
+    """Render messages as plain 'role: content' lines for a summarization prompt."""
+    return "\n\n".join(f"{message['role']}: {message['content']}" for message in messages)
@@ -0,0 +1,69 @@
+# mau/llm/instrumented_provider.py
+
+import time
+from typing import AsyncIterator, Dict, Iterator, List, Optional
+
+from mau.utils.metrics import MetricsRecorder, get_metrics
+
+from .history import estimate_tokens, history_tokens
+from .provider_wrapper import ProviderWrapper, unwrap
+from .stream_metrics import StreamStats, ameasure_stream, measure_stream
+
+
+class InstrumentedProvider(ProviderWrapper):
+    """
+    Record latency, time to first token and estimated tokens in and out of every call,
+    as metrics labelled by provider and model plus one "llm_call" event per call.
+    """
+
+    def __init__(self, provider, metrics: Optional[MetricsRecorder] = None):
+        super().__init__(provider)
+        self.metrics = metrics or get_metrics()
+        self.provider_name = type(unwrap(provider)).__name__
+
+    def _record(self, model: str, messages: List[Dict[str, str]], stats: StreamStats,
+                chunks: List[str], error: Optional[str]):
+        if stats.finished_at is None:
+            stats.finished_at = time.perf_counter()
+        labels = {"provider": self.provider_name, "model": model}
+        tokens_in = history_tokens(messages)
+        tokens_out = estimate_tokens("".join(chunks))
+        metrics = self.metrics
+        metrics.increment("mau_llm_requests_total", **labels)
+        if error:
+            metrics.increment("mau_llm_errors_total", **labels)
+        metrics.observe("mau_llm_request_seconds", stats.duration, **labels)
+        metrics.observe("mau_llm_ttft_seconds", stats.time_to_first_token, **labels)
+        metrics.increment("mau_llm_tokens_in_total", tokens_in, **labels)
+        metrics.increment("mau_llm_tokens_out_total", tokens_out, **labels)
+        metrics.event("llm_call", provider=self.provider_name, model=model, latency_s=stats.duration,
+                      ttft_s=stats.time_to_first_token, tokens_in=tokens_in, tokens_out=tokens_out,
+                      chunks=stats.completion_tokens, error=error)
+
+    def chat(self, model: str, messages: List[Dict[str, str]], temperature: float, ctx_size: int) -> Iterator[str]:
+        stats = StreamStats()
+        chunks: List[str] = []
+        error = None
+        try:
+            for chunk in measure_stream(super().chat(model, messages, temperature, ctx_size), stats):
+                chunks.append(chunk)
+                yield chunk
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            self._record(model, messages, stats, chunks, error)
+
+    async def achat(self, model: str, messages: List[Dict[str, str]], temperature: float, ctx_size: int) -> AsyncIterator[str]:
+        stats = StreamStats()
+        chunks: List[str] = []
+        error = None
+        try:
+            async for chunk in ameasure_stream(super().achat(model, messages, temperature, ctx_size), stats):
+                chunks.append(chunk)
+                yield chunk
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            self._record(model, messages, stats, chunks, error)
@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import Iterator, List, Dict
+from typing import AsyncIterator, Iterator, List, Dict
 
 class LLMProvider(ABC):
     @abstractmethod
@@ -8,3 +8,19 @@ class LLMProvider(ABC):
         Run the chat API call and yield response chunks.
         """
         pass
+
+    def warmup(self, model: str):
+        """
+        Open the connection and get the model loaded ahead of the first real request.
+        Optional; the default does nothing.
+        """
+        pass
+
+class AsyncLLMProvider(ABC):
+    @abstractmethod
+    def achat(self, model: str, messages: List[Dict[str, str]], temperature: float, ctx_size: int) -> AsyncIterator[str]:
+        """
+        Run the chat API call without blocking the event loop and yield response chunks.
+        Implementations are `async def` generators.
+        """
+        pass
@@ -0,0 +1,193 @@
+# mau/llm/load_balancer.py
+
+import logging
+import threading
+import time
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Sequence, Union
+
+from .async_adapters import as_async, as_sync
+from .llm_provider import AsyncLLMProvider, LLMProvider
+from .provider_wrapper import ProviderWrapper, unwrap
+
+logger = logging.getLogger(__name__)
+
+LOAD_BALANCING_STRATEGIES = ("least_outstanding", "weighted_round_robin")
+
+
+class Endpoint:
+    """One backend behind a LoadBalancedProvider, with its load and health state."""
+
+    def __init__(self, provider: Union[LLMProvider, AsyncLLMProvider], weight: float = 1.0):
+        self.provider = provider
+        self.weight = weight
+        self.name = getattr(unwrap(provider), "base_url", None) or type(unwrap(provider)).__name__
+        self.outstanding = 0
+        self.current_weight = 0.0  # smooth weighted round-robin state
+        self.unhealthy_until = 0.0
+        self.failures = 0
+
+    def is_healthy(self, now: float) -> bool:
+        return now >= self.unhealthy_until
+
+
+class LoadBalancedProvider(LLMProvider, AsyncLLMProvider):
+    """
+    Spread requests over several endpoints serving the same model.
+
+    "least_outstanding" sends each request to the endpoint with the fewest requests in
+    flight relative to its weight; "weighted_round_robin" rotates through endpoints in
+    proportion to their weights. An endpoint that fails before producing any output is
+    taken out of rotation for failure_cooldown seconds and the request fails over to the
+    next endpoint. A reply that breaks off midway is not replayed elsewhere, since part
+    of it has already been passed on. With health_check_interval set, a background
+    thread pings endpoints and returns recovered ones to rotation early. Request options
+    such as seed are passed on to the endpoint that serves the request.
+    """
+
+    def __init__(self, providers: Sequence[Union[LLMProvider, AsyncLLMProvider]],
+                 weights: Optional[Sequence[float]] = None, strategy: str = "least_outstanding",
+                 failure_cooldown: float = 30.0, health_check_interval: Optional[float] = None):
+        if not providers:
+            raise ValueError("LoadBalancedProvider needs at least one endpoint.")
+        if strategy not in LOAD_BALANCING_STRATEGIES:
+            raise ValueError(f"Unknown load balancing strategy: {strategy}")
+        weights = weights or [1.0] * len(providers)
+        self.endpoints = [Endpoint(provider, weight) for provider, weight in zip(providers, weights)]
+        self.strategy = strategy
+        self.failure_cooldown = failure_cooldown
+        self.base_url = ",".join(endpoint.name for endpoint in self.endpoints)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        if health_check_interval:
+            threading.Thread(target=self._health_check_loop, args=(health_check_interval,),
+                             daemon=True, name="endpoint-health-check").start()
+
+    def _pick(self, exclude: List[Endpoint]) -> Optional[Endpoint]:
+        now = time.monotonic()
+        with self._lock:
+            candidates = [e for e in self.endpoints if e not in exclude]
+            if not candidates:
+                return None
+            # With every endpoint marked down, still try them rather than fail outright.
+            candidates = [e for e in candidates if e.is_healthy(now)] or candidates
+            if self.strategy == "least_outstanding":
+                endpoint = min(candidates, key=lambda e: (e.outstanding + 1) / e.weight)
+            else:
+                # Smooth weighted round-robin: spreads picks evenly instead of in bursts.
+                total = sum(e.weight for e in candidates)
+                for candidate in candidates:
+                    candidate.current_weight += candidate.weight
+                endpoint = max(candidates, key=lambda e: e.current_weight)
+                endpoint.current_weight -= total
+            endpoint.outstanding += 1
+            return endpoint
+
+    def _release(self, endpoint: Endpoint, failed: bool):
+        with self._lock:
+            endpoint.outstanding -= 1
+            if failed:
+                endpoint.failures += 1
+                endpoint.unhealthy_until = time.monotonic() + self.failure_cooldown
+            else:
+                endpoint.failures = 0
+                endpoint.unhealthy_until = 0.0
+
+    def chat(self, model: str, messages: List[Dict[str, str]], temperature: float, ctx_size: int,
+             **options) -> Iterator[str]:
+        tried: List[Endpoint] = []
+        while True:
+            endpoint = self._pick(tried)
+            if endpoint is None:
+                raise RuntimeError(f"All {len(self.endpoints)} endpoints failed: {', '.join(e.name for e in tried)}")
+            tried.append(endpoint)
+            started = False
+            try:
+                for chunk in as_sync(endpoint.provider).chat(model, messages, temperature, ctx_size, **options):
+                    started = True
+                    yield chunk
+            except Exception as e:
+                self._release(endpoint, failed=True)
+                if started or len(tried) == len(self.endpoints):
+                    raise
+                logger.warning(f"Endpoint {endpoint.name} failed ({e}); failing over")
+                continue
+            except BaseException:
+                self._release(endpoint, failed=False)
+                raise
+            self._release(endpoint, failed=False)
+            return
+
+    async def achat(self, model: str, messages: List[Dict[str, str]], temperature: float, ctx_size: int,
+                    **options) -> AsyncIterator[str]:
+        tried: List[Endpoint] = []
+        while True:
+            endpoint = self._pick(tried)
+            if endpoint is None:
+                raise RuntimeError(f"All {len(self.endpoints)} endpoints failed: {', '.join(e.name for e in tried)}")
+            tried.append(endpoint)
+            started = False
+            try:
+                async for chunk in as_async(endpoint.provider).achat(model, messages, temperature, ctx_size, **options):
+                    started = True
+                    yield chunk
+            except Exception as e:
+                self._release(endpoint, failed=True)
+                if started or len(tried) == len(self.endpoints):
+                    raise
+                logger.warning(f"Endpoint {endpoint.name} failed ({e}); failing over")
+                continue
+            except BaseException:
+                self._release(endpoint, failed=False)
+                raise
+            self._release(endpoint, failed=False)
+            return
+
+    def warmup(self, model: str):
+        for endpoint in self.endpoints:
+            warmup = getattr(endpoint.provider, "warmup", None)
+            if warmup is not None:
+                try:
+                    warmup(model)
+                except Exception as e:
+                    logger.warning(f"Warm-up of {endpoint.name} failed: {e}")
+
+    def check_health(self):
+        """Ping every endpoint that supports health_check and update its state."""
+        for endpoint in self.endpoints:
+            health_check = getattr(endpoint.provider, "health_check", None)
+            if health_check is None:
+                continue
+            try:
+                health_check()
+                healthy = True
+            except Exception as e:
+                logger.warning(f"Health check of {endpoint.name} failed: {e}")
+                healthy = False
+            with self._lock:
+                if healthy:
+                    endpoint.unhealthy_until = 0.0
+                else:
+                    endpoint.unhealthy_until = time.monotonic() + self.failure_cooldown
+
+    def _health_check_loop(self, interval: float):
+        while not self._stop.wait(interval):
+            self.check_health()
+
+    def close(self):
+        self._stop.set()
+
+
+class SeededProvider(ProviderWrapper):
+    """One caller's view of a shared LoadBalancedProvider: every request carries the caller's seed."""
+
+    def __init__(self, provider: LoadBalancedProvider, seed: int):
+        super().__init__(provider)
+        self.seed = seed
+
+    def chat(self, model: str, messages: List[Dict[str, str]], temperature: float, ctx_size: int,
+             **options) -> Iterator[str]:
+        return super().chat(model, messages, temperature, ctx_size, **dict(options, seed=self.seed))
+
+    def achat(self, model: str, messages: List[Dict[str, str]], temperature: float, ctx_size: int,
+              **options) -> AsyncIterator[str]:
+        return super().achat(model, messages, temperature, ctx_size, **dict(options, seed=self.seed))
@@ -0,0 +1,128 @@
+# mau/llm/provider_factory.py
+import atexit
+import json
+import threading
+from typing import Dict, Tuple
+
+from mau.llm.client_pool import PoolSettings
+from mau.utils.metrics import get_metrics
+
+# Like the client pool: one balancer per set of endpoints, so every agent and worker
+# using them shares its outstanding-request counts and its health-check thread.
+_balancers: Dict[Tuple[str, bool, str], object] = {}
+_balancers_lock = threading.Lock()
+
+def _build_provider(provider_name: str, provider_config: dict, stream: bool):
+    # Provider modules (and the SDKs behind them) are imported only for the provider selected.
+    pool_settings = PoolSettings.from_config(provider_config)
+    seed = provider_config.get("seed")
+    if provider_name.lower() == "ollama":
+        from mau.llm.provider_ollama import OllamaProvider
+
+        return OllamaProvider(provider_config.get("base_url"), pool_settings, seed=seed)
+    elif provider_name.lower() == "openai":
+        from mau.llm.provider_openai import OpenAIProvider
+
+        base_url = provider_config.get("base_url") or "https://api.openai.com/v1"
+        api_key = provider_config.get("api_key") or ""
+        return OpenAIProvider(base_url, api_key, pool_settings, stream=stream, seed=seed)
+    elif provider_name.lower() == "lmstudio":
+        from mau.llm.provider_lmstudio import LMStudioProvider
+
+        base_url = provider_config.get("base_url") or "http://localhost:1234/v1"
+        api_key = provider_config.get("api_key") or ""
+        return LMStudioProvider(base_url, api_key, stream=stream, pool_settings=pool_settings, seed=seed)
+    else:
+        raise ValueError(f"Unknown provider: {provider_name}")
+
+def _build_endpoint_provider(provider_name: str, provider_config: dict, stream: bool):
+    """One endpoint's provider, rate limited when provider_config has a "rate_limit" section."""
+    provider = _build_provider(provider_name, provider_config, stream)
+    rate_limit_config = provider_config.get("rate_limit")
+    if rate_limit_config:
+        from mau.llm.rate_limit import RateLimitedProvider, RateLimitSettings
+
+        provider = RateLimitedProvider.for_endpoint(provider, RateLimitSettings.from_config(rate_limit_config))
+    return provider
+
+# Settings applied per caller around the shared balancer rather than to its endpoints.
+_PER_CALLER_SETTINGS = ("cache", "seed")
+
+def _endpoint_settings(provider_config: dict) -> dict:
+    return {key: value for key, value in provider_config.items() if key not in _PER_CALLER_SETTINGS}
+
+def _get_load_balanced_provider(provider_name: str, provider_config: dict, stream: bool):
+    settings = _endpoint_settings(provider_config)
+    key = (provider_name.lower(), stream, json.dumps(settings, sort_keys=True, default=str))
+    with _balancers_lock:
+        balancer = _balancers.get(key)
+        if balancer is None:
+            if not _balancers:
+                atexit.register(close_load_balancers)
+            balancer = _build_load_balanced_provider(provider_name, settings, stream)
+            _balancers[key] = balancer
+        return balancer
+
+def close_load_balancers():
+    """Stop the shared balancers' health-check threads; called at interpreter exit."""
+    with _balancers_lock:
+        for balancer in _balancers.values():
+            balancer.close()
+        _balancers.clear()
+
+def _build_load_balanced_provider(provider_name: str, provider_config: dict, stream: bool):
+    from mau.llm.load_balancer import LoadBalancedProvider
+
+    providers, weights = [], []
+    for endpoint in provider_config["endpoints"]:
+        # Endpoint entries override the shared settings (base_url, api_key, provider, ...).
+        endpoint_config = {key: value for key, value in provider_config.items() if key != "endpoints"}
+        endpoint_config.update({key: value for key, value in endpoint.items() if value is not None})
+        providers.append(_build_endpoint_provider(endpoint.get("provider") or provider_name, endpoint_config, stream))
+        weights.append(endpoint.get("weight") or 1.0)
+    return LoadBalancedProvider(
+        providers, weights,
+        strategy=provider_config.get("load_balancing") or "least_outstanding",
+        failure_cooldown=provider_config.get("failure_cooldown") or 30.0,
+        health_check_interval=provider_config.get("health_check_interval"),
+    )
+
+def choose_provider(provider_name: str, provider_config: dict = None, stream: bool = False):
+    """
+    Build the LLMProvider named in a config section ("ollama", "openai" or "lmstudio").
+
+    Providers for the same endpoint share one pooled HTTP client; provider_config may
+    set "timeout", "max_connections", "max_keepalive_connections" and "http2", a fixed
+    "seed", a "rate_limit" section (request/token budgets and an adaptive concurrency
+    limit shared by every provider of the endpoint) and a "cache" section that serves
+    repeated deterministic requests from disk, without counting against the rate limit.
+    An "endpoints" list spreads requests over several servers (see LoadBalancedProvider);
+    each entry may override base_url, api_key, provider and set a weight. Sections with
+    the same endpoint settings share one balancer, whatever their seed and cache; the
+    seed is sent with each request.
+    When metrics are enabled every call is instrumented.
+    """
+    provider_config = provider_config or {}
+    if provider_config.get("endpoints"):
+        provider = _get_load_balanced_provider(provider_name, provider_config, stream)
+        if provider_config.get("seed") is not None:
+            from mau.llm.load_balancer import SeededProvider
+
+            provider = SeededProvider(provider, provider_config["seed"])
+    else:
+        provider = _build_endpoint_provider(provider_name, provider_config, stream)
+
+    cache_config = provider_config.get("cache") or {}
+    if cache_config.get("enabled"):
+        from mau.llm.response_cache import CachingProvider, get_response_cache
+
+        cache = get_response_cache(cache_config.get("path") or ".mau_cache/responses.sqlite",
+                                   cache_config.get("max_entries") or 10000,
+                                   cache_config.get("ttl_seconds"))
+        provider = CachingProvider(provider, cache, seed=provider_config.get("seed"),
+                                   bypass=bool(cache_config.get("bypass")))
+    if get_metrics().enabled:
+        from mau.llm.instrumented_provider import InstrumentedProvider
+
+        provider = InstrumentedProvider(provider)
+    return provider
@@ -1,27 +1,20 @@
 # mau/llm/provider_lmstudio.py
-from typing import Iterator, List, Dict
-from .llm_provider import LLMProvider
-import openai
+from typing import Optional
+from .client_pool import PoolSettings
+from .provider_openai import OpenAIProvider
 
-class LMStudioProvider(LLMProvider):
-    def __init__(self, base_url: str, api_key: str, stream: bool = False):
-        # Set stream=False by default for conversation mode.
-        self.client = openai.OpenAI(base_url=base_url, api_key=api_key)
-        self.stream = stream
+class LMStudioProvider(OpenAIProvider):
+    """LM Studio serves the OpenAI chat completions API, including token streaming."""
 
-    def chat(self, model: str, messages: List[Dict[str, str]], temperature: float, ctx_size: int) -> Iterator[str]:
-        # Use non-streaming mode if self.stream is False.
-        completion = self.client.chat.completions.create(
+    def __init__(self, base_url: str, api_key: str, stream: bool = False,
+                 pool_settings: Optional[PoolSettings] = None, seed: Optional[int] = None):
+        # The pipelines join the reply anyway, so streaming is opt-in here.
+        super().__init__(base_url, api_key, pool_settings=pool_settings, stream=stream, seed=seed)
+
+    def warmup(self, model: str):
+        # LM Studio loads models on their first request; a one-token completion triggers it.
+        self.client.chat.completions.create(
             model=model,
-            messages=messages,
-            temperature=temperature,
-            stream=self.stream  # This will be False for conversation mode.
+            messages=[{"role": "user", "content": "Hi"}],
+            max_tokens=1,
         )
-        if self.stream:
-            # If streaming is enabled, yield token-by-token.
-            for chunk in completion:
-                if "message" in chunk:
-                    yield chunk["message"]["content"]
-        else:
-            # Non-streaming: yield the complete response as one token.
-            yield completion.choices[0].message.content
@@ -1,14 +1,49 @@
-from typing import Iterator, List, Dict
-from .llm_provider import LLMProvider
-import ollama
+from typing import AsyncIterator, Iterator, List, Dict, Optional
+from .llm_provider import AsyncLLMProvider, LLMProvider
+from .client_pool import PoolSettings, get_async_ollama_client, get_ollama_client
 
-class OllamaProvider(LLMProvider):
-    def chat(self, model: str, messages: List[Dict[str, str]], temperature: float, ctx_size: int) -> Iterator[str]:
-        response_stream = ollama.chat(
+class OllamaProvider(LLMProvider, AsyncLLMProvider):
+    def __init__(self, base_url: Optional[str] = None, pool_settings: Optional[PoolSettings] = None,
+                 seed: Optional[int] = None):
+        self.base_url = base_url
+        self.seed = seed
+        self.pool_settings = pool_settings
+        self.client = get_ollama_client(base_url, pool_settings)
+
+    def _options(self, temperature: float, ctx_size: int, seed: Optional[int] = None) -> dict:
+        options = {"num_ctx": ctx_size, "temperature": temperature}
+        # A seed passed with the request (e.g. by a shared balancer) wins over the provider's own.
+        seed = seed if seed is not None else self.seed
+        if seed is not None:
+            options["seed"] = seed
+        return options
+
+    def warmup(self, model: str):
+        # A generate request without a prompt makes Ollama load the model and return.
+        self.client.generate(model=model, prompt="")
+
+    def health_check(self):
+        self.client.list()
+
+    def chat(self, model: str, messages: List[Dict[str, str]], temperature: float, ctx_size: int,
+             seed: Optional[int] = None) -> Iterator[str]:
+        response_stream = self.client.chat(
             model=model,
             messages=messages,
-            options={"num_ctx": ctx_size, "temperature": temperature},
+            options=self._options(temperature, ctx_size, seed),
             stream=True,
         )
         for chunk in response_stream:
             yield chunk["message"]["content"]
+
+    async def achat(self, model: str, messages: List[Dict[str, str]], temperature: float, ctx_size: int,
+                    seed: Optional[int] = None) -> AsyncIterator[str]:
+        client = get_async_ollama_client(self.base_url, self.pool_settings)
+        response_stream = await client.chat(
+            model=model,
+            messages=messages,
+            options=self._options(temperature, ctx_size, seed),
+            stream=True,
+        )
+        async for chunk in response_stream:
+            yield chunk["message"]["content"]
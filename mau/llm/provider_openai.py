@@ -1,19 +1,65 @@
-from typing import Iterator, List, Dict
-from .llm_provider import LLMProvider
-import openai
+from typing import AsyncIterator, Iterator, List, Dict, Optional
+from .llm_provider import AsyncLLMProvider, LLMProvider
+from .client_pool import PoolSettings, get_async_openai_client, get_openai_client
 
-class OpenAIProvider(LLMProvider):
-    def __init__(self, base_url: str, api_key: str):
-        openai.api_key = api_key
-        openai.api_base = base_url
+class OpenAIProvider(LLMProvider, AsyncLLMProvider):
+    seed: Optional[int] = None
 
-    def chat(self, model: str, messages: List[Dict[str, str]], temperature: float, ctx_size: int) -> Iterator[str]:
-        completion = openai.ChatCompletion.create(
+    def __init__(self, base_url: str, api_key: str, pool_settings: Optional[PoolSettings] = None,
+                 stream: bool = True, seed: Optional[int] = None):
+        # Clients come from the shared pool; nothing is set on the global openai module,
+        # so agents with different endpoints do not overwrite each other.
+        self.base_url = base_url
+        self.api_key = api_key
+        self.pool_settings = pool_settings
+        self.client = get_openai_client(base_url, api_key, pool_settings)
+        self.stream = stream
+        self.seed = seed
+
+    def _request_options(self, seed: Optional[int] = None) -> dict:
+        # A seed passed with the request (e.g. by a shared balancer) wins over the provider's own.
+        seed = seed if seed is not None else self.seed
+        return {"seed": seed} if seed is not None else {}
+
+    def warmup(self, model: str):
+        # Establishes the pooled connection without spending tokens.
+        self.client.models.list()
+
+    def health_check(self):
+        self.client.models.list()
+
+    def chat(self, model: str, messages: List[Dict[str, str]], temperature: float, ctx_size: int,
+             seed: Optional[int] = None) -> Iterator[str]:
+        completion = self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            stream=self.stream,
+            **self._request_options(seed),
+        )
+        if self.stream:
+            # Chunks are ChatCompletionChunk objects: the text is in choices[0].delta.content,
+            # which is None for the role-only first chunk and the final chunk.
+            for chunk in completion:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        else:
+            # Non-streaming: yield the complete response as one chunk.
+            yield completion.choices[0].message.content or ""
+
+    async def achat(self, model: str, messages: List[Dict[str, str]], temperature: float, ctx_size: int,
+                    seed: Optional[int] = None) -> AsyncIterator[str]:
+        client = get_async_openai_client(self.base_url, self.api_key, self.pool_settings)
+        completion = await client.chat.completions.create(
             model=model,
             messages=messages,
             temperature=temperature,
-            stream=True,
+            stream=self.stream,
+            **self._request_options(seed),
         )
-        for chunk in completion:
-            if 'choices' in chunk:
-                yield chunk.choices[0].delta.get("content", "")
+        if self.stream:
+            async for chunk in completion:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        else:
+            yield completion.choices[0].message.content or ""
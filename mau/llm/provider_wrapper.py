@@ -0,0 +1,43 @@
+# mau/llm/provider_wrapper.py
+from typing import AsyncIterator, Iterator, List, Dict, Union
+
+from .async_adapters import as_async, as_sync
+from .llm_provider import AsyncLLMProvider, LLMProvider
+
+
+class ProviderWrapper(LLMProvider, AsyncLLMProvider):
+    """
+    Base for providers that add behaviour (caching, metrics, limits) around another
+    provider. Calls (and request options such as seed) pass straight through unless a
+    subclass overrides them, and any
+    other attribute (base_url, client, ...) is read from the wrapped provider.
+    """
+
+    def __init__(self, provider: Union[LLMProvider, AsyncLLMProvider]):
+        self.provider = provider
+
+    def __getattr__(self, name):
+        # Only called for attributes not found on the wrapper itself.
+        if name == "provider":
+            raise AttributeError(name)
+        return getattr(self.provider, name)
+
+    def chat(self, model: str, messages: List[Dict[str, str]], temperature: float, ctx_size: int,
+             **options) -> Iterator[str]:
+        return as_sync(self.provider).chat(model, messages, temperature, ctx_size, **options)
+
+    def warmup(self, model: str):
+        warmup = getattr(self.provider, "warmup", None)
+        if warmup is not None:
+            warmup(model)
+
+    def achat(self, model: str, messages: List[Dict[str, str]], temperature: float, ctx_size: int,
+              **options) -> AsyncIterator[str]:
+        return as_async(self.provider).achat(model, messages, temperature, ctx_size, **options)
+
+
+def unwrap(provider):
+    """Return the innermost provider below any ProviderWrapper layers."""
+    while isinstance(provider, ProviderWrapper):
+        provider = provider.provider
+    return provider
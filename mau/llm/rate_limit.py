@@ -0,0 +1,240 @@
+# mau/llm/rate_limit.py
+
+import asyncio
+import threading
+import time
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, Iterator, List, Optional
+
+from mau.utils.metrics import get_metrics
+
+from .history import estimate_tokens, history_tokens
+from .provider_wrapper import ProviderWrapper, unwrap
+from .stream_metrics import StreamStats, ameasure_stream, measure_stream
+
+
+class TokenBucket:
+    """
+    Classic token bucket: refills at rate tokens per second up to capacity.
+
+    reserve() takes tokens immediately and returns how long the caller must wait
+    before using them, so waiting callers are served in arrival order. The bucket
+    may go into debt (e.g. when output tokens are charged after a reply).
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, amount: float = 1.0) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= amount
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def acquire(self, amount: float = 1.0):
+        wait = self.reserve(amount)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, amount: float = 1.0):
+        wait = self.reserve(amount)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def charge(self, amount: float):
+        """Take tokens after the fact without waiting; later callers absorb the delay."""
+        self.reserve(amount)
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit for one endpoint.
+
+    Each request holds a slot while it runs. A request that succeeds with a time to
+    first token under the target raises the limit by 1/limit (about +1 per round of
+    requests). An error or a slow first token multiplies the limit by decrease_factor.
+    Without a fixed target_latency the target is latency_tolerance times the best
+    time to first token seen so far, since queueing at the backend shows up there first.
+    """
+
+    def __init__(self, initial: int = 4, minimum: int = 1, maximum: int = 32,
+                 target_latency: Optional[float] = None, latency_tolerance: float = 2.0,
+                 decrease_factor: float = 0.7):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(self.maximum, max(self.minimum, initial)))
+        self.target_latency = target_latency
+        self.latency_tolerance = latency_tolerance
+        self.decrease_factor = decrease_factor
+        self.in_flight = 0
+        self._best_latency: Optional[float] = None
+        self._last_latency = 0.0
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    def _target(self) -> Optional[float]:
+        if self.target_latency is not None:
+            return self.target_latency
+        if self._best_latency is None:
+            return None
+        return self._best_latency * self.latency_tolerance
+
+    def release(self, latency: Optional[float], error: bool = False):
+        with self._condition:
+            self.in_flight -= 1
+            target = self._target()
+            if latency is not None and not error:
+                self._best_latency = latency if self._best_latency is None else min(self._best_latency, latency)
+            if latency is not None:
+                self._last_latency = latency
+            congested = error or (latency is not None and target is not None and latency > target)
+            now = time.monotonic()
+            if congested:
+                # One decrease per latency window, so a burst of slow replies does not collapse the limit.
+                if now - self._last_decrease > self._last_latency:
+                    self.limit = max(self.minimum, self.limit * self.decrease_factor)
+                    self._last_decrease = now
+            else:
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self._condition.notify_all()
+
+
+@dataclass(frozen=True)
+class RateLimitSettings:
+    requests_per_second: Optional[float] = None
+    tokens_per_minute: Optional[float] = None
+    adaptive: bool = False
+    initial_concurrency: int = 4
+    min_concurrency: int = 1
+    max_concurrency: int = 32
+    target_latency: Optional[float] = None
+    latency_tolerance: float = 2.0
+    decrease_factor: float = 0.7
+
+    @classmethod
+    def from_config(cls, rate_limit_config: Optional[dict]) -> "RateLimitSettings":
+        values = {key: value for key, value in (rate_limit_config or {}).items()
+                  if key in cls.__dataclass_fields__ and value is not None}
+        return cls(**values)
+
+
+class EndpointLimits:
+    """The request bucket, token bucket and adaptive limiter shared by every provider of one endpoint."""
+
+    def __init__(self, settings: RateLimitSettings, endpoint: Optional[str] = None):
+        self.settings = settings
+        self.endpoint = endpoint
+        self.requests = TokenBucket(settings.requests_per_second) if settings.requests_per_second else None
+        self.tokens = (TokenBucket(settings.tokens_per_minute / 60.0, capacity=settings.tokens_per_minute)
+                       if settings.tokens_per_minute else None)
+        self.concurrency = AdaptiveLimiter(
+            settings.initial_concurrency, settings.min_concurrency, settings.max_concurrency,
+            settings.target_latency, settings.latency_tolerance, settings.decrease_factor,
+        ) if settings.adaptive else None
+
+
+# Like the client pool: one set of limits per endpoint, and the first caller's settings win.
+_limits: Dict[str, EndpointLimits] = {}
+_limits_lock = threading.Lock()
+
+
+def get_endpoint_limits(endpoint: str, settings: RateLimitSettings) -> EndpointLimits:
+    with _limits_lock:
+        limits = _limits.get(endpoint)
+        if limits is None:
+            limits = EndpointLimits(settings, endpoint)
+            _limits[endpoint] = limits
+        return limits
+
+
+class RateLimitedProvider(ProviderWrapper):
+    """
+    Hold each call until the endpoint's request and token budgets and its adaptive
+    concurrency limit allow it. Prompt tokens are estimated up front; reply tokens are
+    charged once the reply is complete.
+    """
+
+    def __init__(self, provider, limits: EndpointLimits):
+        super().__init__(provider)
+        self.limits = limits
+
+    @classmethod
+    def for_endpoint(cls, provider, settings: RateLimitSettings) -> "RateLimitedProvider":
+        inner = unwrap(provider)
+        endpoint = getattr(inner, "base_url", None) or type(inner).__name__
+        return cls(provider, get_endpoint_limits(endpoint, settings))
+
+    def _finish(self, stats: StreamStats, chunks: List[str], error: bool):
+        limits = self.limits
+        if limits.tokens is not None:
+            limits.tokens.charge(estimate_tokens("".join(chunks)))
+        if limits.concurrency is not None:
+            latency = stats.time_to_first_token if stats.time_to_first_token is not None else stats.duration
+            limits.concurrency.release(latency, error)
+            get_metrics().set_gauge("mau_concurrency_limit", limits.concurrency.limit, endpoint=limits.endpoint)
+
+    def chat(self, model: str, messages: List[Dict[str, str]], temperature: float, ctx_size: int,
+             **options) -> Iterator[str]:
+        limits = self.limits
+        if limits.concurrency is not None:
+            limits.concurrency.acquire()
+        stats = StreamStats()
+        chunks: List[str] = []
+        error = False
+        try:
+            if limits.requests is not None:
+                limits.requests.acquire()
+            if limits.tokens is not None:
+                limits.tokens.acquire(history_tokens(messages))
+            stats = StreamStats()
+            for chunk in measure_stream(super().chat(model, messages, temperature, ctx_size, **options), stats):
+                chunks.append(chunk)
+                yield chunk
+        except Exception:
+            error = True
+            raise
+        finally:
+            if stats.finished_at is None:
+                stats.finished_at = time.perf_counter()
+            self._finish(stats, chunks, error)
+
+    async def achat(self, model: str, messages: List[Dict[str, str]], temperature: float, ctx_size: int,
+                    **options) -> AsyncIterator[str]:
+        limits = self.limits
+        if limits.concurrency is not None:
+            # The limiter is shared with sync callers, so wait for a slot off the event loop.
+            await asyncio.to_thread(limits.concurrency.acquire)
+        stats = StreamStats()
+        chunks: List[str] = []
+        error = False
+        try:
+            if limits.requests is not None:
+                await limits.requests.acquire_async()
+            if limits.tokens is not None:
+                await limits.tokens.acquire_async(history_tokens(messages))
+            stats = StreamStats()
+            async for chunk in ameasure_stream(super().achat(model, messages, temperature, ctx_size, **options), stats):
+                chunks.append(chunk)
+                yield chunk
+        except Exception:
+            error = True
+            raise
+        finally:
+            if stats.finished_at is None:
+                stats.finished_at = time.perf_counter()
+            self._finish(stats, chunks, error)
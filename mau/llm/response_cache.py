@@ -0,0 +1,177 @@
+# mau/llm/response_cache.py
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+from mau.utils.metrics import get_metrics
+
+from .provider_wrapper import ProviderWrapper, unwrap
+
+logger = logging.getLogger(__name__)
+
+# Set by the --no-cache CLI flag: cached replies are not read, fresh ones still refresh the cache.
+_bypass_all = False
+
+
+def set_cache_bypass(bypass: bool = True):
+    global _bypass_all
+    _bypass_all = bypass
+
+
+class ResponseCache:
+    """
+    On-disk SQLite cache of complete replies, keyed by a hash of the request.
+
+    Entries older than ttl_seconds are ignored and removed; past max_entries the least
+    recently used entries are evicted.
+    """
+
+    def __init__(self, path: str, max_entries: int = 10000, ttl_seconds: Optional[float] = None):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " response TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses(accessed_at)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(namespace: str, model: str, messages: List[Dict[str, str]], temperature: float,
+                 seed: Optional[int] = None, params: Optional[Dict[str, Any]] = None) -> str:
+        payload = {
+            "namespace": namespace,
+            "model": model,
+            "messages": [{"role": m["role"], "content": m["content"]} for m in messages],
+            "temperature": temperature,
+            "seed": seed,
+            "params": params or {},
+        }
+        encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT response, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            response, created_at = row
+            if self.ttl_seconds is not None and now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        return response
+
+    def put(self, key: str, response: str):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, response, now, now),
+            )
+            count = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM responses WHERE key IN "
+                    "(SELECT key FROM responses ORDER BY accessed_at LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_caches: Dict[str, ResponseCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_response_cache(path: str, max_entries: int = 10000, ttl_seconds: Optional[float] = None) -> ResponseCache:
+    """Return the process-wide cache for path, so every provider shares one connection."""
+    path = os.path.abspath(path)
+    with _caches_lock:
+        cache = _caches.get(path)
+        if cache is None:
+            cache = ResponseCache(path, max_entries, ttl_seconds)
+            _caches[path] = cache
+        return cache
+
+
+class CachingProvider(ProviderWrapper):
+    """
+    Serve repeated deterministic requests from a ResponseCache.
+
+    Only requests with temperature 0 or a fixed seed are cached; a reply is stored
+    once its stream has been read to the end, unless it is empty.
+    """
+
+    def __init__(self, provider, cache: ResponseCache, seed: Optional[int] = None,
+                 params: Optional[Dict[str, Any]] = None, bypass: bool = False):
+        super().__init__(provider)
+        self.cache = cache
+        self.seed = seed
+        self.params = params or {}
+        self.bypass = bypass
+        inner = unwrap(provider)
+        self.namespace = f"{type(inner).__name__}:{getattr(inner, 'base_url', None) or ''}"
+
+    def _cache_key(self, model: str, messages: List[Dict[str, str]], temperature: float, ctx_size: int) -> Optional[str]:
+        if temperature != 0 and self.seed is None:
+            return None
+        params = dict(self.params, ctx_size=ctx_size)
+        return ResponseCache.make_key(self.namespace, model, messages, temperature, self.seed, params)
+
+    def _lookup(self, key: Optional[str]) -> Optional[str]:
+        if key is None or self.bypass or _bypass_all:
+            return None
+        cached = self.cache.get(key)
+        get_metrics().increment("mau_cache_hits_total" if cached is not None else "mau_cache_misses_total")
+        return cached
+
+    def _store(self, key: Optional[str], reply: str):
+        # An empty reply is a failed generation; caching it would replay the failure.
+        if key is not None and reply.strip():
+            self.cache.put(key, reply)
+
+    def chat(self, model: str, messages: List[Dict[str, str]], temperature: float, ctx_size: int) -> Iterator[str]:
+        key = self._cache_key(model, messages, temperature, ctx_size)
+        cached = self._lookup(key)
+        if cached is not None:
+            logger.debug(f"Response cache hit for {model}")
+            yield cached
+            return
+        chunks = []
+        for chunk in super().chat(model, messages, temperature, ctx_size):
+            chunks.append(chunk)
+            yield chunk
+        self._store(key, "".join(chunks))
+
+    async def achat(self, model: str, messages: List[Dict[str, str]], temperature: float, ctx_size: int) -> AsyncIterator[str]:
+        key = self._cache_key(model, messages, temperature, ctx_size)
+        cached = self._lookup(key)
+        if cached is not None:
+            yield cached
+            return
+        chunks = []
+        async for chunk in super().achat(model, messages, temperature, ctx_size):
+            chunks.append(chunk)
+            yield chunk
+        self._store(key, "".join(chunks))
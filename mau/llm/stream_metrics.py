@@ -0,0 +1,68 @@
+# mau/llm/stream_metrics.py
+
+import time
+from dataclasses import dataclass, field
+from typing import AsyncIterable, AsyncIterator, Iterable, Iterator, Optional
+
+
+@dataclass
+class StreamStats:
+    """Latency figures of one streamed reply. Each non-empty chunk counts as one token."""
+    started_at: float = field(default_factory=time.perf_counter)
+    first_token_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    completion_tokens: int = 0
+
+    @property
+    def time_to_first_token(self) -> Optional[float]:
+        if self.first_token_at is None:
+            return None
+        return self.first_token_at - self.started_at
+
+    @property
+    def duration(self) -> Optional[float]:
+        if self.finished_at is None:
+            return None
+        return self.finished_at - self.started_at
+
+    @property
+    def tokens_per_second(self) -> Optional[float]:
+        """Generation rate after the first token, i.e. excluding prompt processing."""
+        if self.finished_at is None or self.first_token_at is None or self.completion_tokens < 2:
+            return None
+        elapsed = self.finished_at - self.first_token_at
+        return (self.completion_tokens - 1) / elapsed if elapsed > 0 else None
+
+    def record_chunk(self, chunk: str):
+        if chunk:
+            if self.first_token_at is None:
+                self.first_token_at = time.perf_counter()
+            self.completion_tokens += 1
+
+    def as_dict(self) -> dict:
+        return {
+            "ttft_s": self.time_to_first_token,
+            "duration_s": self.duration,
+            "completion_tokens": self.completion_tokens,
+            "tokens_per_s": self.tokens_per_second,
+        }
+
+
+def measure_stream(chunks: Iterable[str], stats: StreamStats) -> Iterator[str]:
+    """Pass chunks through while recording time to first token, token count and end time in stats."""
+    try:
+        for chunk in chunks:
+            stats.record_chunk(chunk)
+            yield chunk
+    finally:
+        stats.finished_at = time.perf_counter()
+
+
+async def ameasure_stream(chunks: AsyncIterable[str], stats: StreamStats) -> AsyncIterator[str]:
+    """Async counterpart of measure_stream."""
+    try:
+        async for chunk in chunks:
+            stats.record_chunk(chunk)
+            yield chunk
+    finally:
+        stats.finished_at = time.perf_counter()
@@ -1,14 +1,32 @@
 import os
-import pandas as pd
 import logging
+from typing import TYPE_CHECKING, Any, Dict, Iterable
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 logger = logging.getLogger(__name__)
 
-def output_as_csv(df: pd.DataFrame, session_id: str):
+def rows_to_frame(rows: Iterable[Dict[str, Any]], columns: list) -> "pd.DataFrame":
+    """Build a DataFrame with the given column order from result rows."""
+    # pandas is only needed once results are exported, so it is not imported with the pipelines.
+    import pandas as pd
+
+    return pd.DataFrame(list(rows), columns=columns)
+
+def output_as_excel(df: "pd.DataFrame", excel_path: str):
+    try:
+        os.makedirs(os.path.dirname(excel_path) or ".", exist_ok=True)
+        df.to_excel(excel_path, index=False)
+        logger.info(f"Excel output saved to {excel_path}")
+    except Exception as e:
+        logger.error(f"Failed to output Excel: {e}")
+
+def output_as_csv(df: "pd.DataFrame", session_id: str, layer: str = "L002"):
     try:
         csv_dir = os.path.join("outputs_csv")
         os.makedirs(csv_dir, exist_ok=True)
-        csv_path = os.path.join(csv_dir, f"response_L002_session_{session_id}.csv")
+        csv_path = os.path.join(csv_dir, f"response_{layer}_session_{session_id}.csv")
         df.to_csv(csv_path, index=False)
         logger.info(f"CSV output saved to {csv_path}")
     except Exception as e:
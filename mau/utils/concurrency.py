@@ -0,0 +1,33 @@
+# mau/utils/concurrency.py
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def ordered_map(func: Callable[[T], R], items: Iterable[T], max_workers: int = 1,
+                max_pending: Optional[int] = None) -> Iterator[Tuple[T, R]]:
+    """
+    Run func over items on a thread pool and yield (item, result) pairs in input order.
+
+    Items are pulled lazily, so at most max_pending calls (default: twice max_workers)
+    are submitted or buffered at any time. A slow item holds back the results behind
+    it but not the calls behind it, which keeps the backend busy while callers can
+    still write results in order.
+    """
+    max_workers = max(1, int(max_workers))
+    max_pending = max(max_workers, max_pending or 2 * max_workers)
+    pending = deque()
+    item_iter = iter(items)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for item in item_iter:
+            pending.append((item, executor.submit(func, item)))
+            if len(pending) >= max_pending:
+                head_item, head_future = pending.popleft()
+                yield head_item, head_future.result()
+        while pending:
+            head_item, head_future = pending.popleft()
+            yield head_item, head_future.result()
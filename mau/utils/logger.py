@@ -6,11 +6,10 @@ def setup_logging():
     #     format="%(asctime)s [%(levelname)s] %(name)s - %(message)s",
     #     datefmt="%Y-%m-%d %H:%M:%S",
     # )
-    # logging.info("Logging is set up.")
+    # Configured on demand rather than at import, so importing MAU leaves the host's logging alone.
     logging.basicConfig(
-    level=logging.INFO,  # Change from DEBUG to INFO
-    format="%(asctime)s [%(levelname)s] %(name)s - %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S",
-)
-logging.info("Logging is set up.")
-
+        level=logging.INFO,  # Change from DEBUG to INFO
+        format="%(asctime)s [%(levelname)s] %(name)s - %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+    logging.info("Logging is set up.")
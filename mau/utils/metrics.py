@@ -0,0 +1,186 @@
+# mau/utils/metrics.py
+
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, object]) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items() if value is not None))
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + "}"
+
+
+class MetricsRecorder:
+    """
+    Collects per-call measurements.
+
+    Every event is appended to the current session's JSONL file (when a directory is
+    configured) and folded into in-memory counters, gauges and summaries that render_prometheus
+    exposes in the Prometheus text format. A disabled recorder ignores everything, so
+    instrumented code costs nothing when metrics are off.
+    """
+
+    def __init__(self, directory: Optional[str] = None, enabled: bool = True):
+        self.directory = directory
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._file = None
+        self.session: Optional[str] = None
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+        self._gauges: Dict[Tuple[str, Labels], float] = {}
+        self._summaries: Dict[Tuple[str, Labels], list] = {}
+
+    def start_session(self, session: str):
+        """Write subsequent events to <directory>/<session>.metrics.jsonl."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.session = session
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            if self.directory:
+                os.makedirs(self.directory, exist_ok=True)
+                self._file = open(os.path.join(self.directory, f"{session}.metrics.jsonl"), "a", encoding="utf-8")
+
+    def event(self, kind: str, **fields):
+        """Append one JSONL record; numbers in fields are not aggregated."""
+        if not self.enabled or self._file is None:
+            return
+        record = {"ts": datetime.now().isoformat(timespec="milliseconds"), "session": self.session,
+                  "event": kind, **fields}
+        line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            if self._file is not None:
+                self._file.write(line)
+                self._file.flush()
+
+    def increment(self, name: str, amount: float = 1, **labels):
+        if not self.enabled:
+            return
+        key = (name, _labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def set_gauge(self, name: str, value: float, **labels):
+        """Record the current value of name; each call replaces the previous one."""
+        if not self.enabled or value is None:
+            return
+        key = (name, _labels(labels))
+        with self._lock:
+            self._gauges[key] = value
+
+    def observe(self, name: str, value: float, **labels):
+        if not self.enabled or value is None:
+            return
+        key = (name, _labels(labels))
+        with self._lock:
+            summary = self._summaries.setdefault(key, [0, 0.0])
+            summary[0] += 1
+            summary[1] += value
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """Observe the duration of the with-block, in seconds, as name, and log it as a "timing" event."""
+        if not self.enabled:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - started
+            self.observe(name, seconds, **labels)
+            self.event("timing", metric=name, seconds=seconds, **labels)
+
+    def render_prometheus(self) -> str:
+        with self._lock:
+            counters = sorted(self._counters.items())
+            gauges = sorted(self._gauges.items())
+            summaries = sorted(self._summaries.items())
+        lines = []
+        last_name = None
+        for (name, labels), value in counters:
+            if name != last_name:
+                lines.append(f"# TYPE {name} counter")
+                last_name = name
+            lines.append(f"{name}{_format_labels(labels)} {value:g}")
+        for (name, labels), value in gauges:
+            if name != last_name:
+                lines.append(f"# TYPE {name} gauge")
+                last_name = name
+            lines.append(f"{name}{_format_labels(labels)} {value:g}")
+        for (name, labels), (count, total) in summaries:
+            if name != last_name:
+                lines.append(f"# TYPE {name} summary")
+                last_name = name
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {total:.6f}")
+        return "\n".join(lines) + "\n"
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+_metrics = MetricsRecorder(enabled=False)
+_server: Optional[ThreadingHTTPServer] = None
+
+
+def get_metrics() -> MetricsRecorder:
+    return _metrics
+
+
+def configure_metrics(directory: Optional[str] = None, prometheus_port: Optional[int] = None) -> MetricsRecorder:
+    """Enable the process-wide recorder, optionally serving /metrics on prometheus_port."""
+    global _metrics
+    _metrics.close()
+    _metrics = MetricsRecorder(directory)
+    if prometheus_port is not None:
+        start_prometheus_server(prometheus_port)
+    return _metrics
+
+
+def start_prometheus_server(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serve the process-wide metrics at http://host:port/metrics on a daemon thread."""
+    global _server
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.rstrip("/") != "/metrics":
+                self.send_error(404)
+                return
+            body = get_metrics().render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    if _server is None:
+        _server = ThreadingHTTPServer((host, port), Handler)
+        _server.daemon_threads = True
+        threading.Thread(target=_server.serve_forever, daemon=True, name="metrics-server").start()
+        logger.info(f"Serving Prometheus metrics on http://{host}:{_server.server_address[1]}/metrics")
+    return _server
@@ -0,0 +1,46 @@
+# mau/utils/retry.py
+
+import logging
+import random
+import time
+from typing import Callable, Optional, TypeVar
+
+from mau.utils.metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+R = TypeVar("R")
+
+
+def is_no_result(result) -> bool:
+    """True for None and for blank text, which is what an empty reply or stream joins to."""
+    return result is None or (isinstance(result, str) and not result.strip())
+
+
+def call_with_retry(func: Callable[..., Optional[R]], *args, max_retries: int = 3,
+                    backoff: float = 1.0, description: str = "call", **kwargs) -> Optional[R]:
+    """
+    Call func and retry with exponential backoff while it raises or returns no result
+    (None or blank text).
+
+    Returns the first real result, or None once max_retries retries are used up.
+    """
+    metrics = get_metrics()
+    for attempt in range(max_retries + 1):
+        try:
+            result = func(*args, **kwargs)
+            if not is_no_result(result):
+                return result
+            error = "no result"
+            logger.warning(f"{description} returned no result (attempt {attempt + 1}/{max_retries + 1})")
+        except Exception as e:
+            error = str(e)
+            logger.warning(f"{description} failed (attempt {attempt + 1}/{max_retries + 1}): {e}")
+        if attempt < max_retries:
+            metrics.increment("mau_retries_total")
+            metrics.event("retry", description=description, attempt=attempt + 1, error=error)
+            delay = backoff * (2 ** attempt)
+            time.sleep(delay + random.uniform(0, delay * 0.1))
+    metrics.increment("mau_retries_exhausted_total")
+    metrics.event("retries_exhausted", description=description, attempts=max_retries + 1)
+    return None
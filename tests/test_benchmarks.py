@@ -0,0 +1,58 @@
+import json
+
+from benchmarks.run_benchmarks import main
+
+
+def test_benchmark_suite_smoke(tmp_path):
+    output = tmp_path / "bench.json"
+    main(["--cycles", "3", "--concurrency", "2", "--turns", "2", "--latency", "0",
+          "--tokens-per-second", "0", "--reply-tokens", "4", "-o", str(output)])
+    report = json.loads(output.read_text(encoding="utf-8"))
+    results = {(r["benchmark"], r.get("prefetch")): r for r in report["results"]}
+    assert set(results) == {("layer1", None), ("layer2", None), ("conversation", False), ("conversation", True)}
+    for result in results.values():
+        assert result["error"] is None
+        assert result["server_failures"] == 0
+    assert results[("layer1", None)]["items"] == results[("layer1", None)]["server_requests"] == 3
+    assert results[("layer2", None)]["server_requests"] == 3
+    assert results[("conversation", True)]["time_to_first_token"]["p50_s"] is not None
+
+
+def test_import_time_probe_keeps_data_modes_light():
+    from benchmarks.import_time import measure_mode
+
+    result = measure_mode("data-generation-layer1", repeat=1)
+    assert result["median_s"] > 0
+    assert not {"prompt_toolkit", "rich", "ollama", "pandas"} & set(result["heavy_imports"])
+    assert {"prompt_toolkit", "rich"} <= set(measure_mode("conversation", repeat=1)["heavy_imports"])
+
+
+def test_layer1_cli_run_never_imports_console_or_ollama(tmp_path):
+    import subprocess
+    import sys
+
+    from benchmarks.import_time import ROOT
+    from benchmarks.mock_server import MockLLMServer, MockSettings
+
+    with MockLLMServer(MockSettings(latency=0, tokens_per_second=0, reply_tokens=4)) as server:
+        config = json.loads(open(f"{ROOT}/config/config.json", encoding="utf-8").read())
+        config["data_pipeline_layer1"].update({
+            "identity_dir": str(tmp_path / "identity"), "task_dir": str(tmp_path / "task"),
+            "output_dir_md": str(tmp_path / "md"), "output_dir_excel": str(tmp_path / "excel"),
+            "provider_config": {"base_url": server.base_url, "api_key": "mock"},
+            "session_id": "cli", "cycle_count": 2,
+        })
+        config_path = tmp_path / "config.json"
+        config_path.write_text(json.dumps(config), encoding="utf-8")
+        script = (
+            "import json, sys\n"
+            "from mau.cli import main\n"
+            f"sys.argv = ['mau', '--mode', 'data-generation-layer1', '-c', {str(config_path)!r}]\n"
+            "main()\n"
+            "print(json.dumps([m for m in ('prompt_toolkit', 'rich', 'ollama') if m in sys.modules]))\n"
+        )
+        result = subprocess.run([sys.executable, "-c", script], cwd=ROOT, capture_output=True, text=True,
+                                timeout=120)
+    assert result.returncode == 0, result.stderr
+    assert json.loads(result.stdout.strip().splitlines()[-1]) == []
+    assert len(list((tmp_path / "md").iterdir())) == 2
@@ -1,3 +1,151 @@
+from types import SimpleNamespace
+
+from mau.conversation.conversation_manager import ConversationManager
+from mau.llm.ai_being import AIBeing
+from mau.llm.llm_provider import LLMProvider
+
+
 def test_dummy_conversation():
     # A dummy test – you can expand this with mocks for providers.
     assert True
+
+
+class ScriptedProvider(LLMProvider):
+    def __init__(self, reply):
+        self.reply = reply
+
+    def chat(self, model, messages, temperature, ctx_size):
+        yield from self.reply.split(" ")
+
+
+def make_agent(name, reply):
+    return AIBeing(name=name, model="m", temperature=0.5, ctx_size=2048,
+                   system_prompt=f"You are {name}.", provider=ScriptedProvider(reply))
+
+
+def test_conversation_records_turn_stats():
+    manager = ConversationManager(make_agent("a", "one two three"), make_agent("b", "four five"),
+                                  initial_message="hi")
+    turns = manager.run_conversation()
+    name, stream = next(turns)
+    assert (name, "".join(stream)) == ("a", "hi")
+    assert manager.last_turn_stats() is None
+
+    name, stream = next(turns)
+    assert "".join(stream) == "fourfive"
+    stats = manager.last_turn_stats()
+    assert stats.completion_tokens == 2
+    assert stats.time_to_first_token is not None
+
+
+def test_openai_provider_streams_sdk_chunks():
+    from mau.llm.provider_lmstudio import LMStudioProvider
+
+    def chunk(content):
+        return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content))])
+
+    provider = LMStudioProvider.__new__(LMStudioProvider)
+    provider.stream = True
+    provider.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(
+        create=lambda **kwargs: iter([chunk(None), chunk("Hel"), chunk("lo"), SimpleNamespace(choices=[])])
+    )))
+    assert list(provider.chat("m", [], 0.5, 2048)) == ["Hel", "lo"]
+
+
+def test_batch_runner_writes_one_transcript_per_job(tmp_path, monkeypatch):
+    import json
+
+    from mau.conversation import batch_runner
+
+    for name, text in [("p1.md", "You are one."), ("p2.md", "You are two."), ("hello.md", "hello")]:
+        (tmp_path / name).write_text(text, encoding="utf-8")
+    seeds_seen = []
+
+    def fake_choose_provider(name, provider_config=None, stream=False):
+        seeds_seen.append(provider_config.get("seed"))
+        return ScriptedProvider("ok")
+
+    monkeypatch.setattr(batch_runner, "choose_provider", fake_choose_provider)
+    agent = {"name": "a", "provider": "lmstudio", "model": "m", "provider_config": {}}
+    conversation_config = {"agent1": agent, "agent2": dict(agent, name="b"), "settings": {}}
+    batch_config = {
+        "output_dir": str(tmp_path / "out"),
+        "prompt_pairs": [{"agent1_system_prompt_path": str(tmp_path / "p1.md"),
+                          "agent2_system_prompt_path": str(tmp_path / "p2.md")}],
+        "initial_message_paths": [str(tmp_path / "hello.md")],
+        "seeds": [1, 2, 3],
+        "max_turns": 3,
+        "concurrency": 2,
+    }
+
+    finished, failed = batch_runner.run_conversation_batch(conversation_config, batch_config)
+    assert (finished, failed) == (3, [])
+    assert sorted(seeds_seen) == [1, 1, 2, 2, 3, 3]
+    files = sorted((tmp_path / "out").iterdir())
+    assert [f.name for f in files] == [f"pair000_msg000_seed{s}_rep000.json" for s in (1, 2, 3)]
+    data = json.loads(files[0].read_text(encoding="utf-8"))
+    assert [m["agent"] for m in data["conversation"]] == ["a", "b", "a", "b"]
+
+    # Re-running resumes: every transcript exists, so nothing runs again.
+    assert batch_runner.run_conversation_batch(conversation_config, batch_config) == (0, [])
+
+
+def test_transcript_streams_turns_and_compacts_to_json(tmp_path):
+    import json
+
+    from mau.conversation.transcript import TranscriptWriter, iter_transcript_messages
+
+    jsonl_path = str(tmp_path / "t.jsonl")
+    transcript = TranscriptWriter(jsonl_path, fsync_every=2)
+    manager = ConversationManager(make_agent("a", "one two"), make_agent("b", "three"),
+                                  initial_message="hi", transcript=transcript)
+    turns = manager.run_conversation()
+    for _ in range(3):
+        _, stream = next(turns)
+        "".join(stream)
+    next(turns)  # the turn is logged when the generator resumes
+    # Turns are on disk before the conversation ends and are not kept in memory.
+    assert [m["content"] for m in iter_transcript_messages(jsonl_path)] == ["hi", "three", "onetwo"]
+    assert manager._conversation_log == []
+
+    manager.save_conversation_json(str(tmp_path / "t.json"))
+    data = json.loads((tmp_path / "t.json").read_text(encoding="utf-8"))
+    assert data["agent1"] == {"name": "a", "model": "m", "system_prompt": "You are a."}
+    assert [m["agent"] for m in data["conversation"]] == ["a", "b", "a"]
+    transcript.close()
+
+
+def test_prefetch_requests_next_turn_before_consumer_asks():
+    import threading
+
+    calls = []
+    second_call = threading.Event()
+
+    class RecordingProvider(ScriptedProvider):
+        def warmup(self, model):
+            calls.append("warmup")
+
+        def chat(self, model, messages, temperature, ctx_size):
+            calls.append("chat")
+            if calls.count("chat") == 2:
+                second_call.set()
+            yield from super().chat(model, messages, temperature, ctx_size)
+
+    def agent(name, reply):
+        return AIBeing(name=name, model="m", temperature=0.5, ctx_size=2048,
+                       system_prompt=f"You are {name}.", provider=RecordingProvider(reply))
+
+    manager = ConversationManager(agent("a", "one two"), agent("b", "three"), initial_message="hi",
+                                  max_turns=3, prefetch=True, prefetch_queue_size=4, warmup=True)
+    turns = manager.run_conversation()
+    first = [(n, "".join(s)) for n, s in (next(turns) for _ in range(2))]
+    assert first == [("a", "hi"), ("b", "three")]
+    assert manager.last_turn_stats().completion_tokens == 1
+    # Agent a's reply is requested while the consumer is still on agent b's turn.
+    assert second_call.wait(timeout=5)
+    rest = [(n, "".join(s)) for n, s in turns]
+    assert rest == [("a", "onetwo"), ("b", "three")]
+    for thread in threading.enumerate():
+        if thread.name.startswith("warmup-"):
+            thread.join(timeout=5)
+    assert calls.count("warmup") == 2
@@ -1,3 +1,683 @@
+import threading
+import time
+
+import pytest
+
+from mau.utils.concurrency import ordered_map
+from mau.utils.retry import call_with_retry
+
+
 def test_dummy_data_pipeline():
     # A dummy test – you can expand this by creating a temporary Excel file.
     assert True
+
+
+def test_ordered_map_keeps_input_order_with_concurrency():
+    active = []
+    peak = []
+    lock = threading.Lock()
+
+    def work(n):
+        with lock:
+            active.append(n)
+            peak.append(len(active))
+        time.sleep(0.01 * (5 - n % 5))
+        with lock:
+            active.remove(n)
+        return n * 2
+
+    results = list(ordered_map(work, range(10), max_workers=3))
+    assert results == [(n, n * 2) for n in range(10)]
+    assert 1 < max(peak) <= 3
+
+
+def test_call_with_retry_retries_until_result():
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise RuntimeError("backend busy")
+        return "ok"
+
+    assert call_with_retry(flaky, max_retries=3, backoff=0) == "ok"
+    assert len(attempts) == 3
+    assert call_with_retry(lambda: None, max_retries=2, backoff=0) is None
+    # A blank reply (an empty stream) is retried like a missing one.
+    replies = iter(["", "  \n", "ok"])
+    assert call_with_retry(lambda: next(replies), max_retries=2, backoff=0) == "ok"
+    assert call_with_retry(lambda: "", max_retries=1, backoff=0) is None
+
+
+def test_jsonl_sink_appends_and_exports_same_columns(tmp_path):
+    import pandas as pd
+
+    from mau.data_pipeline.layer_1 import export_excel, open_session_sink, save_response
+    from mau.data_pipeline.result_sink import RESULT_COLUMNS
+
+    md_dir = tmp_path / "md"
+    md_dir.mkdir()
+    with open_session_sink(str(tmp_path), "s1", fsync_every=2) as sink:
+        for cycle in (1, 2, 3):
+            save_response("identity", "task", f"response {cycle}", cycle, "s1", str(md_dir), sink)
+        export_excel(sink, str(tmp_path), "s1")
+
+    df = pd.read_excel(tmp_path / "response_session_s1.xlsx")
+    assert list(df.columns) == RESULT_COLUMNS
+    assert df["Cycle Number"].tolist() == [1, 2, 3]
+    assert (md_dir / "response_session_s1_cycle_3.md").read_text() == "response 3"
+
+    # A session that only has a legacy Excel log is imported once into the store.
+    (tmp_path / "response_session_s1.jsonl").unlink()
+    with open_session_sink(str(tmp_path), "s1") as sink:
+        assert [row["Cycle Number"] for row in sink.read_rows()] == [1, 2, 3]
+
+
+def test_parquet_sink_exports_before_close_and_survives_a_crash(tmp_path):
+    pytest.importorskip("pyarrow")
+    import os
+
+    import pandas as pd
+
+    from mau.data_pipeline.layer_1 import export_excel, open_session_sink, save_response
+
+    md_dir = tmp_path / "md"
+    md_dir.mkdir()
+    sink = open_session_sink(str(tmp_path), "s1", "parquet", fsync_every=2)
+    for cycle in (1, 2, 3):
+        save_response("identity", "task", f"response {cycle}", cycle, "s1", str(md_dir), sink)
+    assert sink.pending_rows == 1
+    # Exported while the sink is still open, as the runners do.
+    export_excel(sink, str(tmp_path), "s1")
+    assert pd.read_excel(tmp_path / "response_session_s1.xlsx")["Cycle Number"].tolist() == [1, 2, 3]
+
+    # Crash without close: every flushed part is complete, and a half-written one is discarded.
+    save_response("identity", "task", "response 4", 4, "s1", str(md_dir), sink)
+    (tmp_path / "response_session_s1.parquet" / "part-00009.parquet.tmp").write_bytes(b"PAR1")
+    with open_session_sink(str(tmp_path), "s1", "parquet") as reopened:
+        assert [row["Cycle Number"] for row in reopened.read_rows()] == [1, 2, 3]
+        save_response("identity", "task", "response 4", 4, "s1", str(md_dir), reopened)
+    assert not [name for name in os.listdir(tmp_path / "response_session_s1.parquet") if name.endswith(".tmp")]
+    with open_session_sink(str(tmp_path), "s1", "parquet") as reopened:
+        assert [row["Cycle Number"] for row in reopened.read_rows()] == [1, 2, 3, 4]
+
+
+def test_checkpoint_reruns_failed_and_in_flight_cycles(tmp_path):
+    from mau.data_pipeline.checkpoint import CheckpointIndex
+
+    with CheckpointIndex(str(tmp_path / "s.checkpoint.sqlite")) as checkpoint:
+        for cycle in range(1, 6):
+            checkpoint.mark_in_flight(cycle)
+        for cycle in (1, 2, 4):
+            checkpoint.mark_completed(cycle)
+        checkpoint.mark_failed(3, "timeout")
+
+    with CheckpointIndex(str(tmp_path / "s.checkpoint.sqlite")) as checkpoint:
+        assert checkpoint.last_cycle() == 5
+        assert checkpoint.last_completed_cycle() == 4
+        assert list(checkpoint.cycles_to_run(7)) == [3, 5, 6, 7]
+
+
+def test_layer1_checkpoint_imports_markdown_gaps_as_failed(tmp_path):
+    from mau.data_pipeline.layer_1 import open_checkpoint
+
+    for cycle in (1, 2, 5):
+        (tmp_path / f"response_session_s1_cycle_{cycle}.md").write_text("x")
+    with open_checkpoint(str(tmp_path), str(tmp_path), "s1") as checkpoint:
+        assert list(checkpoint.cycles_to_run(6)) == [3, 4, 6]
+
+
+def test_layer002_engine_uses_provider_and_resumes(tmp_path, monkeypatch):
+    import pandas as pd
+
+    from mau.data_pipeline import data_pipeline
+    from mau.llm.llm_provider import LLMProvider
+
+    class EchoProvider(LLMProvider):
+        def __init__(self, fail_cycles=()):
+            self.fail_cycles = set(fail_cycles)
+
+        def chat(self, model, messages, temperature, ctx_size):
+            text = messages[-1]["content"]
+            if any(f"L1 #{cycle}\n" in text for cycle in self.fail_cycles):
+                raise RuntimeError("backend error")
+            yield "refined: "
+            yield text.splitlines()[0]
+
+    input_path = tmp_path / "layer_001.xlsx"
+    pd.DataFrame({
+        "Cycle Number": list(range(1, 9)),
+        "Generated Response": [f"L1 #{cycle}" for cycle in range(1, 9)],
+    }).to_excel(input_path, index=False)
+    config = {
+        "layer_001_input_path": str(input_path),
+        "output_dir_md": str(tmp_path / "md"),
+        "output_dir_excel": str(tmp_path / "excel"),
+        "identity_prompt_path": str(tmp_path / "identity.md"),
+        "task_prompt_path": str(tmp_path / "task.md"),
+        "provider": "lmstudio",
+        "model": "m",
+        "session_id": "s2",
+        "max_in_flight": 3,
+        "chunk_size": 3,
+        "max_retries": 0,
+    }
+    monkeypatch.chdir(tmp_path)
+
+    monkeypatch.setattr(data_pipeline, "choose_provider", lambda *a, **k: EchoProvider(fail_cycles=[4]))
+    data_pipeline.run_data_generation_mode(config, ["excel"])
+    df = pd.read_excel(tmp_path / "excel" / "response_L002_session_s2.xlsx")
+    assert df["Cycle Number"].tolist() == [1, 2, 3, 5, 6, 7, 8]
+    assert df["Generated Response"].iloc[0] == "refined: Layer 1 Response: L1 #1"
+
+    monkeypatch.setattr(data_pipeline, "choose_provider", lambda *a, **k: EchoProvider())
+    data_pipeline.run_data_generation_mode(config, ["excel"])
+    df = pd.read_excel(tmp_path / "excel" / "response_L002_session_s2.xlsx")
+    assert df["Cycle Number"].tolist() == [1, 2, 3, 5, 6, 7, 8, 4]
+
+
+def test_input_reader_streams_formats_from_offset(tmp_path):
+    import json
+
+    import pandas as pd
+
+    from mau.data_pipeline.input_reader import iter_input_rows
+
+    df = pd.DataFrame({"Cycle Number": [1, 2, 3, 4], "Generated Response": ["a", "b", "c", "d"]})
+    df.to_excel(tmp_path / "in.xlsx", index=False)
+    df.to_csv(tmp_path / "in.csv", index=False)
+    (tmp_path / "in.jsonl").write_text("".join(json.dumps(row) + "\n" for row in df.to_dict(orient="records")))
+
+    for name in ("in.xlsx", "in.csv", "in.jsonl"):
+        rows = list(iter_input_rows(str(tmp_path / name), start_row=2))
+        assert [int(row["Cycle Number"]) for row in rows] == [3, 4], name
+        assert [row["Generated Response"] for row in rows] == ["c", "d"], name
+
+
+def test_layer1_sweep_runs_grid_with_per_pair_resume(tmp_path, monkeypatch):
+    from mau.data_pipeline import layer_1_sweep
+    from mau.llm.llm_provider import LLMProvider
+
+    for folder, names in [("identity", ["calm", "terse"]), ("task", ["summarize", "explain"])]:
+        (tmp_path / folder).mkdir()
+        for name in names:
+            (tmp_path / folder / f"{name}.md").write_text(f"{folder} {name}", encoding="utf-8")
+
+    class GridProvider(LLMProvider):
+        def __init__(self, fail_identity=None):
+            self.fail_identity = fail_identity
+
+        def chat(self, model, messages, temperature, ctx_size):
+            if messages[0]["content"] == self.fail_identity:
+                raise ConnectionError("backend down")
+            yield f"{messages[0]['content']} / {messages[1]['content']}"
+
+    config = {
+        "identity_dir": str(tmp_path / "identity"), "task_dir": str(tmp_path / "task"),
+        "output_dir_md": str(tmp_path / "md"), "output_dir_excel": str(tmp_path / "excel"),
+        "model": "m", "sweep_id": "grid", "cycle_count": 3, "concurrency": 3,
+        "max_retries": 0, "retry_backoff": 0,
+    }
+    monkeypatch.setattr(layer_1_sweep, "choose_provider",
+                        lambda *a, **k: GridProvider(fail_identity="identity terse"))
+    pairs = layer_1_sweep.run_layer1_sweep(config)
+    assert [(p.session_id, p.completed, p.failed) for p in pairs] == [
+        ("grid__calm__explain", 3, 0), ("grid__calm__summarize", 3, 0),
+        ("grid__terse__explain", 0, 3), ("grid__terse__summarize", 0, 3),
+    ]
+    assert len(list((tmp_path / "md").iterdir())) == 6
+    assert (tmp_path / "excel" / "response_session_grid__calm__explain.xlsx").exists()
+
+    # Re-running only retries the failed pairs' cycles.
+    monkeypatch.setattr(layer_1_sweep, "choose_provider", lambda *a, **k: GridProvider())
+    pairs = layer_1_sweep.run_layer1_sweep(config)
+    assert [(p.completed, p.failed) for p in pairs] == [(0, 0), (0, 0), (3, 0), (3, 0)]
+    md = (tmp_path / "md" / "response_session_grid__terse__explain_cycle_2.md").read_text(encoding="utf-8")
+    assert md == "identity terse / task explain"
+
+    # A manifest picks pairs (and their cycle counts) explicitly.
+    manifest = tmp_path / "manifest.json"
+    manifest.write_text('[{"identity": "calm.md", "task": "explain.md", "cycles": 5}]', encoding="utf-8")
+    pairs = layer_1_sweep.run_layer1_sweep(dict(config, sweep_manifest=str(manifest)))
+    assert [(p.session_id, p.completed) for p in pairs] == [("grid__calm__explain", 2)]
+
+    # Post-processing applies to sweeps as it does to a single Layer 1 session.
+    manifest.write_text('[{"identity": "calm.md", "task": "explain.md", "cycles": 7}]', encoding="utf-8")
+    pairs = layer_1_sweep.run_layer1_sweep(dict(config, sweep_manifest=str(manifest), postprocess_workers=0,
+                                                postprocess=[{"name": "quality", "reject_patterns": ["calm"]}]))
+    assert [(p.completed, p.failed) for p in pairs] == [(0, 2)]
+
+
+def test_fused_pipeline_streams_layers_and_resumes_per_stage(tmp_path, monkeypatch):
+    import re
+
+    import pandas as pd
+
+    from mau.data_pipeline import fused_pipeline
+    from mau.llm.llm_provider import LLMProvider
+
+    for name in ("identity_l1", "task_l1", "identity_l2", "task_l2", "identity_l3", "task_l3"):
+        (tmp_path / f"{name}.md").write_text(name, encoding="utf-8")
+
+    class LayerProvider(LLMProvider):
+        def __init__(self, fail=()):
+            self.fail = set(fail)
+            self.calls = []
+
+        def chat(self, model, messages, temperature, ctx_size):
+            layer = messages[0]["content"][-2:]
+            text = messages[1]["content"]
+            match = re.search(r"#(\d+)", text)
+            cycle = match.group(1) if match else str(sum(1 for c in self.calls if c[0] == "l1") + 1)
+            self.calls.append((layer, cycle))
+            if (layer, cycle) in self.fail:
+                raise RuntimeError("backend error")
+            yield f"{layer} #{cycle}" if layer == "l1" else f"{layer}({text.splitlines()[0]})"
+
+    layer1 = {
+        "identity_dir": str(tmp_path), "task_dir": str(tmp_path),
+        "identity_prompt_file": "identity_l1.md", "task_prompt_file": "task_l1.md",
+        "output_dir_md": str(tmp_path / "md1"), "output_dir_excel": str(tmp_path / "excel1"),
+        "model": "m", "concurrency": 1, "max_retries": 0, "retry_backoff": 0,
+    }
+    layer2 = {
+        "output_dir_md": str(tmp_path / "md2"), "output_dir_excel": str(tmp_path / "excel2"),
+        "identity_prompt_path": str(tmp_path / "identity_l2.md"), "task_prompt_path": str(tmp_path / "task_l2.md"),
+        "provider": "lmstudio", "model": "m", "max_in_flight": 2, "max_retries": 0, "retry_backoff": 0,
+    }
+    fused = {
+        "session_id": "f1", "cycle_count": 4, "queue_size": 1,
+        "extra_layers": [{
+            "layer": "L003", "output_dir_md": str(tmp_path / "md3"), "output_dir_excel": str(tmp_path / "excel3"),
+            "identity_prompt_path": str(tmp_path / "identity_l3.md"), "task_prompt_path": str(tmp_path / "task_l3.md"),
+            "model": None,
+        }],
+    }
+    monkeypatch.chdir(tmp_path)
+
+    provider = LayerProvider(fail={("l2", "3")})
+    monkeypatch.setattr(fused_pipeline, "choose_provider", lambda *a, **k: provider)
+    stages = fused_pipeline.run_fused_mode(layer1, layer2, fused, ["excel"])
+    assert [(s.name, s.completed, s.failed) for s in stages] == [("L001", 4, 0), ("L002", 3, 1), ("L003", 3, 0)]
+    df = pd.read_excel(tmp_path / "excel3" / "response_L003_session_f1.xlsx")
+    assert df["Cycle Number"].tolist() == [1, 2, 4]
+    assert df["Generated Response"].iloc[0] == "l3(Layer 1 Response: l2(Layer 1 Response: l1 #1))"
+    assert (tmp_path / "excel1" / "response_session_f1.xlsx").exists()
+
+    # Cycle 3 re-enters at Layer 002 from the stored Layer 001 response; Layer 001 is not called again.
+    provider = LayerProvider()
+    monkeypatch.setattr(fused_pipeline, "choose_provider", lambda *a, **k: provider)
+    stages = fused_pipeline.run_fused_mode(layer1, layer2, fused, ["excel"])
+    assert provider.calls == [("l2", "3"), ("l3", "3")]
+    assert [(s.name, s.completed) for s in stages] == [("L001", 0), ("L002", 1), ("L003", 1)]
+    df = pd.read_excel(tmp_path / "excel3" / "response_L003_session_f1.xlsx")
+    assert df["Cycle Number"].tolist() == [1, 2, 4, 3]
+
+    # A response rejected by a stage's post-processing is not handed to the next stage.
+    provider = LayerProvider()
+    monkeypatch.setattr(fused_pipeline, "choose_provider", lambda *a, **k: provider)
+    stages = fused_pipeline.run_fused_mode(
+        dict(layer1, postprocess=[{"name": "quality", "reject_patterns": ["#2"]}], postprocess_workers=0),
+        layer2, dict(fused, session_id="f2", cycle_count=2), ["excel"])
+    assert [(s.name, s.completed, s.failed) for s in stages] == [("L001", 1, 1), ("L002", 1, 0), ("L003", 1, 0)]
+
+    # A Layer 001 near-duplicate dropped by dedup is completed in every stage and not handed on.
+    class RepeatingProvider(LayerProvider):
+        def chat(self, model, messages, temperature, ctx_size):
+            for chunk in super().chat(model, messages, temperature, ctx_size):
+                yield "l1 #1" if chunk.startswith("l1") else chunk
+
+    provider = RepeatingProvider()
+    monkeypatch.setattr(fused_pipeline, "choose_provider", lambda *a, **k: provider)
+    session = dict(fused, session_id="f4", cycle_count=2)
+    stages = fused_pipeline.run_fused_mode(dict(layer1, dedup={"action": "drop"}), layer2, session, ["excel"])
+    assert [(s.name, s.completed, s.failed) for s in stages] == [("L001", 2, 0), ("L002", 1, 0), ("L003", 1, 0)]
+    provider = RepeatingProvider()
+    monkeypatch.setattr(fused_pipeline, "choose_provider", lambda *a, **k: provider)
+    fused_pipeline.run_fused_mode(dict(layer1, dedup={"action": "drop"}), layer2, session, ["excel"])
+    assert provider.calls == []
+
+    # An explicit cycle_count of 0 is honoured rather than falling back to data_pipeline_layer1.
+    stages = fused_pipeline.run_fused_mode(dict(layer1, cycle_count=5), layer2,
+                                           dict(fused, session_id="f3", cycle_count=0), ["excel"])
+    assert [(s.completed, s.failed) for s in stages] == [(0, 0), (0, 0), (0, 0)]
+    with pytest.raises(TypeError):
+        fused_pipeline.Stage("L000", "identity", "task", provider, "m")
+
+
+def test_work_queue_leases_expire_and_late_results_are_refused(tmp_path):
+    import time as _time
+
+    from mau.data_pipeline.work_queue import DONE, FAILED, PENDING, WorkQueue
+
+    with WorkQueue(str(tmp_path / "queue.sqlite"), max_attempts=2) as queue:
+        assert queue.publish("q", [("a", {"cycle": 1}), ("b", {"cycle": 2})]) == 2
+        assert queue.publish("q", [("a", {"cycle": 1})]) == 0  # already queued
+
+        [job_a] = queue.claim("w1", lease_seconds=0.05)
+        [job_b] = queue.claim("w2", lease_seconds=60)
+        assert (job_a.key, job_b.key) == ("a", "b")
+        assert queue.claim("w3", lease_seconds=60) == []
+
+        _time.sleep(0.1)  # w1 dies; its lease runs out and the job goes back to the queue
+        [retry] = queue.claim("w3", lease_seconds=60)
+        assert (retry.key, retry.attempts) == ("a", 2)
+        assert not queue.complete(job_a.id, "w1", {"response": "late"})
+        assert queue.complete(retry.id, "w3", {"response": "ok"})
+
+        assert queue.fail(job_b.id, "w2", "boom")
+        assert queue.counts("q") == {DONE: 1, PENDING: 1}
+        [again] = queue.claim("w2", lease_seconds=60)
+        assert queue.fail(again.id, "w2", "boom again")  # second attempt: out of attempts
+        finished = {job.key: job for job in queue.finished("q")}
+        assert finished["a"].result == {"response": "ok"}
+        assert (finished["b"].status, finished["b"].error) == (FAILED, "boom again")
+
+        # Collected or failed jobs are queued again when the coordinator republishes them.
+        queue.mark_collected(job.id for job in finished.values())
+        assert queue.finished("q") == []
+        assert queue.publish("q", [("b", {"cycle": 2})]) == 1
+        assert queue.counts("q") == {DONE: 1, PENDING: 1}
+
+
+def test_queue_coordinator_and_workers_run_layer1_session(tmp_path, monkeypatch):
+    import threading
+
+    import pandas as pd
+
+    from mau.data_pipeline import distributed
+    from mau.llm.llm_provider import LLMProvider
+
+    class CountingProvider(LLMProvider):
+        def __init__(self):
+            self.calls = 0
+            self.lock = threading.Lock()
+
+        def chat(self, model, messages, temperature, ctx_size):
+            with self.lock:
+                self.calls += 1
+                call = self.calls
+            if call == 2:
+                raise ConnectionError("backend hiccup")
+            yield f"<think>call {call}</think>{messages[0]['content']} -> {messages[1]['content']}"
+
+    provider = CountingProvider()
+    monkeypatch.setattr(distributed, "choose_provider", lambda *a, **k: provider)
+    for folder, text in (("identity", "id"), ("task", "do")):
+        (tmp_path / folder).mkdir()
+        (tmp_path / folder / f"{folder}.md").write_text(text, encoding="utf-8")
+    config = {
+        "data_pipeline_layer1": {
+            "identity_dir": str(tmp_path / "identity"), "task_dir": str(tmp_path / "task"),
+            "identity_prompt_file": "identity.md", "task_prompt_file": "task.md",
+            "output_dir_md": str(tmp_path / "md"), "output_dir_excel": str(tmp_path / "excel"),
+            "model": "m", "session_id": "dist", "cycle_count": 5, "postprocess": [{"name": "strip_think"}],
+        },
+        "work_queue": {"path": str(tmp_path / "queue.sqlite"), "poll_interval": 0.01, "idle_timeout": 0.2,
+                       "retry_backoff": 0, "concurrency": 2},
+    }
+
+    workers = [threading.Thread(target=distributed.run_worker,
+                                args=(dict(config, work_queue=dict(config["work_queue"], worker_id=f"w{n}")),))
+               for n in range(2)]
+    for worker in workers:
+        worker.start()
+    distributed.run_coordinator(config)
+    for worker in workers:
+        worker.join()
+
+    df = pd.read_excel(tmp_path / "excel" / "response_session_dist.xlsx")
+    assert sorted(df["Cycle Number"].tolist()) == [1, 2, 3, 4, 5]
+    assert set(df["Generated Response"]) == {"id -> do"}  # post-processed on the workers
+    assert provider.calls == 6  # one retried failure
+    # Every slot claims under its own id, so a sibling slot cannot complete an expired lease.
+    import json
+    import sqlite3
+
+    with sqlite3.connect(tmp_path / "queue.sqlite") as conn:
+        slots = {json.loads(result)["worker"] for (result,) in conn.execute("SELECT result FROM jobs")}
+    assert slots and slots <= {"w0/0", "w0/1", "w1/0", "w1/1"}
+
+    # Running the coordinator again finds nothing left to publish.
+    distributed.run_coordinator(config)
+    assert len(pd.read_excel(tmp_path / "excel" / "response_session_dist.xlsx")) == 5
+
+
+def test_postprocess_steps_strip_filter_validate_and_sign():
+    from mau.data_pipeline.dedup_index import minhash_signature
+    from mau.data_pipeline.postprocess import PostProcessor
+
+    steps = [
+        {"name": "strip_think"},
+        {"name": "length", "min_words": 3},
+        {"name": "quality", "reject_patterns": ["as an ai"]},
+        {"name": "json_schema", "schema": {"type": "object", "required": ["title"],
+                                           "properties": {"title": {"type": "string"}}}},
+    ]
+    texts = [
+        '<think>plan the answer</think>```json\n{"title": "Growing mycelium bricks at home"}\n```',
+        "plan only</think>\n" + '{"title": "Growing mycelium bricks at home"}',  # an unopened think block
+        '{"name": "no title here at all"}',
+        "As an AI I cannot help with that",
+        "<think>only thinking</think>",
+        None,
+        '{"title": "A different response entirely, about bioreactors"}',
+    ]
+    options = {"num_perm": 16, "shingle_size": 2, "seed": 1}
+    results = list(PostProcessor(steps, workers=0, batch_size=3, signature=options).process_signed(enumerate(texts)))
+    assert [item for item, _, _ in results] == list(range(7))
+    outputs = [response for _, response, _ in results]
+    assert outputs[0] == outputs[1] == '{"title": "Growing mycelium bricks at home"}'
+    # Kept responses are signed for the dedup index; rejected and failed ones are not.
+    assert results[0][2] == minhash_signature(outputs[0], **options)
+    assert [signature is None for _, _, signature in results] == [False, False, True, True, True, True, False]
+    assert outputs[2].step == "json_schema" and "title" in outputs[2].reason
+    assert outputs[3].step == "quality"
+    assert outputs[4].step == "strip_think"
+    assert outputs[5] is None
+    assert outputs[6] == '{"title": "A different response entirely, about bioreactors"}'
+
+    with pytest.raises(ValueError, match="dedup"):
+        PostProcessor([{"name": "near_duplicates"}])
+
+    # A partial batch is flushed once max_batch_delay passes, even while generation is stalled.
+    resume = threading.Event()
+
+    def stalled():
+        yield 0, "first response"
+        resume.wait(5)
+        yield 1, "second response"
+
+    processed = PostProcessor([], workers=0, batch_size=8, max_batch_delay=0.2).process(stalled())
+    started = time.monotonic()
+    assert next(processed) == (0, "first response")
+    assert time.monotonic() - started < 2
+    resume.set()
+    assert list(processed) == [(1, "second response")]
+
+    def broken():
+        yield 0, "fine"
+        raise RuntimeError("generation crashed")
+
+    with pytest.raises(RuntimeError, match="crashed"):
+        list(PostProcessor([], workers=0).process(broken()))
+
+
+def test_layer1_postprocesses_on_process_pool_and_resamples_rejects(tmp_path, monkeypatch):
+    import pandas as pd
+
+    from mau.data_pipeline import layer_1
+    from mau.llm.llm_provider import LLMProvider
+
+    class ThinkingProvider(LLMProvider):
+        def __init__(self):
+            self.calls = 0
+
+        def chat(self, model, messages, temperature, ctx_size):
+            self.calls += 1
+            yield "<think>hmm</think>"
+            yield "short" if self.calls == 2 else f"answer number {self.calls} with enough words"
+
+    monkeypatch.setattr(layer_1, "choose_provider", lambda *a, **k: ThinkingProvider())
+    config = {
+        "identity_dir": str(tmp_path / "identity"), "task_dir": str(tmp_path / "task"),
+        "output_dir_md": str(tmp_path / "md"), "output_dir_excel": str(tmp_path / "excel"),
+        "model": "m", "session_id": "pp", "cycle_count": 3, "max_retries": 0,
+        "postprocess": [{"name": "strip_think"}, {"name": "length", "min_words": 3}],
+        "postprocess_workers": 1, "postprocess_batch_size": 2,
+    }
+    layer_1.run_layer1(config)
+    df = pd.read_excel(tmp_path / "excel" / "response_session_pp.xlsx")
+    assert df["Cycle Number"].tolist() == [1, 3]
+    assert df["Generated Response"].tolist() == ["answer number 1 with enough words", "answer number 3 with enough words"]
+
+    layer_1.run_layer1(config)  # the rejected cycle is generated again
+    df = pd.read_excel(tmp_path / "excel" / "response_session_pp.xlsx")
+    assert df["Cycle Number"].tolist() == [1, 3, 2]
+
+
+def test_minhash_index_finds_near_duplicates_and_persists(tmp_path):
+    from mau.data_pipeline.dedup_index import MinHashLSHIndex
+
+    base = "Grow the mycelium on sterilised hemp hurd for ten days, then press it into moulds and dry it at sixty degrees."
+    near = base.replace("ten days", "eleven days")
+    other = "Bacterial cellulose forms as a floating pellicle when Komagataeibacter is cultured in sweetened tea."
+
+    path = str(tmp_path / "s.dedup.sqlite")
+    index = MinHashLSHIndex(path, threshold=0.6)
+    index.add(1, index.signature(base))
+    index.add(2, index.signature(other))
+    match = index.query(index.signature(near))
+    assert match is not None and match[0] == 1 and match[1] >= 0.6
+    assert index.query(index.signature("Something unrelated about kombucha brewing and bottling schedules.")) is None
+    assert index.query(index.signature(base), exclude=1) is None
+    index.close()
+
+    reopened = MinHashLSHIndex(path, threshold=0.9)  # stored settings win
+    assert reopened.threshold == 0.6
+    assert reopened.query(reopened.signature(near))[0] == 1
+    reopened.close()
+
+
+def test_layer1_dedup_tags_drops_and_resamples(tmp_path, monkeypatch):
+    import pandas as pd
+
+    from mau.data_pipeline import layer_1
+    from mau.data_pipeline.dedup_index import MinHashLSHIndex
+
+    replies = {
+        "A": "Mycelium composite bricks are grown on agricultural waste inside moulds over several days",
+        "B": "Spider silk proteins can be expressed in yeast and spun into fibres with a wet spinning bath",
+        "C": "Algae based bioplastics are cast from sodium alginate and hardened in a calcium chloride solution",
+    }
+
+    class ScriptedProvider:
+        def __init__(self, script):
+            self.script = list(script)
+
+        def chat(self, model, messages, temperature, ctx_size):
+            yield replies[self.script.pop(0)]
+
+    def run(session, action, script, cycle_count):
+        monkeypatch.setattr(layer_1, "choose_provider", lambda *a, **k: ScriptedProvider(script))
+        layer_1.run_layer1({
+            "identity_dir": str(tmp_path / "identity"), "task_dir": str(tmp_path / "task"),
+            "output_dir_md": str(tmp_path / "md"), "output_dir_excel": str(tmp_path / "excel"),
+            "model": "m", "session_id": session, "cycle_count": cycle_count, "max_retries": 0,
+            "dedup": {"action": action, "threshold": 0.7, "max_resamples": 1},
+        })
+        df = pd.read_excel(tmp_path / "excel" / f"response_session_{session}.xlsx")
+        index = MinHashLSHIndex(str(tmp_path / "excel" / f"response_session_{session}.dedup.sqlite"))
+        duplicates = index.duplicates()
+        index.close()
+        return df["Cycle Number"].tolist(), duplicates
+
+    cycles, duplicates = run("tag", "tag", "AAB", 3)
+    assert cycles == [1, 2, 3] and duplicates == {2: (1, 1.0, "tag")}
+
+    cycles, duplicates = run("drop", "drop", "AAB", 3)
+    assert cycles == [1, 3] and duplicates == {2: (1, 1.0, "drop")}
+
+    # Cycle 2 repeats A and is resampled to C.
+    cycles, duplicates = run("resample", "resample", "AABC", 3)
+    assert cycles == [1, 3, 2] and duplicates == {}
+
+    # The index survives a resume: cycle 4 repeats B from the first run, is resampled once,
+    # and a repeat on the last round is kept and tagged.
+    cycles, duplicates = run("resample", "resample", "BB", 4)
+    assert cycles == [1, 3, 2, 4] and duplicates == {4: (3, 1.0, "tag")}
+
+    # The sweep screens each pair against its own index; a cycle to resample waits for the resume.
+    from mau.data_pipeline import distributed, layer_1_sweep
+
+    sweep = {"identity_dir": str(tmp_path / "identity"), "task_dir": str(tmp_path / "task"),
+             "output_dir_md": str(tmp_path / "md"), "output_dir_excel": str(tmp_path / "excel"),
+             "model": "m", "sweep_id": "dup", "cycle_count": 2, "max_retries": 0,
+             "dedup": {"action": "resample", "threshold": 0.7, "max_resamples": 1}}
+    monkeypatch.setattr(layer_1_sweep, "choose_provider", lambda *a, **k: ScriptedProvider("AA"))
+    assert [(p.completed, p.failed) for p in layer_1_sweep.run_layer1_sweep(sweep)] == [(1, 1)]
+    monkeypatch.setattr(layer_1_sweep, "choose_provider", lambda *a, **k: ScriptedProvider("A"))
+    [pair] = layer_1_sweep.run_layer1_sweep(sweep)
+    assert (pair.completed, pair.failed) == (1, 0)  # out of resamples: kept and tagged
+    index = MinHashLSHIndex(str(tmp_path / "excel" / f"response_session_{pair.session_id}.dedup.sqlite"))
+    assert index.duplicates() == {2: (1, 1.0, "tag")}
+    index.close()
+
+    # The queue coordinator screens what workers send back (signed on the worker) and re-queues resamples.
+    layer1 = dict(sweep, identity_prompt_file="Identity_L001.md", task_prompt_file="task_001.md",
+                  session_id="queued")
+    queue_config = {"path": str(tmp_path / "queue.sqlite"), "poll_interval": 0.01, "idle_timeout": 1.0,
+                    "retry_backoff": 0, "concurrency": 1}
+    monkeypatch.setattr(distributed, "choose_provider", lambda *a, **k: ScriptedProvider("AAB"))
+    worker = threading.Thread(target=distributed.run_worker, args=(
+        {"data_pipeline_layer1": layer1, "work_queue": dict(queue_config, worker_id="w")},))
+    worker.start()
+    distributed.run_coordinator({"data_pipeline_layer1": layer1, "work_queue": queue_config})
+    worker.join()
+    df = pd.read_excel(tmp_path / "excel" / "response_session_queued.xlsx")
+    assert sorted(zip(df["Cycle Number"], df["Generated Response"])) == [(1, replies["A"]), (2, replies["B"])]
+
+
+def test_layer1_markdown_archive_reads_cycles_and_exports_files(tmp_path, monkeypatch):
+    import os
+
+    from mau.data_pipeline import layer_1
+    from mau.data_pipeline.md_archive import MarkdownArchive, md_archive_base
+
+    class CountingProvider:
+        def __init__(self):
+            self.calls = 0
+
+        def chat(self, model, messages, temperature, ctx_size):
+            self.calls += 1
+            yield f"réponse {self.calls}"
+
+    config = {
+        "identity_dir": str(tmp_path / "identity"), "task_dir": str(tmp_path / "task"),
+        "output_dir_md": str(tmp_path / "md"), "output_dir_excel": str(tmp_path / "excel"),
+        "model": "m", "session_id": "s", "cycle_count": 3, "max_retries": 0, "md_format": "archive",
+    }
+    monkeypatch.setattr(layer_1, "choose_provider", lambda *a, **k: CountingProvider())
+    layer_1.run_layer1(config)
+    assert not [name for name in os.listdir(tmp_path / "md") if name.endswith(".md")]
+
+    base = md_archive_base(str(tmp_path / "md"), "response", "s")
+    # An interrupted write leaves an unindexed tail and a partial index line; both are ignored.
+    with open(f"{base}.mdpack", "ab") as f:
+        f.write(b"lost")
+    with open(f"{base}.mdpack.idx", "a", encoding="utf-8") as f:
+        f.write("4\t999")
+    with MarkdownArchive(base) as archive:
+        assert archive.cycles() == [1, 2, 3]
+        assert archive.read(2) == "réponse 2"
+
+    # Without its checkpoint, the session is re-imported from the archive index.
+    os.remove(tmp_path / "excel" / "response_session_s.checkpoint.sqlite")
+    assert layer_1.list_saved_cycles(str(tmp_path / "md"), "s") == {1, 2, 3}
+    layer_1.run_layer1(dict(config, cycle_count=4))
+    with MarkdownArchive(base) as archive:
+        assert archive.cycles() == [1, 2, 3, 4] and archive.read(4) == "réponse 1"
+
+    layer_1.export_md(config, "s")
+    assert (tmp_path / "md" / "response_session_s_cycle_3.md").read_text(encoding="utf-8") == "réponse 3"
+    assert (tmp_path / "md" / "response_session_s_cycle_4.md").read_text(encoding="utf-8") == "réponse 1"
@@ -0,0 +1,371 @@
+def test_providers_share_one_client_per_endpoint():
+    from mau.llm import client_pool
+    from mau.llm.provider_factory import choose_provider
+
+    config_a = {"base_url": "http://localhost:1234/v1", "api_key": "a"}
+    config_b = {"base_url": "http://localhost:5678/v1", "api_key": "b"}
+    try:
+        agent1 = choose_provider("lmstudio", config_a)
+        agent2 = choose_provider("openai", config_a)
+        other = choose_provider("openai", config_b)
+        assert agent1.client is agent2.client
+        assert other.client is not agent1.client
+        assert str(other.client.base_url).startswith("http://localhost:5678")
+    finally:
+        client_pool.close_all()
+
+
+def test_close_all_closes_async_clients_on_their_loops():
+    import asyncio
+
+    from mau.llm import client_pool
+    from mau.llm.async_adapters import _BackgroundLoop
+
+    async def clients():
+        return (client_pool.get_async_openai_client("http://localhost:1234/v1", "a"),
+                client_pool.get_async_ollama_client("http://localhost:11434"))
+
+    idle = asyncio.new_event_loop()
+    try:
+        idle_openai, idle_ollama = idle.run_until_complete(clients())
+        running_openai, running_ollama = asyncio.run_coroutine_threadsafe(clients(), _BackgroundLoop.get()).result()
+        client_pool.close_all()
+        assert idle_openai.is_closed() and running_openai.is_closed()
+        assert idle_ollama._client.is_closed and running_ollama._client.is_closed
+        # The next caller on a loop gets a fresh client.
+        assert idle.run_until_complete(clients())[0] is not idle_openai
+        client_pool.close_all()
+    finally:
+        idle.close()
+
+
+def test_sync_and_async_adapters_round_trip():
+    import asyncio
+
+    from mau.llm.ai_being import AIBeing
+    from mau.llm.async_adapters import AsyncFromSync, SyncFromAsync, acollect
+    from mau.llm.llm_provider import AsyncLLMProvider, LLMProvider
+
+    class SyncEcho(LLMProvider):
+        def chat(self, model, messages, temperature, ctx_size):
+            yield from messages[-1]["content"].upper()
+
+    class AsyncEcho(AsyncLLMProvider):
+        async def achat(self, model, messages, temperature, ctx_size):
+            for char in messages[-1]["content"]:
+                await asyncio.sleep(0)
+                yield char
+
+    messages = [{"role": "user", "content": "hey"}]
+    assert "".join(SyncFromAsync(AsyncEcho()).chat("m", messages, 0.5, 0)) == "hey"
+    assert "".join(SyncFromAsync(AsyncFromSync(SyncEcho())).chat("m", messages, 0.5, 0)) == "HEY"
+
+    async def many_agents():
+        agents = [AIBeing(f"a{i}", "m", 0.5, 0, "sys", AsyncEcho()) for i in range(5)]
+
+        async def turn(agent, text):
+            return "".join([chunk async for chunk in agent.achat(text)])
+
+        replies = await asyncio.gather(*(turn(agent, f"msg{i}") for i, agent in enumerate(agents)))
+        direct = await acollect(SyncEcho(), "m", messages, 0.5, 0)
+        return replies, direct, agents[0].last_turn_stats
+
+    replies, direct, stats = asyncio.run(many_agents())
+    assert replies == [f"msg{i}" for i in range(5)]
+    assert direct == "HEY"
+    assert stats.completion_tokens == 4
+
+    # A sync-only caller can still drive an async-only provider through AIBeing.chat.
+    agent = AIBeing("b", "m", 0.5, 0, "sys", AsyncEcho())
+    assert "".join(agent.chat("ok")) == "ok"
+
+
+def test_history_stays_within_context_budget():
+    from mau.llm.ai_being import AIBeing
+    from mau.llm.history import SUMMARY_PREFIX, history_tokens
+    from mau.llm.llm_provider import LLMProvider
+
+    class Recorder(LLMProvider):
+        def __init__(self):
+            self.prompts = []
+
+        def chat(self, model, messages, temperature, ctx_size):
+            self.prompts.append(list(messages))
+            yield "x" * 200
+
+    provider = Recorder()
+    agent = AIBeing("a", "m", 0.5, 400, "system prompt", provider, response_reserve=100,
+                    history_strategy="sliding_window")
+    for turn in range(20):
+        list(agent.chat(f"question {turn} " + "y" * 200))
+    for prompt in provider.prompts:
+        assert prompt[0] == {"role": "system", "content": "system prompt"}
+        assert history_tokens(prompt) <= 300
+    assert provider.prompts[-1][-1]["content"].startswith("question 19")
+
+    summaries = []
+    provider = Recorder()
+    agent = AIBeing("b", "m", 0.5, 400, "system prompt", provider, response_reserve=100,
+                    history_strategy="summarize_oldest",
+                    summarizer=lambda messages: summaries.append(list(messages)) or f"summary {len(summaries)}")
+    for turn in range(10):
+        list(agent.chat(f"question {turn} " + "y" * 200))
+    assert len(summaries) > 1
+    # The summary joins the leading system prompt; every prompt has exactly one system message, first.
+    assert agent.messages[0]["content"] == f"system prompt\n\n{SUMMARY_PREFIX}summary {len(summaries)}"
+    for prompt in provider.prompts:
+        assert [message["role"] for message in prompt][:1] == ["system"]
+        assert "system" not in [message["role"] for message in prompt[1:]]
+    # A later fold includes the previous summary, so nothing is lost.
+    assert summaries[1][0]["content"] == SUMMARY_PREFIX + "summary 1"
+    agent.system_prompt += " (be brief)"
+    assert agent.system_prompt == "system prompt (be brief)"
+    assert agent.messages[0]["content"].endswith(f"summary {len(summaries)}")
+    # The budget applies to the prompt; the last reply was appended after it was sent.
+    assert history_tokens(agent.messages[:-1]) <= 300
+
+    # Without an explicit strategy the sliding window applies; "none" opts out of trimming.
+    agent = AIBeing("c", "m", 0.5, 400, "system prompt", Recorder(), response_reserve=100)
+    for turn in range(5):
+        list(agent.chat(f"question {turn} " + "y" * 200))
+    assert history_tokens(agent.messages[:-1]) <= 300
+    agent = AIBeing("d", "m", 0.5, 400, "system prompt", Recorder(), response_reserve=100,
+                    history_strategy="none")
+    for turn in range(5):
+        list(agent.chat(f"question {turn} " + "y" * 200))
+    assert len(agent.messages) == 11
+
+
+def test_history_token_counts_are_cached():
+    import pytest
+
+    from mau.llm.ai_being import AIBeing
+    from mau.llm.history import history_tokens
+    from mau.llm.llm_provider import LLMProvider
+
+    class Fixed(LLMProvider):
+        def chat(self, model, messages, temperature, ctx_size):
+            yield "reply " * 20
+
+    calls = []
+
+    def word_count(text):
+        return len(text.split())
+
+    def counting_tokenizer(text):
+        calls.append(text)
+        return word_count(text)
+
+    agent = AIBeing("a", "m", 0.5, 200, "system", Fixed(), tokenizer=counting_tokenizer)
+    for turn in range(30):
+        list(agent.chat(f"turn {turn}"))
+        assert agent.history_tokens == history_tokens(agent.messages, word_count)
+    # One tokenizer call per message added, none for the per-turn budget checks.
+    assert len(calls) == 1 + 2 * 30
+
+    with pytest.raises(TypeError):
+        agent.messages[0]["content"] = "changed"
+    agent.system_prompt = "new system prompt"
+    assert agent.messages[0]["content"] == "new system prompt"
+    assert agent.history_tokens == history_tokens(agent.messages, word_count)
+
+
+def test_caching_provider_serves_deterministic_repeats(tmp_path):
+    from mau.llm.llm_provider import LLMProvider
+    from mau.llm.response_cache import CachingProvider, ResponseCache
+
+    class Counting(LLMProvider):
+        calls = 0
+
+        def chat(self, model, messages, temperature, ctx_size):
+            Counting.calls += 1
+            yield "answer "
+            yield str(Counting.calls)
+
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"), max_entries=2)
+    provider = CachingProvider(Counting(), cache)
+    messages = [{"role": "user", "content": "same prompt"}]
+
+    assert "".join(provider.chat("m", messages, 0.0, 2048)) == "answer 1"
+    assert "".join(provider.chat("m", messages, 0.0, 2048)) == "answer 1"
+    assert Counting.calls == 1
+    # Sampled requests without a seed are never cached.
+    assert "".join(provider.chat("m", messages, 0.8, 2048)) == "answer 2"
+    assert "".join(provider.chat("m", messages, 0.8, 2048)) == "answer 3"
+
+    provider.bypass = True
+    assert "".join(provider.chat("m", messages, 0.0, 2048)) == "answer 4"
+    provider.bypass = False
+    assert "".join(provider.chat("m", messages, 0.0, 2048)) == "answer 4"
+
+    seeded = CachingProvider(Counting(), cache, seed=7)
+    for prompt in ("a", "b", "c"):
+        list(seeded.chat("m", [{"role": "user", "content": prompt}], 0.8, 2048))
+    count = cache._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+    assert count == 2
+
+    # An empty reply is a failed generation and is not replayed from the cache.
+    class Blank(LLMProvider):
+        def chat(self, model, messages, temperature, ctx_size):
+            yield ""
+
+    blank = CachingProvider(Blank(), cache)
+    list(blank.chat("m", [{"role": "user", "content": "empty"}], 0.0, 2048))
+    assert blank._lookup(blank._cache_key("m", [{"role": "user", "content": "empty"}], 0.0, 2048)) is None
+
+
+def test_instrumented_provider_records_calls_and_retries(tmp_path, monkeypatch):
+    import json
+
+    from mau.llm.instrumented_provider import InstrumentedProvider
+    from mau.llm.llm_provider import LLMProvider
+    from mau.utils import metrics
+    from mau.utils.retry import call_with_retry
+
+    recorder = metrics.MetricsRecorder(str(tmp_path))
+    monkeypatch.setattr(metrics, "_metrics", recorder)
+    recorder.start_session("s1")
+
+    class Words(LLMProvider):
+        def chat(self, model, messages, temperature, ctx_size):
+            yield from ["alpha ", "beta"]
+
+    provider = InstrumentedProvider(Words())
+    assert "".join(provider.chat("m", [{"role": "user", "content": "hello there"}], 0.5, 2048)) == "alpha beta"
+    attempts = iter([None, "ok"])
+    assert call_with_retry(lambda: next(attempts), max_retries=2, backoff=0) == "ok"
+    with recorder.timer("mau_file_write_seconds", stage="test"):
+        pass
+    recorder.close()
+
+    events = [json.loads(line) for line in (tmp_path / "s1.metrics.jsonl").read_text(encoding="utf-8").splitlines()]
+    assert [e["event"] for e in events] == ["llm_call", "retry", "timing"]
+    call = events[0]
+    assert (call["provider"], call["model"], call["chunks"], call["error"]) == ("Words", "m", 2, None)
+    assert call["tokens_in"] > 0 and call["tokens_out"] > 0 and call["ttft_s"] is not None
+
+    text = recorder.render_prometheus()
+    assert 'mau_llm_requests_total{model="m",provider="Words"} 1' in text
+    assert "mau_retries_total 1" in text
+    assert 'mau_file_write_seconds_count{stage="test"} 1' in text
+
+
+def test_rate_limits_buckets_and_adaptive_concurrency(monkeypatch):
+    import threading
+    import time
+
+    from mau.llm.llm_provider import LLMProvider
+    from mau.llm.rate_limit import (AdaptiveLimiter, EndpointLimits, RateLimitedProvider, RateLimitSettings,
+                                    TokenBucket)
+    from mau.utils import metrics
+
+    recorder = metrics.MetricsRecorder()
+    monkeypatch.setattr(metrics, "_metrics", recorder)
+
+    bucket = TokenBucket(rate=10.0, capacity=2)
+    assert bucket.reserve() == 0 and bucket.reserve() == 0
+    assert 0.09 < bucket.reserve() <= 0.1
+
+    limiter = AdaptiveLimiter(initial=4, minimum=1, maximum=8, target_latency=1.0)
+    limiter.acquire()
+    limiter.release(0.1)
+    assert limiter.limit == 4.25
+    limiter.acquire()
+    limiter.release(5.0)
+    assert abs(limiter.limit - 4.25 * 0.7) < 1e-9
+    limiter.acquire()
+    limiter.release(None, error=True)  # within the same latency window: no second decrease
+    assert abs(limiter.limit - 4.25 * 0.7) < 1e-9
+
+    running, peak, lock = [0], [0], threading.Lock()
+
+    class Slow(LLMProvider):
+        def chat(self, model, messages, temperature, ctx_size):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.02)
+            with lock:
+                running[0] -= 1
+            yield "ok"
+
+    limits = EndpointLimits(RateLimitSettings(adaptive=True, initial_concurrency=2, max_concurrency=2), "http://slow")
+    provider = RateLimitedProvider(Slow(), limits)
+    threads = [threading.Thread(target=lambda: list(provider.chat("m", [], 0.0, 0))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert peak[0] == 2
+    assert limits.concurrency.in_flight == 0
+    # The current limit is exported as a gauge, not a running summary.
+    text = recorder.render_prometheus()
+    assert "# TYPE mau_concurrency_limit gauge" in text
+    assert f'mau_concurrency_limit{{endpoint="http://slow"}} {limits.concurrency.limit:g}' in text
+
+
+def test_load_balanced_provider_spreads_and_fails_over():
+    import threading
+    from collections import Counter
+
+    from mau.llm import provider_factory
+    from mau.llm.llm_provider import LLMProvider
+    from mau.llm.load_balancer import LoadBalancedProvider, SeededProvider
+    from mau.llm.provider_factory import choose_provider
+
+    class Named(LLMProvider):
+        def __init__(self, name, fail=False):
+            self.base_url, self.fail = name, fail
+
+        def chat(self, model, messages, temperature, ctx_size):
+            if self.fail:
+                raise ConnectionError("down")
+            yield self.base_url
+
+    weighted = LoadBalancedProvider([Named("a"), Named("b")], weights=[3, 1], strategy="weighted_round_robin")
+    picks = Counter("".join(weighted.chat("m", [], 0.0, 0)) for _ in range(8))
+    assert picks == {"a": 6, "b": 2}
+
+    # Least outstanding: a request in flight on "a" sends the next one to "b".
+    balanced = LoadBalancedProvider([Named("a"), Named("b")])
+    first = balanced.chat("m", [], 0.0, 0)
+    assert next(first) == "a"
+    assert "".join(balanced.chat("m", [], 0.0, 0)) == "b"
+    list(first)
+
+    class Echo(LLMProvider):
+        def chat(self, model, messages, temperature, ctx_size, seed=None):
+            yield str(seed)
+
+    assert "".join(SeededProvider(LoadBalancedProvider([Echo()]), 7).chat("m", [], 0.0, 0)) == "7"
+
+    failing = LoadBalancedProvider([Named("down", fail=True), Named("up")], failure_cooldown=60)
+    assert ["".join(failing.chat("m", [], 0.0, 0)) for _ in range(3)] == ["up", "up", "up"]
+    down = failing.endpoints[0]
+    assert down.failures == 1 and down.outstanding == 0 and not down.is_healthy(0)
+
+    provider = choose_provider("lmstudio", {"endpoints": [
+        {"base_url": "http://node1:1234/v1", "weight": 2},
+        {"base_url": "http://node2:11434", "provider": "ollama"},
+    ]})
+    assert isinstance(provider, LoadBalancedProvider)
+    assert [type(e.provider).__name__ for e in provider.endpoints] == ["LMStudioProvider", "OllamaProvider"]
+    assert [e.weight for e in provider.endpoints] == [2, 1.0]
+
+    # Every caller with the same endpoints (e.g. each agent of a batch) shares one balancer.
+    shared = {"endpoints": [{"base_url": "http://node1:1234/v1"}], "health_check_interval": 60}
+    try:
+        assert choose_provider("lmstudio", dict(shared)) is choose_provider("lmstudio", dict(shared))
+        # Each batch seed gets its own view of the same balancer, which sends the seed with every request.
+        seeded = [choose_provider("lmstudio", dict(shared, seed=seed)) for seed in (1, 2)]
+        assert [p.seed for p in seeded] == [1, 2]
+        assert seeded[0].provider is seeded[1].provider is choose_provider("lmstudio", shared)
+        assert choose_provider("lmstudio", dict(shared, load_balancing="weighted_round_robin")) is not \
+            choose_provider("lmstudio", shared)
+        checkers = [t for t in threading.enumerate() if t.name == "endpoint-health-check"]
+        assert len(checkers) == 2
+    finally:
+        provider_factory.close_load_balancers()
+    for checker in checkers:
+        checker.join(timeout=1)
+    assert not [t for t in threading.enumerate() if t.name == "endpoint-health-check"]